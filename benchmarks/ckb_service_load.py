@@ -0,0 +1,147 @@
+# benchmarks/ckb_service_load.py
+"""
+Load test of the ckb_service client functions against the local mock backend (or any BASE_URL).
+
+Every scenario is run at each concurrency level: `--requests` calls shared by that many concurrent callers,
+reporting calls per second, tail latency and failed calls (None results). Balances are requested
+without the balance cache.
+
+Usage, from the project root:
+    python -m benchmarks.ckb_service_load
+    python -m benchmarks.ckb_service_load --concurrency 1 10 100 --requests 1000 --latency 0.02 --error-rate 0.01
+    python -m benchmarks.ckb_service_load --base-url http://127.0.0.1:8081 --scenarios transfer batch
+"""
+import argparse
+import asyncio
+import contextlib
+import json
+import logging
+import os
+import time
+
+import ckb.ckb_service as ckb_service
+from benchmarks.mock_ckb_backend import MockCkbBackend, start_mock_backend
+
+DEFAULT_CONCURRENCY = (1, 10, 100)
+LOAD_ADDRESS = "ckt1qzda0cr08m85hc8jlnfp3zer7xulejywt49kt2rr0vthywaa50xwsqflz4emgssc6nqj4yv3nfv2sca7g9dzhscgmg28x"
+LOAD_XUDT_ARGS = "0x" + "ab" * 32
+LOAD_INVOICE = "fibt1000000001pcqqqqqqqqqqqqqqqqqqqqqqqqqqqqqqqqqqqqqqqqqqqqqqq"
+BATCH_SIZE = 10
+
+# Scenario -> (coroutine function making one call, number of payouts per call)
+SCENARIOS = {
+    "balance": (lambda: ckb_service.request_balance(), 0),
+    "token_balance": (lambda: ckb_service.request_balance(LOAD_XUDT_ARGS), 0),
+    "transfer": (lambda: ckb_service.transfer_ckb(LOAD_ADDRESS, 61), 1),
+    "transfer_token": (lambda: ckb_service.transfer_token(LOAD_ADDRESS, 1, LOAD_XUDT_ARGS), 1),
+    "batch": (lambda: ckb_service.transfer_batch([(LOAD_ADDRESS, 61)] * BATCH_SIZE), BATCH_SIZE),
+    "invoice": (lambda: ckb_service.fetch_invoice_detail(LOAD_INVOICE), 0),
+    "fiber_transfer": (lambda: ckb_service.transfer_ckb_with_invoice(LOAD_INVOICE, 61), 1),
+}
+
+
+def percentile(latencies, ratio):
+    return latencies[min(len(latencies) - 1, int(len(latencies) * ratio))] if latencies else None
+
+
+async def run_level(scenario, concurrency, requests):
+    call, payouts_per_call = SCENARIOS[scenario]
+    latencies = []
+    failures = 0
+    remaining = iter(range(requests))
+
+    async def caller():
+        nonlocal failures
+        for _ in remaining:
+            started_at = time.perf_counter()
+            try:
+                result = await call()
+            except Exception:
+                result = None
+            latencies.append(time.perf_counter() - started_at)
+            if result is None:
+                failures += 1
+
+    started_at = time.perf_counter()
+    await asyncio.gather(*(caller() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started_at
+    latencies.sort()
+    return {
+        "scenario": scenario,
+        "concurrency": concurrency,
+        "calls": requests,
+        "elapsed": elapsed,
+        "calls_per_second": requests / elapsed if elapsed else None,
+        "payouts_per_second": (requests - failures) * payouts_per_call / elapsed if elapsed else None,
+        "failures": failures,
+        "latency_avg": sum(latencies) / len(latencies) if latencies else None,
+        "latency_p50": percentile(latencies, 0.5),
+        "latency_p95": percentile(latencies, 0.95),
+        "latency_p99": percentile(latencies, 0.99),
+        "latency_max": latencies[-1] if latencies else None,
+    }
+
+
+def print_report(report):
+    print(
+        f"{report['scenario']:<15} x{report['concurrency']:<4} "
+        f"{report['calls_per_second']:>9.1f} calls/s {report['payouts_per_second']:>9.1f} payouts/s "
+        f"p50 {report['latency_p50'] * 1000:>8.2f}ms p95 {report['latency_p95'] * 1000:>8.2f}ms "
+        f"p99 {report['latency_p99'] * 1000:>8.2f}ms max {report['latency_max'] * 1000:>8.2f}ms "
+        f"failures {report['failures']}"
+    )
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Load test of the ckb_service client functions.")
+    parser.add_argument("--base-url", help="Backend to load instead of the local mock")
+    parser.add_argument("--scenarios", nargs="+", choices=list(SCENARIOS), default=list(SCENARIOS))
+    parser.add_argument("--concurrency", type=int, nargs="+", default=DEFAULT_CONCURRENCY)
+    parser.add_argument("--requests", type=int, default=500, help="Calls per scenario and concurrency level")
+    parser.add_argument("--latency", type=float, default=0.01, help="Seconds every mock request takes")
+    parser.add_argument("--jitter", type=float, default=0.0, help="Maximum random seconds added by the mock")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Share of mock requests answered with a 500")
+    parser.add_argument("--pool-limit-per-host", type=int, help="Override CKB_HTTP_POOL_LIMIT_PER_HOST")
+    parser.add_argument("--json", action="store_true", help="Print the reports as JSON")
+    parser.add_argument("--verbose", action="store_true", help="Keep the ckb_service logs")
+    args = parser.parse_args()
+
+    runner = None
+    backend = None
+    if args.base_url:
+        base_url = args.base_url
+    else:
+        backend = MockCkbBackend(args.latency, args.jitter, args.error_rate)
+        runner, base_url = await start_mock_backend(backend)
+    ckb_service.BASE_URL = base_url
+    if args.pool_limit_per_host:
+        ckb_service.CKB_HTTP_POOL_LIMIT_PER_HOST = args.pool_limit_per_host
+        ckb_service.CKB_HTTP_POOL_LIMIT = max(ckb_service.CKB_HTTP_POOL_LIMIT, args.pool_limit_per_host)
+
+    reports = []
+    try:
+        for scenario in args.scenarios:
+            for concurrency in args.concurrency:
+                # The client functions log every call, which would dominate the timings
+                with contextlib.ExitStack() as stack:
+                    if not args.verbose:
+                        stack.enter_context(contextlib.redirect_stdout(stack.enter_context(open(os.devnull, "w"))))
+                        logging.disable(logging.INFO)
+                        stack.callback(logging.disable, logging.NOTSET)
+                    report = await run_level(scenario, concurrency, args.requests)
+                reports.append(report)
+                if not args.json:
+                    print_report(report)
+    finally:
+        await ckb_service.ckb_client.close()
+        if runner:
+            await runner.cleanup()
+
+    if args.json:
+        print(json.dumps({"base_url": base_url, "reports": reports}, indent=2))
+    elif backend:
+        print(f"Mock requests: {backend.requests}, injected errors: {backend.errors}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,168 @@
+# benchmarks/mock_ckb_backend.py
+"""
+Local stand-in of the CKB backend (BASE_URL) for load tests of ckb_service.
+
+Implements /balance, /balance/{xudt_args}, /transfer, /transfer/{xudt_args}, /transfer/batch[/{xudt_args}],
+/fiber/invoice and /fiber/transfer with the response formats used by ckb_service,
+plus a configurable latency and error injection. Transfers sent again with the same Idempotency-Key
+get the first response back. Nothing is persisted.
+
+Usage, from the project root:
+    python -m benchmarks.mock_ckb_backend --port 8081 --latency 0.05 --jitter 0.02 --error-rate 0.01
+"""
+import argparse
+import asyncio
+import hashlib
+import itertools
+import json
+import random
+import time
+
+from aiohttp import web
+
+DEFAULT_BALANCE = 10 ** 6 * 10 ** 8
+
+
+class MockCkbBackend:
+    """
+    :param latency: Seconds every request takes
+    :param jitter: Maximum random seconds added to the latency
+    :param error_rate: Share of the requests answered with a 500
+    :param token: Authorization expected on transfers, None accepts any
+    """
+
+    def __init__(self, latency: float = 0.0, jitter: float = 0.0, error_rate: float = 0.0, token: str = None):
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.token = token
+        self.balances = {}
+        self.sequence = itertools.count(1)
+        # Idempotency-Key -> response of the transfer, replayed to retries
+        self.idempotent_responses = {}
+        # endpoint -> number of requests, and of injected errors
+        self.requests = {}
+        self.errors = {}
+
+    def build_app(self):
+        app = web.Application(middlewares=[self.middleware])
+        app.add_routes([
+            web.get("/balance", self.balance),
+            web.get("/balance/{xudt_args}", self.balance),
+            # Before /transfer/{xudt_args}, which would match them too
+            web.post("/transfer/batch", self.transfer_batch),
+            web.post("/transfer/batch/{xudt_args}", self.transfer_batch),
+            web.post("/transfer", self.transfer),
+            web.post("/transfer/{xudt_args}", self.transfer),
+            web.get("/fiber/invoice", self.invoice),
+            web.post("/fiber/transfer", self.fiber_transfer),
+        ])
+        return app
+
+    @web.middleware
+    async def middleware(self, request, handler):
+        route = request.match_info.route.resource.canonical if request.match_info.route.resource else request.path
+        self.requests[route] = self.requests.get(route, 0) + 1
+        delay = self.latency + random.uniform(0, self.jitter)
+        if delay > 0:
+            await asyncio.sleep(delay)
+        if random.random() < self.error_rate:
+            self.errors[route] = self.errors.get(route, 0) + 1
+            return web.json_response({"error": "injected error"}, status=500)
+        if request.method == "POST" and self.token and request.headers.get("Authorization") != self.token:
+            return web.json_response({"error": "unauthorized"}, status=401)
+        idempotency_key = request.headers.get("Idempotency-Key") if request.method == "POST" else None
+        if idempotency_key and idempotency_key in self.idempotent_responses:
+            body, status = self.idempotent_responses[idempotency_key]
+            return web.json_response(body, status=status)
+        response = await handler(request)
+        if idempotency_key and response.status == 200:
+            self.idempotent_responses[idempotency_key] = (json.loads(response.text), response.status)
+        return response
+
+    def _tx_hash(self):
+        return "0x" + hashlib.sha256(f"mock-{next(self.sequence)}".encode()).hexdigest()
+
+    def _spend(self, xudt_args, amount):
+        key = xudt_args or "CKB"
+        balance = self.balances.get(key, DEFAULT_BALANCE)
+        if amount > balance:
+            return False
+        self.balances[key] = balance - amount
+        return True
+
+    async def balance(self, request):
+        key = request.match_info.get("xudt_args") or "CKB"
+        return web.json_response({"balance": str(self.balances.get(key, DEFAULT_BALANCE))})
+
+    async def transfer(self, request):
+        payload = await request.json()
+        if not payload.get("toAddress") or not self._spend(request.match_info.get("xudt_args"),
+                                                           int(payload.get("amountInCKB", 0))):
+            return web.json_response({"error": "invalid transfer"}, status=400)
+        return web.json_response({"txHash": self._tx_hash()})
+
+    async def transfer_batch(self, request):
+        payload = await request.json()
+        outputs = payload.get("outputs") or []
+        if not outputs or not all(output.get("toAddress") for output in outputs) or not self._spend(
+                request.match_info.get("xudt_args"), sum(int(output.get("amountInCKB", 0)) for output in outputs)):
+            return web.json_response({"error": "invalid transfer"}, status=400)
+        return web.json_response({"txHash": self._tx_hash()})
+
+    async def invoice(self, request):
+        invoice = request.query.get("invoice", "")
+        if not invoice.startswith(("fibb", "fibt", "fibd")):
+            return web.json_response({"error": "invalid invoice"}, status=400)
+        # Same format as the parse_invoice RPC of Fiber
+        return web.json_response({
+            "invoice": {
+                "currency": invoice[:4].capitalize(),
+                "amount": None,
+                "data": {
+                    "timestamp": hex(int(time.time() * 1000)),
+                    "payment_hash": "0x" + hashlib.sha256(invoice.encode()).hexdigest(),
+                    "attrs": [{"expiry_time": hex(3600)}],
+                },
+            }
+        })
+
+    async def fiber_transfer(self, request):
+        payload = await request.json()
+        if not str(payload.get("invoice", "")).startswith(("fibb", "fibt", "fibd")):
+            return web.json_response({"error": "invalid invoice"}, status=400)
+        return web.json_response({
+            "payment_hash": "0x" + hashlib.sha256(payload["invoice"].encode()).hexdigest(),
+            "status": "Success",
+        })
+
+
+async def start_mock_backend(backend: MockCkbBackend, host: str = "127.0.0.1", port: int = 0):
+    """
+    Serve the mock in the running event loop.
+    :return: (runner to clean up, base url)
+    """
+    runner = web.AppRunner(backend.build_app(), access_log=None)
+    await runner.setup()
+    site = web.TCPSite(runner, host, port)
+    await site.start()
+    port = site._server.sockets[0].getsockname()[1]
+    return runner, f"http://{host}:{port}"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Local stand-in of the CKB backend.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8081)
+    parser.add_argument("--latency", type=float, default=0.0, help="Seconds every request takes")
+    parser.add_argument("--jitter", type=float, default=0.0, help="Maximum random seconds added to the latency")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Share of requests answered with a 500")
+    parser.add_argument("--token", help="Authorization expected on transfers")
+    args = parser.parse_args()
+
+    backend = MockCkbBackend(args.latency, args.jitter, args.error_rate, args.token)
+    web.run_app(backend.build_app(), host=args.host, port=args.port, access_log=None)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,219 @@
+# benchmarks/transaction_listener_bench.py
+"""
+Offline benchmark of listen_for_transactions.
+
+Seeds a local Redis (or fakeredis) with synthetic transactions in the 'transactions' HASH format,
+drains them with the real listener and reports polls per second, per-poll latency,
+Redis command counts and memory use. Thank-you tweets are replaced by a stub.
+
+Usage, from the project root:
+    python -m benchmarks.transaction_listener_bench
+    python -m benchmarks.transaction_listener_bench --sizes 10000 100000 --redis-url redis://localhost:6379/15
+"""
+import argparse
+import asyncio
+import contextlib
+import json
+import os
+import random
+import resource
+import time
+import tracemalloc
+
+import redis.asyncio as redis
+
+import ckb.transaction_listener as transaction_listener
+from utils.metrics import instrument_redis, metrics
+
+DEFAULT_SIZES = (10000, 100000, 1000000)
+SEED_CHUNK_SIZE = 10000
+BENCH_ADDRESS = "ckt1qzda0cr08m85hc8jlnfp3zer7xulejywt49kt2rr0vthywaa50xwsq_bench"
+
+
+class PollRecorder:
+    """Stands in for the supervisor to time every poll of the listener."""
+
+    def __init__(self):
+        self.started_at = None
+        self.latencies = []
+        self.errors = []
+
+    def begin_iteration(self, name):
+        self.started_at = time.perf_counter()
+
+    def end_iteration(self, name):
+        if self.started_at is not None:
+            self.latencies.append(time.perf_counter() - self.started_at)
+            self.started_at = None
+
+    def record_error(self, name, error):
+        self.errors.append(error)
+        self.end_iteration(name)
+
+
+def make_transaction(i, transfer_ratio, senders):
+    """Synthetic transaction as written by the indexer, a transfer to us for `transfer_ratio` of them."""
+    if random.random() < transfer_ratio:
+        address, value = BENCH_ADDRESS, str(random.randint(61, 690) * 10 ** 8)
+    else:
+        address, value = f"ckt1_other_{i % 1000}", str(-random.randint(1, 1000))
+    return {
+        "txHash": f"0x{i:064x}",
+        "balanceChanges": [{"address": address, "value": value}],
+        "inputs": [{"address": f"ckt1_sender_{random.randrange(senders)}"}],
+    }
+
+
+async def seed(client, size, transfer_ratio, senders):
+    await client.flushdb()
+    for start in range(0, size, SEED_CHUNK_SIZE):
+        async with client.pipeline(transaction=False) as pipe:
+            chunk = range(start, min(start + SEED_CHUNK_SIZE, size))
+            pipe.hset("transactions", mapping={
+                f"0x{i:064x}": json.dumps(make_transaction(i, transfer_ratio, senders)) for i in chunk
+            })
+            pipe.zadd(transaction_listener.TX_PENDING_KEY, {f"0x{i:064x}": i for i in chunk})
+            await pipe.execute()
+
+
+async def redis_used_memory(client):
+    try:
+        return (await client.info("memory")).get("used_memory")
+    except Exception:
+        # fakeredis does not report memory
+        return None
+
+
+async def run(size, args, make_clients):
+    # The seeding and monitoring client is not instrumented, only the listener's commands are counted
+    admin_client, listener_client = make_clients()
+    await seed(admin_client, size, args.transfer_ratio, args.senders)
+    memory_before = await redis_used_memory(admin_client)
+
+    tweets = []
+
+    async def submit_stub(user_address, value):
+        if args.tweet_latency:
+            await asyncio.sleep(args.tweet_latency)
+        tweets.append((user_address, value))
+        return "stub tweet", True
+
+    recorder = PollRecorder()
+    transaction_listener.redis_client = instrument_redis(listener_client)
+    transaction_listener.supervisor = recorder
+    transaction_listener.thanks_dispatcher.submit = submit_stub
+    transaction_listener.thanks_coalescer.window = args.coalesce_window
+    transaction_listener.OUR_ADDRESS = BENCH_ADDRESS
+    transaction_listener.TX_POLL_INTERVAL = 0
+    transaction_listener.TX_POLL_BATCH_SIZE = args.batch_size
+    transaction_listener.transaction_stop_event.clear()
+    metrics.calls.clear()
+    metrics.latencies.clear()
+    metrics.pipelined_commands.clear()
+
+    remaining = None
+    tracemalloc.start()
+    started_at = time.perf_counter()
+    # The listener logs every transaction, which would dominate the timings
+    with contextlib.ExitStack() as stack:
+        if not args.verbose:
+            stack.enter_context(contextlib.redirect_stdout(stack.enter_context(open(os.devnull, "w"))))
+        listener = asyncio.create_task(transaction_listener.listen_for_transactions())
+        while True:
+            await asyncio.sleep(0.05)
+            remaining = await admin_client.zcard(transaction_listener.TX_PENDING_KEY)
+            if remaining == 0 and not transaction_listener.thanks_coalescer.tx_hashes:
+                break
+            if listener.done() or (args.timeout and time.perf_counter() - started_at > args.timeout):
+                break
+        elapsed = time.perf_counter() - started_at
+        transaction_listener.transaction_stop_event.set()
+        await asyncio.gather(listener, return_exceptions=True)
+    _, peak_python_memory = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    latencies = sorted(recorder.latencies)
+    commands = {function: count for (dependency, function, _), count in metrics.calls.items() if dependency == "redis"}
+    report = {
+        "transactions": size,
+        "elapsed": elapsed,
+        "polls": len(latencies),
+        "polls_per_second": len(latencies) / elapsed if elapsed else None,
+        "transactions_per_second": size / elapsed if elapsed else None,
+        "poll_latency_avg": sum(latencies) / len(latencies) if latencies else None,
+        "poll_latency_p50": latencies[len(latencies) // 2] if latencies else None,
+        "poll_latency_p95": latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))] if latencies else None,
+        "poll_latency_max": latencies[-1] if latencies else None,
+        "errors": len(recorder.errors),
+        "pending_left": remaining,
+        "thank_you_tweets": len(tweets),
+        "redis_round_trips": sum(commands.values()),
+        "redis_round_trips_by_name": dict(sorted(commands.items())),
+        "redis_pipelined_commands": dict(sorted(metrics.pipelined_commands.items())),
+        "python_peak_memory": peak_python_memory,
+        "process_max_rss_kb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+        "redis_used_memory_before": memory_before,
+        "redis_used_memory_after": await redis_used_memory(admin_client),
+    }
+    await admin_client.flushdb()
+    await admin_client.aclose()
+    await listener_client.aclose()
+    return report
+
+
+def print_report(report):
+    print("\n" + "=" * 30)
+    print(f"{report['transactions']} transactions in {report['elapsed']:.2f}s")
+    print("=" * 30)
+    for key, value in report.items():
+        if key in ("transactions", "elapsed"):
+            continue
+        if isinstance(value, float):
+            value = f"{value:.6f}"
+        print(f"{key}: {value}")
+
+
+def build_client_factory(redis_url):
+    if redis_url:
+        return lambda: (redis.from_url(redis_url), redis.from_url(redis_url))
+    try:
+        import fakeredis
+    except ImportError:
+        raise SystemExit("fakeredis is not installed, run `pip install fakeredis` or pass --redis-url.")
+
+    def make_clients():
+        server = fakeredis.FakeServer()
+        return fakeredis.FakeAsyncRedis(server=server), fakeredis.FakeAsyncRedis(server=server)
+
+    return make_clients
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Benchmark the transaction listener against seeded transactions.")
+    parser.add_argument("--sizes", type=int, nargs="+", default=DEFAULT_SIZES)
+    parser.add_argument("--redis-url", help="Redis to use instead of fakeredis, the database is flushed!")
+    parser.add_argument("--batch-size", type=int, default=transaction_listener.TX_POLL_BATCH_SIZE)
+    parser.add_argument("--transfer-ratio", type=float, default=0.1, help="Share of transfers to our address")
+    parser.add_argument("--senders", type=int, default=1000, help="Number of distinct senders")
+    parser.add_argument("--coalesce-window", type=float, default=0.0)
+    parser.add_argument("--tweet-latency", type=float, default=0.0, help="Seconds spent by the tweet stub")
+    parser.add_argument("--timeout", type=float, default=0.0, help="Give up a run after this many seconds")
+    parser.add_argument("--json", action="store_true", help="Print the reports as JSON")
+    parser.add_argument("--verbose", action="store_true", help="Keep the listener logs")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    random.seed(args.seed)
+    make_clients = build_client_factory(args.redis_url)
+    reports = []
+    for size in args.sizes:
+        report = await run(size, args, make_clients)
+        reports.append(report)
+        if not args.json:
+            print_report(report)
+    if args.json:
+        print(json.dumps(reports, indent=2))
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,83 @@
+# ckb/ckb_address.py
+import re
+
+from config.config import CKB_NETWORK
+from utils.bech32 import bech32_decode, convert_bits, BECH32, BECH32M
+
+# Address HRP -> network
+CKB_ADDRESS_NETWORKS = {
+    "ckb": "mainnet",
+    "ckt": "testnet",
+}
+
+# Payload format types (RFC 0021)
+FORMAT_FULL = 0x00  # bech32m, code hash + hash type + args
+FORMAT_SHORT = 0x01  # deprecated, code hash index + args
+FORMAT_FULL_DATA = 0x02  # deprecated, code hash + args with hash type "data"
+FORMAT_FULL_TYPE = 0x04  # deprecated, code hash + args with hash type "type"
+
+HASH_TYPES = {0x00: "data", 0x01: "type", 0x02: "data1", 0x04: "data2"}
+
+# Code hash index of the short format -> allowed args lengths (secp256k1, multisig, anyone-can-pay)
+SHORT_FORMAT_ARGS_LENGTHS = {0x00: (20,), 0x01: (20,), 0x02: (20, 21, 22)}
+
+# Candidate addresses in a text, checked by parse_ckb_address
+CKB_ADDRESS_PATTERN = re.compile(r"(?<![0-9a-z])ck[bt]1[02-9ac-hj-np-z]{20,}(?![0-9a-z])", re.IGNORECASE)
+
+
+def parse_ckb_address(address: str):
+    """
+    Parse a CKB address offline: bech32/bech32m checksum, network and script format.
+
+    :param address: The address, e.g. ckt1qzda0cr08m85hc8jlnfp3zer7xulejywt49kt2rr0vthywaa50xwsq...
+    :return: Dict with address, network, format, code_hash (or code_hash_index), hash_type and args, None if invalid
+    """
+    if not isinstance(address, str):
+        return None
+    decoded = bech32_decode(address.strip())
+    if decoded is None:
+        return None
+    hrp, data, encoding = decoded
+    payload = convert_bits(data, 5, 8, pad=False)
+    if hrp not in CKB_ADDRESS_NETWORKS or not payload:
+        return None
+
+    format_type, body = payload[0], bytes(payload[1:])
+    result = {"address": address.strip().lower(), "network": CKB_ADDRESS_NETWORKS[hrp], "format": format_type}
+    if format_type == FORMAT_FULL:
+        if encoding != BECH32M or len(body) < 33 or body[32] not in HASH_TYPES:
+            return None
+        result.update(code_hash="0x" + body[:32].hex(), hash_type=HASH_TYPES[body[32]], args="0x" + body[33:].hex())
+    elif format_type == FORMAT_SHORT:
+        if encoding != BECH32 or len(body) < 1 or len(body) - 1 not in SHORT_FORMAT_ARGS_LENGTHS.get(body[0], ()):
+            return None
+        result.update(code_hash_index=body[0], hash_type="type", args="0x" + body[1:].hex())
+    elif format_type in (FORMAT_FULL_DATA, FORMAT_FULL_TYPE):
+        if encoding != BECH32 or len(body) < 32:
+            return None
+        result.update(code_hash="0x" + body[:32].hex(),
+                      hash_type="data" if format_type == FORMAT_FULL_DATA else "type",
+                      args="0x" + body[32:].hex())
+    else:
+        return None
+    return result
+
+
+def is_valid_ckb_address(address: str, network: str = CKB_NETWORK):
+    """
+    :param network: "mainnet" or "testnet", addresses of the other network are invalid. Empty accepts both.
+    """
+    parsed = parse_ckb_address(address)
+    return parsed is not None and (not network or parsed["network"] == network)
+
+
+def find_ckb_addresses(text: str, network: str = CKB_NETWORK):
+    """:return: The valid CKB addresses found in a text, lowercase, in order of appearance"""
+    if not text:
+        return []
+    addresses = []
+    for match in CKB_ADDRESS_PATTERN.finditer(text):
+        address = match.group(0).lower()
+        if address not in addresses and is_valid_ckb_address(address, network):
+            addresses.append(address)
+    return addresses
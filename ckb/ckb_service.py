@@ -1,85 +1,328 @@
 # ckb/ckb_service.py
 import asyncio
 import os
+import time
+from dataclasses import dataclass, field
+from typing import Dict, Optional
 
 import aiohttp
 from dotenv import load_dotenv
-from config.config import AI_TOKEN, SEAL_XUDT_ARGS
+from config.config import AI_TOKEN, SEAL_XUDT_ARGS, CKB_HTTP_POOL_LIMIT, CKB_HTTP_POOL_LIMIT_PER_HOST, \
+    CKB_HTTP_DNS_CACHE_TTL, CKB_HTTP_KEEPALIVE_TIMEOUT, CKB_HTTP_TIMEOUT, CKB_HTTP_CONNECT_TIMEOUT, BALANCE_CACHE_TTL, \
+    CKB_READ_RETRIES, CKB_TRANSFER_RETRIES, CKB_RETRY_BASE_DELAY, CKB_RETRY_MAX_DELAY, CKB_BREAKER_FAILURE_THRESHOLD, \
+    CKB_BREAKER_RESET_TIMEOUT
 from config.logging_config import logger
+from ckb.ckb_address import is_valid_ckb_address
+from utils.metrics import instrument
+from utils.resilience import CircuitBreaker, backoff_delay
 
 BASE_URL = os.getenv("BASE_URL", "http://127.0.0.1:8081")
 
 
+class CkbClient:
+    """
+    Long-lived HTTP client of the CKB backend: one connection pool with keep-alive and DNS caching
+    shared by every call. Opened and closed with the app lifespan, or lazily on first use in scripts.
+    """
+
+    def __init__(self):
+        self._session = None
+
+    async def open(self):
+        if self._session is None or self._session.closed:
+            connector = aiohttp.TCPConnector(
+                limit=CKB_HTTP_POOL_LIMIT,
+                limit_per_host=CKB_HTTP_POOL_LIMIT_PER_HOST,
+                ttl_dns_cache=CKB_HTTP_DNS_CACHE_TTL,
+                keepalive_timeout=CKB_HTTP_KEEPALIVE_TIMEOUT,
+            )
+            timeout = aiohttp.ClientTimeout(total=CKB_HTTP_TIMEOUT, connect=CKB_HTTP_CONNECT_TIMEOUT)
+            self._session = aiohttp.ClientSession(connector=connector, timeout=timeout)
+        return self._session
+
+    async def close(self):
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+        self._session = None
+
+
+ckb_client = CkbClient()
+ckb_breaker = CircuitBreaker("ckb_service", CKB_BREAKER_FAILURE_THRESHOLD, CKB_BREAKER_RESET_TIMEOUT)
+
+
+async def request_backend(method: str, url: str, retries: int = CKB_READ_RETRIES, idempotent: bool = True,
+                          **kwargs):
+    """
+    Send a request to the backend, retried with jittered backoff on connection errors, timeouts, 429 and 5xx.
+    A request which is not idempotent is only retried when it was never sent (connection refused),
+    transfers are made idempotent by an Idempotency-Key header, kept the same across the retries.
+    Fails fast, without any request, while the circuit breaker is open.
+    The error of the last attempt is raised if the request may have been handled, like without retries.
+
+    :return: (status, JSON body of a 200 response), status None if the request was not sent
+    """
+    status, data, error = None, None, None
+    for attempt in range(retries + 1):
+        if attempt:
+            await asyncio.sleep(backoff_delay(attempt - 1, CKB_RETRY_BASE_DELAY, CKB_RETRY_MAX_DELAY))
+        if not ckb_breaker.allow():
+            print(f"CKB backend circuit open, {method} {url} not sent")
+            break
+        sent, error = True, None
+        try:
+            session = await ckb_client.open()
+            async with session.request(method, url, **kwargs) as response:
+                status = response.status
+                data = await response.json() if status == 200 else None
+        except aiohttp.ClientConnectorError as e:
+            status, data, sent = None, None, False
+            print(f"CKB backend unreachable, {method} {url}: {e}")
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            status, data, error = None, None, e
+            print(f"CKB backend request failed, {method} {url}: {e!r}")
+
+        if status is None or status >= 500:
+            ckb_breaker.record_failure()
+        else:
+            ckb_breaker.record_success()
+            if status != 429:
+                return status, data
+        if not idempotent and sent:
+            break
+    if error is not None:
+        raise error
+    return status, data
+
+
+def transfer_headers(idempotency_key: str = None):
+    headers = {"Authorization": AI_TOKEN}
+    if idempotency_key:
+        headers["Idempotency-Key"] = idempotency_key
+    return headers
+
+
+# Balance cache key of CKB, XUDT balances are cached under their xudt args
+CKB_BALANCE_KEY = "CKB"
+
+
+class BalanceCache:
+    """
+    Wallet balances kept for `ttl` seconds. Concurrent reads of an expired balance share one request,
+    and invalidating a balance discards the requests already in flight so a transfer is never hidden.
+    """
+
+    def __init__(self, ttl: float):
+        self.ttl = ttl
+        # key -> (balance, expires_at)
+        self.entries = {}
+        # key -> task fetching the balance
+        self.pending = {}
+        # key -> number of invalidations, a fetch only stores its result if it did not change
+        self.generations = {}
+
+    def get(self, key):
+        entry = self.entries.get(key)
+        if entry is None or entry[1] <= time.monotonic():
+            return None
+        return entry[0]
+
+    def invalidate(self, *keys):
+        for key in keys:
+            self.entries.pop(key, None)
+            self.pending.pop(key, None)
+            self.generations[key] = self.generations.get(key, 0) + 1
+
+    async def get_or_fetch(self, key, fetch):
+        """
+        :param fetch: Coroutine function returning the balance, or None if the request failed (not cached)
+        """
+        balance = self.get(key)
+        if balance is not None:
+            return balance
+        task = self.pending.get(key)
+        if task is None:
+            task = self.pending[key] = asyncio.ensure_future(self._fetch(key, fetch))
+        return await asyncio.shield(task)
+
+    async def _fetch(self, key, fetch):
+        generation = self.generations.get(key, 0)
+        try:
+            balance = await fetch()
+        finally:
+            if self.generations.get(key, 0) == generation:
+                self.pending.pop(key, None)
+        if balance is not None and self.ttl > 0 and self.generations.get(key, 0) == generation:
+            self.entries[key] = (balance, time.monotonic() + self.ttl)
+        return balance
+
+
+balance_cache = BalanceCache(BALANCE_CACHE_TTL)
+
+
+@instrument("ckb_service")
+async def request_balance(xudt_args: str = None):
+    """
+    Request the CKB balance, or the balance of a custom token (XUDT), from the backend.
+    :return: The balance, None if the request failed
+    """
+    url = f"{BASE_URL}/balance/{xudt_args}" if xudt_args else f"{BASE_URL}/balance"
+    status, data = await request_backend("GET", url)
+    if status == 200:
+        return int(data["balance"])
+    else:
+        print(f"Failed to fetch {'token ' if xudt_args else ''}balance, status code: {status}")
+        return None
+
+
 async def fetch_balance():
-    async with aiohttp.ClientSession() as session:
-        url = f"{BASE_URL}/balance"
-        async with session.get(url) as response:
-            if response.status == 200:
-                data = await response.json()
-                return int(data["balance"])
-            else:
-                print(f"Failed to fetch balance, status code: {response.status}")
-                return 0
+    """Fetch the CKB balance, cached for BALANCE_CACHE_TTL seconds."""
+    balance = await balance_cache.get_or_fetch(CKB_BALANCE_KEY, request_balance)
+    return balance if balance is not None else 0
 
 
 async def fetch_token_balance(xudt_args: str = SEAL_XUDT_ARGS):
-    """Fetch the balance of a specified custom token (XUDT)."""
-    async with aiohttp.ClientSession() as session:
-        url = f"{BASE_URL}/balance/{xudt_args}"
-        async with session.get(url) as response:
-            if response.status == 200:
-                data = await response.json()
-                return int(data["balance"])
-            else:
-                print(f"Failed to fetch token balance, status code: {response.status}")
-                return 0
-
-
-async def transfer_ckb(to_address: str, amount_in_ckb: int):
-    """Transfers CKB to the specified address."""
+    """Fetch the balance of a specified custom token (XUDT), cached for BALANCE_CACHE_TTL seconds."""
+    balance = await balance_cache.get_or_fetch(xudt_args, lambda: request_balance(xudt_args))
+    return balance if balance is not None else 0
+
+
+@dataclass
+class WalletSnapshot:
+    """Balances of the wallet, None for a balance which could not be fetched."""
+    ckb: Optional[int]
+    tokens: Dict[str, Optional[int]] = field(default_factory=dict)
+    fetched_at: float = field(default_factory=time.time)
+
+    def token(self, xudt_args: str = SEAL_XUDT_ARGS):
+        return self.tokens.get(xudt_args)
+
+    @property
+    def complete(self):
+        return self.ckb is not None and all(balance is not None for balance in self.tokens.values())
+
+
+async def fetch_wallet_snapshot(*xudt_args_list: str, with_tokens: bool = True):
+    """
+    Fetch the CKB balance and the balances of some custom tokens (XUDT) concurrently, through the balance cache.
+
+    :param xudt_args_list: The XUDT args of the tokens, the Seal token if none is given. Empty args are skipped:
+                           /balance without args is the CKB balance.
+    :param with_tokens: False to only fetch the CKB balance
+    :return: WalletSnapshot
+    """
+    xudt_args_list = xudt_args_list or (SEAL_XUDT_ARGS,)
+    xudt_args_list = [xudt_args for xudt_args in xudt_args_list if xudt_args] if with_tokens else []
+    balances = await asyncio.gather(
+        balance_cache.get_or_fetch(CKB_BALANCE_KEY, request_balance),
+        *(balance_cache.get_or_fetch(xudt_args, lambda xudt_args=xudt_args: request_balance(xudt_args))
+          for xudt_args in xudt_args_list),
+        return_exceptions=True
+    )
+    balances = [None if isinstance(balance, Exception) else balance for balance in balances]
+    return WalletSnapshot(ckb=balances[0], tokens=dict(zip(xudt_args_list, balances[1:])))
+
+
+@instrument("ckb_service")
+async def transfer_ckb(to_address: str, amount_in_ckb: int, idempotency_key: str = None):
+    """
+    Transfers CKB to the specified address.
+    :param idempotency_key: Same key for the same payout, lets the transfer be retried safely
+    """
+    if not is_valid_ckb_address(to_address):
+        print(f"Invalid CKB address, transfer refused: {to_address}")
+        return None
     url = f"{BASE_URL}/transfer"
-    headers = {"Authorization": AI_TOKEN}
     payload = {
         "toAddress": to_address,
         "amountInCKB": str(amount_in_ckb)
     }
 
-    async with aiohttp.ClientSession() as session:
-        async with session.post(url, headers=headers, json=payload) as response:
-            if response.status == 200:
-                data = await response.json()
+    status, data = await request_backend("POST", url, retries=CKB_TRANSFER_RETRIES,
+                                         idempotent=bool(idempotency_key),
+                                         headers=transfer_headers(idempotency_key), json=payload)
+    # The backend may have sent the transfer even if the response is an error
+    balance_cache.invalidate(CKB_BALANCE_KEY)
+    if status == 200:
+        # print successfully!!!
+        print("\n" + "=" * 30)
+        print("Transfer CKB successfully")
+        print("=" * 30 + "\n")
 
-                # print successfully!!!
-                print("\n" + "=" * 30)
-                print("Transfer CKB successfully")
-                print("=" * 30 + "\n")
+        return f"Transfer successfully! your txHash is {data['txHash']}"
+    else:
+        print(f"Failed to transfer CKB, status code: {status}")
+        return None
 
-                return f"Transfer successfully! your txHash is {data['txHash']}"
-            else:
-                print(f"Failed to transfer CKB, status code: {response.status}")
-                return None
 
-
-async def transfer_token(to_address: str, amount: int, xudt_args: str = SEAL_XUDT_ARGS):
-    """Transfers a specified amount of a custom token (XUDT) to the specified address."""
+@instrument("ckb_service")
+async def transfer_token(to_address: str, amount: int, xudt_args: str = SEAL_XUDT_ARGS, idempotency_key: str = None):
+    """
+    Transfers a specified amount of a custom token (XUDT) to the specified address.
+    :param idempotency_key: Same key for the same payout, lets the transfer be retried safely
+    """
+    if not is_valid_ckb_address(to_address):
+        print(f"Invalid CKB address, transfer refused: {to_address}")
+        return None
     url = f"{BASE_URL}/transfer/{xudt_args}"
-    headers = {"Authorization": AI_TOKEN}
     payload = {
         "toAddress": to_address,
         "amountInCKB": str(amount)  # "amountInCKB" here refers to the token amount unit
     }
 
-    async with aiohttp.ClientSession() as session:
-        async with session.post(url, headers=headers, json=payload) as response:
-            if response.status == 200:
-                data = await response.json()
-                print("Transfer Token successfully")
-                return f"Transfer successfully! Your txHash is {data['txHash']}"
-            else:
-                print(f"Failed to transfer Token, status code: {response.status}")
-                return None
+    status, data = await request_backend("POST", url, retries=CKB_TRANSFER_RETRIES,
+                                         idempotent=bool(idempotency_key),
+                                         headers=transfer_headers(idempotency_key), json=payload)
+    # Fees are paid in CKB
+    balance_cache.invalidate(xudt_args, CKB_BALANCE_KEY)
+    if status == 200:
+        print("Transfer Token successfully")
+        return f"Transfer successfully! Your txHash is {data['txHash']}"
+    else:
+        print(f"Failed to transfer Token, status code: {status}")
+        return None
+
+
+class BatchTransferUnsupported(Exception):
+    """The backend has no /transfer/batch endpoint (404 or 405)."""
+
+
+@instrument("ckb_service")
+async def transfer_batch(outputs, xudt_args: str = None, idempotency_key: str = None):
+    """
+    Transfer CKB, or a custom token (XUDT), to several addresses in a single transaction.
+
+    :param outputs: List of (to_address, amount) tuples
+    :param xudt_args: The XUDT args of the token, None to transfer CKB
+    :param idempotency_key: Same key for the same batch, lets the transfer be retried safely
+    :return: The txHash of the transaction, None if the request fails or an address is invalid
+    :raises BatchTransferUnsupported: If the backend does not know the batch endpoint
+    """
+    invalid_addresses = [to_address for to_address, _ in outputs if not is_valid_ckb_address(to_address)]
+    if invalid_addresses:
+        print(f"Invalid CKB addresses, batch transfer refused: {invalid_addresses}")
+        return None
+    url = f"{BASE_URL}/transfer/batch/{xudt_args}" if xudt_args else f"{BASE_URL}/transfer/batch"
+    payload = {
+        # "amountInCKB" refers to the token amount unit for XUDT transfers
+        "outputs": [{"toAddress": to_address, "amountInCKB": str(amount)} for to_address, amount in outputs]
+    }
+
+    status, data = await request_backend("POST", url, retries=CKB_TRANSFER_RETRIES,
+                                         idempotent=bool(idempotency_key),
+                                         headers=transfer_headers(idempotency_key), json=payload)
+    if status in (404, 405):
+        # Nothing was transferred, the caller pays the outputs one by one
+        raise BatchTransferUnsupported(f"Batch transfers are not supported by the backend, status code: {status}")
+    balance_cache.invalidate(*((xudt_args, CKB_BALANCE_KEY) if xudt_args else (CKB_BALANCE_KEY,)))
+    if status == 200:
+        print(f"Batch transfer to {len(outputs)} addresses successfully, txHash: {data['txHash']}")
+        return data["txHash"]
+    else:
+        print(f"Failed to batch transfer, status code: {status}")
+        return None
 
 
+@instrument("ckb_service")
 async def fetch_invoice_detail(invoice: str):
     """
     Fetch and validate a Fiber invoice.
@@ -91,50 +334,57 @@ async def fetch_invoice_detail(invoice: str):
     headers = {"Authorization": AI_TOKEN}  # Add authorization header if required
     params = {"invoice": invoice}
 
-    async with aiohttp.ClientSession() as session:
-        async with session.get(url, headers=headers, params=params) as response:
-            if response.status == 200:
-                data = await response.json()
-                print("\n" + "=" * 30)
-                print("Fetched Invoice Details Successfully")
-                print("=" * 30 + "\n")
-                return data
-            else:
-                print(f"Failed to fetch invoice details, status code: {response.status}")
-                logger.info(f"Failed to fetch invoice details, status code: {response.status}")
-                return None
+    status, data = await request_backend("GET", url, headers=headers, params=params)
+    if status == 200:
+        print("\n" + "=" * 30)
+        print("Fetched Invoice Details Successfully")
+        print("=" * 30 + "\n")
+        return data
+    else:
+        print(f"Failed to fetch invoice details, status code: {status}")
+        logger.info(f"Failed to fetch invoice details, status code: {status}")
+        return None
 
 
-async def transfer_ckb_with_invoice(invoice: str, amount_in_ckb: int, channel_id=None):
+@instrument("ckb_service")
+async def transfer_ckb_with_invoice(invoice: str, amount_in_ckb: int, channel_id=None, idempotency_key: str = None):
     """
     Transfer CKB using a Fiber invoice.
 
     :param invoice: The Fiber invoice string
     :param amount_in_ckb: The amount to transfer in CKB
     :param channel_id: The channel ID associated with the transfer
+    :param idempotency_key: Same key for the same payout, lets the transfer be retried safely
     :return: JSON response with transfer details or None if the request fails
     """
     url = f"{BASE_URL}/fiber/transfer"
-    headers = {"Authorization": AI_TOKEN}  # Authorization header
     payload = {
         "invoice": invoice,
         "amountInCKB": amount_in_ckb,
         "channelId": channel_id
     }
 
-    async with aiohttp.ClientSession() as session:
-        async with session.post(url, headers=headers, json=payload) as response:
-            if response.status == 200:
-                data = await response.json()
-                print("\n" + "=" * 30)
-                print("Transfer CKB using Fiber Invoice Successful")
-                logger.info("Transfer CKB using Fiber Invoice Successful")
-                print("=" * 30 + "\n")
-                return data
-            else:
-                print(f"Failed to transfer CKB, status code: {response.status}")
-                logger.info(f"Failed to fetch invoice details, status code: {response.status}")
-                return None
+    status, data = await request_backend("POST", url, retries=CKB_TRANSFER_RETRIES,
+                                         idempotent=bool(idempotency_key),
+                                         headers=transfer_headers(idempotency_key), json=payload)
+    balance_cache.invalidate(CKB_BALANCE_KEY)
+    if status == 200:
+        print("\n" + "=" * 30)
+        print("Transfer CKB using Fiber Invoice Successful")
+        logger.info("Transfer CKB using Fiber Invoice Successful")
+        print("=" * 30 + "\n")
+        return data
+    else:
+        print(f"Failed to transfer CKB, status code: {status}")
+        logger.info(f"Failed to fetch invoice details, status code: {status}")
+        return None
+
+
+async def test():
+    try:
+        await transfer_token("12314134", 10)
+    finally:
+        await ckb_client.close()
 
 if __name__ == "__main__":
-    asyncio.run(transfer_token("12314134", 10))
+    asyncio.run(test())
@@ -0,0 +1,130 @@
+# ckb/fiber_invoice.py
+import re
+import time
+
+from ckb.ckb_service import fetch_invoice_detail
+from config.config import FIBER_INVOICE_CONFIRM
+from utils.bech32 import bech32_decode, BECH32M
+
+# Currency prefix of the invoice HRP -> network
+FIBER_CURRENCIES = {
+    "fibb": "mainnet",
+    "fibt": "testnet",
+    "fibd": "devnet",
+}
+
+# Candidate invoices in a text, checked by decode_fiber_invoice
+FIBER_INVOICE_PATTERN = re.compile(r"(?<![0-9a-z])fib[btd][0-9]*1[02-9ac-hj-np-z]{6,}(?![0-9a-z])", re.IGNORECASE)
+# Text looking like the start of an invoice, e.g. an invoice broken by a line break
+FIBER_INVOICE_HINT_PATTERN = re.compile(r"fib[btd]", re.IGNORECASE)
+
+
+def decode_fiber_invoice(invoice: str):
+    """
+    Decode a Fiber invoice offline: bech32m checksum, currency and amount of the HRP.
+    The payment data (timestamp, expiry, payment hash) is compressed, it is only known after a confirmation
+    by the backend, see parse_expiry.
+
+    :param invoice: The Fiber invoice string, e.g. fibt1000000001p...
+    :return: Dict with invoice, currency, network and amount (in shannons, None if open), None if malformed
+    """
+    if not isinstance(invoice, str):
+        return None
+    invoice = invoice.strip()
+    decoded = bech32_decode(invoice)
+    if decoded is None:
+        return None
+    hrp, data, encoding = decoded
+    currency, amount = hrp[:4], hrp[4:]
+    if encoding != BECH32M or currency not in FIBER_CURRENCIES or not data:
+        return None
+    if amount and (not amount.isdigit() or amount.startswith("0")):
+        return None
+    return {
+        "invoice": invoice.lower(),
+        "currency": currency,
+        "network": FIBER_CURRENCIES[currency],
+        "amount": int(amount) if amount else None,
+        "expires_at": None,
+    }
+
+
+def extract_fiber_invoices(text: str):
+    """
+    Find the Fiber invoices of a text without any network call.
+
+    :return: (valid invoices in order of appearance, True if the text also holds something looking like an invoice
+             which is not a valid one)
+    """
+    text = text or ""
+    candidates = FIBER_INVOICE_PATTERN.findall(text)
+    invoices = []
+    has_invalid = len(FIBER_INVOICE_HINT_PATTERN.findall(text)) > len(candidates)
+    for candidate in candidates:
+        decoded = decode_fiber_invoice(candidate)
+        if decoded is None:
+            has_invalid = True
+        elif decoded["invoice"] not in invoices:
+            invoices.append(decoded["invoice"])
+    return invoices, has_invalid
+
+
+def _to_int(value):
+    if isinstance(value, int):
+        return value
+    if isinstance(value, str):
+        try:
+            return int(value, 16) if value.startswith("0x") else int(value)
+        except ValueError:
+            return None
+    return None
+
+
+def parse_expiry(detail):
+    """
+    Expiry time (unix seconds) of an invoice parsed by the backend, in the format of the Fiber `parse_invoice` RPC:
+    data.timestamp in milliseconds and an expiry_time attribute in seconds.
+    :return: The expiry time, None if the invoice does not expire or the detail has another format
+    """
+    if not isinstance(detail, dict):
+        return None
+    data = (detail.get("invoice") or detail).get("data")
+    if not isinstance(data, dict):
+        return None
+    timestamp = _to_int(data.get("timestamp"))
+    for attr in data.get("attrs") or []:
+        if isinstance(attr, dict) and "expiry_time" in attr:
+            expiry = _to_int(attr["expiry_time"])
+            if timestamp is not None and expiry is not None:
+                return timestamp / 1000 + expiry
+    return None
+
+
+async def validate_fiber_invoice(invoice: str, confirm: bool = FIBER_INVOICE_CONFIRM):
+    """
+    Validate a Fiber invoice before paying it: malformed invoices are rejected locally, without calling the backend,
+    the others are confirmed with the backend (/fiber/invoice) if `confirm`.
+    The expiry time is in the compressed payment data, which is not decoded locally: only the backend rejects
+    expired invoices, and there is one confirmation per payout.
+
+    :param invoice: The Fiber invoice string
+    :param confirm: Also ask the backend, which knows the expiry time
+    :return: The decoded invoice, with the backend details under "detail" and expires_at if confirmed,
+             None if invalid or expired
+    """
+    decoded = decode_fiber_invoice(invoice)
+    if decoded is None:
+        print(f"Malformed Fiber invoice: {invoice}")
+        return None
+    if not confirm:
+        return decoded
+
+    detail = await fetch_invoice_detail(decoded["invoice"])
+    if not detail:
+        return None
+    decoded["detail"] = detail
+    decoded["expires_at"] = parse_expiry(detail)
+    if decoded["expires_at"] is not None and decoded["expires_at"] <= time.time():
+        print(f"Expired Fiber invoice: {invoice}")
+        return None
+    return decoded
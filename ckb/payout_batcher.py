@@ -0,0 +1,137 @@
+# ckb/payout_batcher.py
+import asyncio
+import hashlib
+
+from ckb.ckb_address import is_valid_ckb_address
+from ckb.ckb_service import transfer_batch, transfer_ckb, transfer_token, BatchTransferUnsupported
+from config.config import PAYOUT_BATCH_WINDOW, PAYOUT_BATCH_MAX_SIZE, PAYOUT_BATCH_TRANSFERS
+
+
+class PayoutBatcher:
+    """
+    Collects approved rewards and pays them with one multi-output transfer per currency,
+    once `window` seconds have passed since the first reward of the batch or `max_size` rewards are queued.
+    Without `enabled` (or once the backend turned out not to have /transfer/batch) every reward is
+    paid right away with its own transfer.
+    """
+
+    def __init__(self, window: float, max_size: int, enabled: bool = True):
+        self.window = window
+        self.max_size = max_size
+        self.enabled = enabled
+        # xudt args (None for CKB) -> [(to_address, amount, future, idempotency_key), ...]
+        self.batches = {}
+        # xudt args -> task flushing the batch at the end of the window
+        self.timers = {}
+        self.tasks = set()
+
+    def submit(self, to_address: str, amount: int, xudt_args: str = None, idempotency_key: str = None):
+        """
+        Queue a reward.
+        :param idempotency_key: Key of the payout, the transfer paying it is retried under a key derived from it
+        :return: Future resolved with the transfer result of this recipient, like transfer_ckb
+        """
+        future = asyncio.get_running_loop().create_future()
+        if not is_valid_ckb_address(to_address):
+            # Kept out of the batch, a single bad address would get the whole transfer refused
+            print(f"Invalid CKB address, payout refused: {to_address}")
+            future.set_result(None)
+            return future
+        if not self.enabled:
+            self._track(asyncio.create_task(self._send([(to_address, amount, future, idempotency_key)], xudt_args)))
+            return future
+        batch = self.batches.setdefault(xudt_args, [])
+        batch.append((to_address, amount, future, idempotency_key))
+        if len(batch) >= self.max_size:
+            timer = self.timers.pop(xudt_args, None)
+            if timer:
+                timer.cancel()
+            # Taken out right away so that the next rewards start a new batch
+            self._track(asyncio.create_task(self._send(self.batches.pop(xudt_args), xudt_args)))
+        elif xudt_args not in self.timers:
+            self.timers[xudt_args] = self._track(asyncio.create_task(self._flush_later(xudt_args)))
+        return future
+
+    def withdraw(self, future):
+        """
+        Take a reward out of its batch if the batch has not been sent yet.
+        :param future: The future returned by submit
+        :return: True if withdrawn, nothing will be paid for it
+        """
+        for xudt_args, batch in list(self.batches.items()):
+            for item in batch:
+                if item[2] is future:
+                    batch.remove(item)
+                    if not batch:
+                        del self.batches[xudt_args]
+                        timer = self.timers.pop(xudt_args, None)
+                        if timer:
+                            timer.cancel()
+                    return True
+        return False
+
+    def _track(self, task):
+        self.tasks.add(task)
+        task.add_done_callback(self.tasks.discard)
+        return task
+
+    async def _flush_later(self, xudt_args):
+        await asyncio.sleep(self.window)
+        self.timers.pop(xudt_args, None)
+        await self._flush(xudt_args)
+
+    async def _flush(self, xudt_args):
+        batch = self.batches.pop(xudt_args, [])
+        if batch:
+            await self._send(batch, xudt_args)
+
+    async def _send(self, batch, xudt_args):
+        try:
+            results = await self._transfer(batch, xudt_args)
+            for (_, _, future, _), result in zip(batch, results):
+                if not future.done():
+                    future.set_result(result)
+        except Exception as e:
+            print(f"Batch transfer error: {e}")
+            for _, _, future, _ in batch:
+                if not future.done():
+                    future.set_exception(e)
+
+    @staticmethod
+    async def _transfer_each(batch, xudt_args):
+        """Pay the rewards of a batch one transfer after the other."""
+        results = []
+        for to_address, amount, _, idempotency_key in batch:
+            if xudt_args:
+                results.append(await transfer_token(to_address, amount, xudt_args, idempotency_key=idempotency_key))
+            else:
+                results.append(await transfer_ckb(to_address, amount, idempotency_key=idempotency_key))
+        return results
+
+    async def _transfer(self, batch, xudt_args):
+        if len(batch) == 1 or not self.enabled:
+            return await self._transfer_each(batch, xudt_args)
+
+        keys = [idempotency_key for _, _, _, idempotency_key in batch]
+        idempotency_key = hashlib.sha256("\n".join(keys).encode()).hexdigest() if all(keys) else None
+        try:
+            tx_hash = await transfer_batch([(to_address, amount) for to_address, amount, _, _ in batch], xudt_args,
+                                           idempotency_key=idempotency_key)
+        except BatchTransferUnsupported as e:
+            print(f"{e}, paying rewards one by one from now on.")
+            self.enabled = False
+            return await self._transfer_each(batch, xudt_args)
+        if tx_hash is None:
+            return [None] * len(batch)
+        return [f"Transfer successfully! your txHash is {tx_hash}"] * len(batch)
+
+    async def stop(self):
+        """Pay the queued rewards right away, e.g. on shutdown."""
+        for timer in self.timers.values():
+            timer.cancel()
+        self.timers = {}
+        await asyncio.gather(*(self._flush(xudt_args) for xudt_args in list(self.batches)))
+        await asyncio.gather(*self.tasks, return_exceptions=True)
+
+
+payout_batcher = PayoutBatcher(PAYOUT_BATCH_WINDOW, PAYOUT_BATCH_MAX_SIZE, PAYOUT_BATCH_TRANSFERS)
@@ -0,0 +1,239 @@
+# ckb/payout_outbox.py
+import asyncio
+import json
+import time
+
+from ckb.ckb_address import is_valid_ckb_address
+from ckb.ckb_service import transfer_ckb_with_invoice
+from ckb.payout_batcher import payout_batcher
+from config.config import redis_client, PAYOUT_MAX_ATTEMPTS, PAYOUT_RETRY_DELAY, PAYOUT_POLL_INTERVAL, \
+    PAYOUT_LEASE_MS, PAYOUT_OUTBOX_BATCH_SIZE
+from utils.supervisor import supervisor
+
+# Payout states
+PAYOUT_PENDING = "pending"  # waiting for a (new) attempt
+PAYOUT_SUBMITTED = "submitted"  # sent to the backend, outcome not known yet
+PAYOUT_CONFIRMED = "confirmed"  # the backend accepted the transfer
+PAYOUT_FAILED = "failed"  # given up, needs a manual check
+
+# Payout kinds
+PAYOUT_INVOICE = "invoice"  # CKB paid to a Fiber invoice
+PAYOUT_ADDRESS = "address"  # CKB or XUDT paid to an address
+
+# Sorted set of the payouts still to attempt, scored by the time of their next attempt
+PAYOUT_OUTBOX_KEY = "payout:outbox"
+# Prefix of the payout records (JSON), followed by the idempotency key
+PAYOUT_RECORD_PREFIX = "payout:record:"
+# Prefix of the leases taken by a worker while it attempts a payout
+PAYOUT_LEASE_PREFIX = "payout:lease:"
+
+
+def payout_idempotency_key(tweet_id, recipient):
+    """A reward is paid at most once per tweet and recipient (address or invoice)."""
+    return f"{tweet_id}:{recipient}"
+
+
+class PayoutOutbox:
+    """
+    Durable outbox of approved rewards. Every reward is stored in Redis before anything is paid,
+    then attempted by the worker until it is confirmed or failed, so a payout is retried
+    without going through the LLM judging again and is never paid twice for the same key.
+
+    A payout found `submitted` (the process died or the request timed out mid-transfer) is only
+    sent again when it pays an invoice, since a Fiber invoice cannot be paid twice. Transfers to an
+    address are marked failed instead, to be checked by hand.
+    """
+
+    def __init__(self, max_attempts: int, retry_delay: float, poll_interval: float):
+        self.max_attempts = max_attempts
+        self.retry_delay = retry_delay
+        self.poll_interval = poll_interval
+        # name -> coroutine function called with the record once the payout is confirmed
+        self.handlers = {}
+
+    def register_handler(self, name, func):
+        self.handlers[name] = func
+
+    async def enqueue(self, tweet_id, recipient, amount, kind=PAYOUT_ADDRESS, xudt_args=None, handler=None,
+                      context=None):
+        """
+        Store an approved reward, unless a reward with the same idempotency key already exists.
+
+        :param recipient: The address, or the invoice for PAYOUT_INVOICE payouts
+        :param handler: Name of a registered handler to call once the payout is confirmed
+        :param context: JSON serializable data for the handler
+        :return: (record, created)
+        """
+        key = payout_idempotency_key(tweet_id, recipient)
+        now = time.time()
+        record = {
+            "key": key,
+            "tweet_id": str(tweet_id),
+            "kind": kind,
+            "recipient": recipient,
+            "amount": amount,
+            "xudt_args": xudt_args,
+            "handler": handler,
+            "context": context,
+            "state": PAYOUT_PENDING,
+            "attempts": 0,
+            "result": None,
+            "last_error": None,
+            "created_at": now,
+            "updated_at": now,
+        }
+        created = await redis_client.set(f"{PAYOUT_RECORD_PREFIX}{key}", json.dumps(record), nx=True)
+        if not created:
+            record = await self.get(key)
+        if record["state"] in (PAYOUT_PENDING, PAYOUT_SUBMITTED):
+            # Also covers a crash between storing the record and queueing it
+            await redis_client.zadd(PAYOUT_OUTBOX_KEY, {key: now}, nx=True)
+        return record, bool(created)
+
+    async def get(self, key):
+        record = await redis_client.get(f"{PAYOUT_RECORD_PREFIX}{key}")
+        return json.loads(record) if record else None
+
+    async def _save(self, record, next_attempt_at=None):
+        record["updated_at"] = time.time()
+        async with redis_client.pipeline(transaction=True) as pipe:
+            pipe.set(f"{PAYOUT_RECORD_PREFIX}{record['key']}", json.dumps(record))
+            if record["state"] in (PAYOUT_CONFIRMED, PAYOUT_FAILED):
+                pipe.zrem(PAYOUT_OUTBOX_KEY, record["key"])
+            elif next_attempt_at is not None:
+                pipe.zadd(PAYOUT_OUTBOX_KEY, {record["key"]: next_attempt_at})
+            await pipe.execute()
+
+    def _next_attempt_at(self, record):
+        return time.time() + self.retry_delay * 2 ** max(0, record["attempts"] - 1)
+
+    async def process(self, key):
+        """
+        Attempt a payout if it is due, holding a lease so that a single worker attempts it.
+        :return: The record after the attempt, None if another worker holds it or it does not exist
+        """
+        lease_key = f"{PAYOUT_LEASE_PREFIX}{key}"
+        if not await redis_client.set(lease_key, "1", nx=True, px=PAYOUT_LEASE_MS):
+            return None
+        try:
+            record = await self.get(key)
+            if record is None:
+                await redis_client.zrem(PAYOUT_OUTBOX_KEY, key)
+                return None
+            if record["state"] in (PAYOUT_PENDING, PAYOUT_SUBMITTED):
+                await self._attempt(record)
+            return record
+        finally:
+            await redis_client.delete(lease_key)
+
+    async def _attempt(self, record):
+        if record["state"] == PAYOUT_SUBMITTED and record["kind"] != PAYOUT_INVOICE:
+            record["last_error"] = "Interrupted during the transfer, check the wallet before paying again."
+        elif record["kind"] == PAYOUT_ADDRESS and not is_valid_ckb_address(record["recipient"]):
+            record["last_error"] = "Invalid CKB address"
+        elif record["attempts"] >= self.max_attempts:
+            record["last_error"] = f"Gave up after {record['attempts']} attempts: {record['last_error']}"
+        else:
+            record["last_error"] = None
+        if record["last_error"]:
+            record["state"] = PAYOUT_FAILED
+            print(f"Payout {record['key']} failed: {record['last_error']}")
+            await self._save(record)
+            return
+
+        # Saved before sending, so an interrupted transfer is known as such
+        record["state"] = PAYOUT_SUBMITTED
+        record["attempts"] += 1
+        await self._save(record, self._next_attempt_at(record))
+        try:
+            if record["kind"] == PAYOUT_INVOICE:
+                result = await transfer_ckb_with_invoice(record["recipient"], record["amount"],
+                                                         idempotency_key=record["key"])
+            else:
+                future = payout_batcher.submit(record["recipient"], record["amount"], record["xudt_args"],
+                                               idempotency_key=record["key"])
+                try:
+                    # Shielded, cancelling the worker must not drop the reward from a batch being sent
+                    result = await asyncio.shield(future)
+                except asyncio.CancelledError:
+                    await self._cancel_batched(record, future)
+                    raise
+        except Exception as e:
+            # Outcome unknown, the payout stays submitted until its next attempt
+            record["last_error"] = str(e)
+            print(f"Payout {record['key']} interrupted: {e}")
+            await self._save(record)
+            return
+        await self._record_result(record, result)
+
+    async def _cancel_batched(self, record, future):
+        """
+        The worker is cancelled (e.g. on shutdown) while the payout waits in the batcher.
+        A payout still queued is withdrawn and pending again, one whose transfer is in flight gets its outcome recorded.
+        """
+        if payout_batcher.withdraw(future):
+            record["state"] = PAYOUT_PENDING
+            record["attempts"] -= 1
+            record["last_error"] = None
+            print(f"Payout {record['key']} withdrawn before its transfer, pending again")
+            await self._save(record, time.time())
+            return
+        try:
+            result = await future
+        except Exception as e:
+            record["last_error"] = str(e)
+            print(f"Payout {record['key']} interrupted: {e}")
+            await self._save(record)
+            return
+        await self._record_result(record, result)
+
+    async def _record_result(self, record, result):
+        if result:
+            record["state"] = PAYOUT_CONFIRMED
+            record["result"] = result if isinstance(result, str) else json.dumps(result)
+            record["last_error"] = None
+            print(f"Payout {record['key']} confirmed: {record['result']}")
+            await self._save(record)
+            await self._call_handler(record)
+            return
+
+        # The backend refused the transfer, nothing was sent
+        record["last_error"] = "Transfer refused by the backend"
+        record["state"] = PAYOUT_PENDING if record["attempts"] < self.max_attempts else PAYOUT_FAILED
+        print(f"Payout {record['key']} attempt {record['attempts']} failed, state: {record['state']}")
+        await self._save(record, self._next_attempt_at(record))
+
+    async def _call_handler(self, record):
+        handler = self.handlers.get(record["handler"])
+        if handler is None:
+            return
+        try:
+            await handler(record)
+        except Exception as e:
+            print(f"Error in payout handler {record['handler']} for {record['key']}: {e}")
+
+    async def run(self):
+        """Worker draining the outbox, payouts due at the same time are attempted concurrently."""
+        while True:
+            supervisor.begin_iteration("payout_outbox")
+            try:
+                keys = await redis_client.zrangebyscore(
+                    PAYOUT_OUTBOX_KEY, "-inf", time.time(), start=0, num=PAYOUT_OUTBOX_BATCH_SIZE
+                )
+                results = await asyncio.gather(
+                    *(self.process(key.decode("utf-8")) for key in keys), return_exceptions=True
+                )
+                for key, result in zip(keys, results):
+                    if isinstance(result, Exception):
+                        print(f"Error processing payout {key.decode('utf-8')}: {result}")
+                supervisor.end_iteration("payout_outbox")
+            except Exception as e:
+                print(f"Error in payout outbox: {e}")
+                supervisor.record_error("payout_outbox", e)
+            await asyncio.sleep(self.poll_interval)
+
+    async def backlog(self):
+        return await redis_client.zcard(PAYOUT_OUTBOX_KEY)
+
+
+payout_outbox = PayoutOutbox(PAYOUT_MAX_ATTEMPTS, PAYOUT_RETRY_DELAY, PAYOUT_POLL_INTERVAL)
@@ -0,0 +1,578 @@
+# ckb/transaction_listener.py
+import asyncio
+import json
+import os
+import socket
+import time
+
+from redis.exceptions import ResponseError
+
+from ckb.ckb_service import balance_cache, CKB_BALANCE_KEY
+from config.config import redis_client, OUR_ADDRESS, TX_POLL_INTERVAL, TX_POLL_BATCH_SIZE, TX_LISTENER_MODE, \
+    TX_STREAM_KEY, TX_STREAM_GROUP, TX_STREAM_BLOCK_MS, TX_STREAM_CLAIM_IDLE_MS, TX_STREAM_MAXLEN, TX_FETCH_CHUNK_SIZE, \
+    THANKS_COALESCE_WINDOW, TX_LEASE_MS, TX_RETRY_DELAY, TX_MAX_ATTEMPTS
+from openai_api.thanks_dispatcher import thanks_dispatcher
+from utils.supervisor import supervisor
+
+# Sorted set written by the indexer, holding txHashes that still need processing
+TX_PENDING_KEY = "transaction_hash"
+# Sorted set holding txHashes that were already handled (same score as in TX_PENDING_KEY)
+TX_PROCESSED_KEY = "transaction_hash:processed"
+
+# Hash of the failed attempts of the pending txHashes, txHash -> count
+TX_ATTEMPTS_KEY = "transaction_hash:attempts"
+# Hash of the txHashes given up after TX_MAX_ATTEMPTS, txHash -> JSON with score, attempts and last error
+TX_FAILED_KEY = "transaction_hash:failed"
+
+# Returned instead of a payload when the transaction waits in the thank-you coalescing window
+TX_DEFERRED = "deferred"
+
+# Prefix of the per-transaction lease keys, a lease tells which worker owns a pending transaction
+TX_LEASE_PREFIX = "transaction_hash:lease:"
+
+# Owner of the lease of a failed transaction until its next attempt, no worker claims it meanwhile
+TX_RETRY_LEASE_OWNER = "retry"
+
+# Name of this worker: owner of its leases in poll mode, consumer name inside the stream consumer group
+TX_WORKER_ID = f"{socket.gethostname()}-{os.getpid()}"
+
+# Global variable to stop the listener
+transaction_stop_event = asyncio.Event()
+
+
+async def fetch_transactions(tx_hashes):
+    """
+    Fetch the payloads of several transactions from the 'transactions' HASH in one round trip.
+    The HMGETs are split in chunks of TX_FETCH_CHUNK_SIZE fields and sent in a single pipeline.
+    :return: Raw payloads in the same order as tx_hashes, None for missing ones
+    """
+    if not tx_hashes:
+        return []
+    async with redis_client.pipeline(transaction=False) as pipe:
+        for i in range(0, len(tx_hashes), TX_FETCH_CHUNK_SIZE):
+            pipe.hmget("transactions", tx_hashes[i:i + TX_FETCH_CHUNK_SIZE])
+        chunks = await pipe.execute()
+    return [tx_data for chunk in chunks for tx_data in chunk]
+
+
+def queue_mark_transactions_processed(pipe, processed):
+    """
+    Queue the commands that tag transactions as processed and move their txHashes
+    from the pending index to the processed index.
+    :param processed: List of (tx_hash, score, tx_data) tuples
+    """
+    if not processed:
+        return
+    pipe.hset("transactions", mapping={tx_hash: json.dumps(tx_data) for tx_hash, _, tx_data in processed})
+    pipe.zadd(TX_PROCESSED_KEY, {tx_hash: score for tx_hash, score, _ in processed})
+    pipe.zrem(TX_PENDING_KEY, *[tx_hash for tx_hash, _, _ in processed])
+    pipe.hdel(TX_ATTEMPTS_KEY, *[tx_hash for tx_hash, _, _ in processed])
+
+
+async def retry_failed_transactions(failed):
+    """
+    Back off the pending transactions which could not be handled (missing payload, error...), so that they do not
+    fill every poll: their lease is handed to TX_RETRY_LEASE_OWNER until the next attempt, TX_RETRY_DELAY seconds
+    doubled at each attempt. After TX_MAX_ATTEMPTS they leave the pending set for the TX_FAILED_KEY hash.
+    :param failed: List of (tx_hash, score, error) tuples
+    """
+    if not failed:
+        return
+    async with redis_client.pipeline(transaction=False) as pipe:
+        for tx_hash, _, _ in failed:
+            pipe.hincrby(TX_ATTEMPTS_KEY, tx_hash, 1)
+        attempts = await pipe.execute()
+    async with redis_client.pipeline(transaction=True) as pipe:
+        for (tx_hash, score, error), attempt in zip(failed, attempts):
+            if attempt >= TX_MAX_ATTEMPTS:
+                print(f"Giving up transaction {tx_hash} after {attempt} attempts: {error}")
+                pipe.hset(TX_FAILED_KEY, tx_hash, json.dumps({"score": score, "attempts": attempt, "error": error}))
+                pipe.zrem(TX_PENDING_KEY, tx_hash)
+                pipe.hdel(TX_ATTEMPTS_KEY, tx_hash)
+            else:
+                delay_ms = int(TX_RETRY_DELAY * 1000 * 2 ** (attempt - 1))
+                pipe.set(f"{TX_LEASE_PREFIX}{tx_hash}", TX_RETRY_LEASE_OWNER, px=max(delay_ms, 1))
+        await pipe.execute()
+
+
+async def requeue_pushed_transactions(transactions):
+    """
+    Queue again transactions pushed by the indexer whose thank-you tweet failed: unlike polled or streamed ones,
+    they are not in the pending set or the stream, so nothing would retry them.
+    They go to the pending set in poll mode and to the stream in stream mode.
+    :param transactions: List of (tx_hash, score) tuples
+    """
+    if not transactions:
+        return
+    async with redis_client.pipeline(transaction=True) as pipe:
+        if TX_LISTENER_MODE == "stream":
+            for tx_hash, _ in transactions:
+                # Released so that any consumer can handle the new entry
+                pipe.delete(f"{TX_LEASE_PREFIX}{tx_hash}")
+                pipe.xadd(TX_STREAM_KEY, {"txHash": tx_hash}, maxlen=TX_STREAM_MAXLEN, approximate=True)
+        else:
+            # Polled transactions are still in the pending set, NX keeps their score
+            pipe.zadd(TX_PENDING_KEY, {tx_hash: score for tx_hash, score in transactions}, nx=True)
+        await pipe.execute()
+
+
+async def claim_transactions(tx_hashes):
+    """
+    Take a lease on every transaction with SET NX PX so that a single worker handles it,
+    and renew the leases of the transactions waiting in this worker's coalescing window.
+    Leases are never deleted: they expire after TX_LEASE_MS, once the transaction has left the pending set.
+    :return: The txHashes owned by this worker, newly claimed or already leased by it
+    """
+    if not tx_hashes:
+        return set()
+    async with redis_client.pipeline(transaction=False) as pipe:
+        for tx_hash in tx_hashes:
+            pipe.set(f"{TX_LEASE_PREFIX}{tx_hash}", TX_WORKER_ID, nx=True, px=TX_LEASE_MS)
+            pipe.get(f"{TX_LEASE_PREFIX}{tx_hash}")
+        for tx_hash in thanks_coalescer.tx_hashes:
+            pipe.pexpire(f"{TX_LEASE_PREFIX}{tx_hash}", TX_LEASE_MS)
+        results = await pipe.execute()
+    owners = results[1:2 * len(tx_hashes):2]
+    worker_id = TX_WORKER_ID.encode("utf-8")
+    return {tx_hash for tx_hash, owner in zip(tx_hashes, owners) if owner == worker_id}
+
+
+class ThanksCoalescer:
+    """
+    Groups the transfers of a sender arriving within `window` seconds into a single thank-you tweet
+    for the summed value. Once the tweet is posted all covered transactions are tagged as processed
+    (and acknowledged in stream mode) in one MULTI.
+    """
+
+    def __init__(self, window: float):
+        self.window = window
+        # sender -> {"value": summed value, "transactions": [(tx_hash, score, tx_data, ack_id), ...]}
+        self.groups = {}
+        # txHashes waiting in a window, so the next poll does not queue them twice
+        self.tx_hashes = set()
+        # Stream entry ids of the transactions waiting, their claim is renewed until they are acknowledged
+        self.ack_ids = set()
+        self.tasks = set()
+
+    def is_pending(self, tx_hash):
+        return tx_hash in self.tx_hashes
+
+    def add(self, sender, value, tx_hash, score, tx_data, ack_id=None):
+        group = self.groups.get(sender)
+        if group is None:
+            group = self.groups[sender] = {"value": 0, "transactions": []}
+            task = asyncio.create_task(self._flush_later(sender))
+            self.tasks.add(task)
+            task.add_done_callback(self.tasks.discard)
+        group["value"] += value
+        group["transactions"].append((tx_hash, score, tx_data, ack_id))
+        self.tx_hashes.add(tx_hash)
+        if ack_id:
+            self.ack_ids.add(ack_id)
+
+    async def _flush_later(self, sender):
+        await asyncio.sleep(self.window)
+        group = self.groups.pop(sender)
+        transactions = group["transactions"]
+        posted = False
+        try:
+            print(f"Thanking {sender} for {len(transactions)} transfer(s), total value {group['value']}")
+            # Posting is rate limited by the dispatcher
+            response, post_result = await thanks_dispatcher.submit(sender, group["value"])
+            print(f"Thank-you tweet response: {response}")
+            if post_result:
+                async with redis_client.pipeline(transaction=True) as pipe:
+                    queue_mark_transactions_processed(
+                        pipe, [(tx_hash, score, dict(tx_data, processed=True)) for tx_hash, score, tx_data, _ in transactions]
+                    )
+                    ack_ids = [ack_id for _, _, _, ack_id in transactions if ack_id]
+                    if ack_ids:
+                        pipe.xack(TX_STREAM_KEY, TX_STREAM_GROUP, *ack_ids)
+                    await pipe.execute()
+                posted = True
+        except Exception as e:
+            print(f"Error sending thank-you tweet to {sender}: {e}")
+        finally:
+            # Transactions which were not tagged are picked up again by the listener
+            for tx_hash, _, _, ack_id in transactions:
+                self.tx_hashes.discard(tx_hash)
+                self.ack_ids.discard(ack_id)
+            if not posted:
+                try:
+                    # Streamed ones stay pending in the consumer group, the others may have been pushed
+                    await requeue_pushed_transactions(
+                        [(tx_hash, score) for tx_hash, score, _, ack_id in transactions if not ack_id]
+                    )
+                except Exception as e:
+                    print(f"Error queueing again the transactions of {sender}: {e}")
+
+
+thanks_coalescer = ThanksCoalescer(THANKS_COALESCE_WINDOW)
+
+
+async def process_transaction(tx_hash, tx_data, score, ack_id=None):
+    """
+    Check balance changes of a decoded transaction and queue a thank-you for the sender if applicable.
+    :return: True if there is nothing to thank for, TX_DEFERRED if the transfer waits in the coalescing window
+    """
+    value = sum(
+        int(change.get("value", "0")) for change in tx_data.get("balanceChanges", [])
+        if change.get("address") == OUR_ADDRESS and int(change.get("value", "0")) > 0
+    )
+    if value <= 0:
+        return True
+    # We received CKB, the cached balance is outdated
+    balance_cache.invalidate(CKB_BALANCE_KEY)
+
+    inputs = tx_data.get("inputs", [])
+    sender_addresses = [inp.get("address") for inp in inputs if inp.get("address")]
+    if not sender_addresses:
+        print(f"🔍 No sender address found in transaction {tx_hash}")
+        return True
+
+    sender = sender_addresses[0]
+    print(f"Detected transfer from {sender} to {OUR_ADDRESS}, txHash: {tx_hash}")
+    thanks_coalescer.add(sender, value, tx_hash, score, tx_data, ack_id)
+    return TX_DEFERRED
+
+
+async def handle_transaction(tx_hash, raw_tx_data, score, ack_id=None):
+    """
+    Decode a raw payload read from the 'transactions' HASH and process it.
+    :return: The payload to store tagged as processed, TX_DEFERRED if a thank-you tweet is pending,
+             or None if the transaction has to be retried
+    """
+    if thanks_coalescer.is_pending(tx_hash):
+        return TX_DEFERRED
+    if not raw_tx_data:
+        print(f"No transaction data found for txHash: {tx_hash}")
+        return None
+    try:
+        tx_data = json.loads(raw_tx_data.decode("utf-8"))
+    except json.JSONDecodeError:
+        print(f"Failed to decode transaction data for txHash: {tx_hash}")
+        # tag as processed
+        return {"processed": True, "error": "Invalid JSON"}
+
+    # check if deal
+    if tx_data.get("processed", False):
+        return tx_data
+    result = await process_transaction(tx_hash, tx_data, score, ack_id)
+    if result is TX_DEFERRED:
+        return TX_DEFERRED
+    if result:
+        tx_data["processed"] = True
+        return tx_data
+    return None
+
+
+async def handle_transactions(batch, raw_tx_data_list, errors=None):
+    """
+    Handle a batch of transactions concurrently.
+    :param batch: List of (tx_hash, score, ack_id) tuples
+    :param errors: Dict filled with txHash -> error message for the transactions which failed
+    :return: For each transaction the result of handle_transaction, None if it raised
+    """
+    results = await asyncio.gather(
+        *(handle_transaction(tx_hash, raw_tx_data, score, ack_id)
+          for (tx_hash, score, ack_id), raw_tx_data in zip(batch, raw_tx_data_list)),
+        return_exceptions=True
+    )
+    handled = []
+    for (tx_hash, _, _), raw_tx_data, result in zip(batch, raw_tx_data_list, results):
+        if isinstance(result, Exception):
+            print(f"Error handling transaction {tx_hash}: {result}")
+            if errors is not None:
+                errors[tx_hash] = f"{type(result).__name__}: {result}"
+            result = None
+        elif result is None and errors is not None:
+            errors[tx_hash] = "No transaction data" if not raw_tx_data else "Not handled"
+        handled.append(result)
+    return handled
+
+
+async def claim_pending_batch():
+    """
+    Read the pending set from the oldest entry and lease transactions until TX_POLL_BATCH_SIZE new ones are
+    owned by this worker. Entries leased by other workers are skipped, so each worker gets its own share of
+    the backlog instead of all of them competing for the same first entries. Failed entries waiting for their
+    next attempt are leased to TX_RETRY_LEASE_OWNER and skipped as well, so they do not fill the window again.
+    :return: (list of (tx_hash, score, None) owned by this worker, True if the pending set holds more entries)
+    """
+    owned_batch = []
+    new_count = 0
+    offset = 0
+    while True:
+        entries = await redis_client.zrange(
+            TX_PENDING_KEY, offset, offset + TX_POLL_BATCH_SIZE - 1, withscores=True
+        )
+        offset += len(entries)
+        batch = [(tx_hash.decode("utf-8"), score, None) for tx_hash, score in entries]
+        owned = await claim_transactions([tx_hash for tx_hash, _, _ in batch])
+        for item in batch:
+            if item[0] in owned:
+                owned_batch.append(item)
+                # Transactions waiting in the coalescing window are only checked again, they are not new work
+                new_count += not thanks_coalescer.is_pending(item[0])
+        if len(entries) < TX_POLL_BATCH_SIZE:
+            return owned_batch, False
+        if new_count >= TX_POLL_BATCH_SIZE:
+            return owned_batch, True
+
+
+async def listen_for_transactions():
+    """
+    Continuously listen for new transactions in the Redis sorted set 'transaction_hash'.
+    When a new txHash is found, retrieve transaction data from 'transactions' HASH,
+    check balance changes, and send thank-you tweet if applicable.
+    Each poll reads the oldest pending entries, processed txHashes are moved to
+    'transaction_hash:processed' so the pending set only holds transactions still to handle.
+    Transactions which fail are retried with a backoff, then moved to 'transaction_hash:failed'.
+    Several workers can poll the same set: each transaction is handled by the worker holding its lease,
+    and each worker reads past the transactions leased by the others.
+    Payloads are fetched in one pipeline and processed flags are written in one pipeline per poll.
+    Transfers are thanked through the coalescer, which tags its transactions itself once the tweet is posted.
+    """
+    if not OUR_ADDRESS:
+        print("OUR_ADDRESS not set in environment variables.")
+        return
+    while not transaction_stop_event.is_set():
+        supervisor.begin_iteration("transaction_listener")
+        batch_is_full = False
+        try:
+            # Get the oldest txHashes not processed yet and not leased by another worker
+            owned_batch, has_more = await claim_pending_batch()
+            # Payloads are read after claiming, so a transaction just finished by another worker shows as processed
+            raw_tx_data_list = await fetch_transactions([tx_hash for tx_hash, _, _ in owned_batch])
+            errors = {}
+            handled = await handle_transactions(owned_batch, raw_tx_data_list, errors)
+
+            processed = [
+                (tx_hash, score, tx_data) for (tx_hash, score, _), tx_data in zip(owned_batch, handled)
+                if tx_data is not None and tx_data is not TX_DEFERRED
+            ]
+            failed = [(tx_hash, score, errors[tx_hash]) for tx_hash, score, _ in owned_batch if tx_hash in errors]
+            # A full batch made only of pending transactions would otherwise be re-read in a busy loop
+            batch_is_full = has_more and len(processed) + len(failed) > 0
+
+            async with redis_client.pipeline(transaction=True) as pipe:
+                queue_mark_transactions_processed(pipe, processed)
+                await pipe.execute()
+            await retry_failed_transactions(failed)
+            supervisor.end_iteration("transaction_listener")
+        except Exception as e:
+            print(f"Error in listen_for_transactions: {e}")
+            supervisor.record_error("transaction_listener", e)
+            batch_is_full = False
+        # Keep draining without waiting while there is a backlog
+        if not batch_is_full:
+            await asyncio.sleep(TX_POLL_INTERVAL)
+
+
+async def push_transaction(tx_hash, tx_data):
+    """
+    Store a transaction in the 'transactions' HASH and append it to the transaction stream.
+    This is what an indexer calls in stream mode instead of writing the 'transaction_hash' sorted set.
+    """
+    async with redis_client.pipeline(transaction=True) as pipe:
+        pipe.hset("transactions", tx_hash, json.dumps(tx_data))
+        pipe.xadd(TX_STREAM_KEY, {"txHash": tx_hash}, maxlen=TX_STREAM_MAXLEN, approximate=True)
+        await pipe.execute()
+
+
+async def receive_pushed_transactions(transactions):
+    """
+    Handle transactions pushed by the indexer (POST /transactions/webhook) right away instead of at the next poll.
+    A txHash already processed, or leased by a worker, is skipped, so pushes can be repeated and mixed with polling.
+    The payloads are stored in the 'transactions' HASH and tagged as processed like polled ones.
+
+    :param transactions: Payloads with txHash, balanceChanges and inputs
+    :return: txHash -> "processed", "deferred" (waiting for its thank-you tweet, queued for the listener
+             if the tweet fails), "duplicate" or "failed"
+    """
+    transactions = {tx_data["txHash"]: tx_data for tx_data in transactions}
+    if not transactions:
+        return {}
+    tx_hashes = list(transactions)
+    async with redis_client.pipeline(transaction=False) as pipe:
+        for tx_hash in tx_hashes:
+            pipe.zscore(TX_PROCESSED_KEY, tx_hash)
+        processed_scores = (await pipe.execute())[:len(tx_hashes)]
+    new_hashes = [tx_hash for tx_hash, score in zip(tx_hashes, processed_scores) if score is None]
+    owned = await claim_transactions(new_hashes)
+    statuses = {tx_hash: "duplicate" for tx_hash in tx_hashes}
+    batch = [(tx_hash, time.time(), None) for tx_hash in new_hashes if tx_hash in owned]
+    if not batch:
+        return statuses
+
+    raw_tx_data_list = [json.dumps(transactions[tx_hash]).encode("utf-8") for tx_hash, _, _ in batch]
+    await redis_client.hset("transactions", mapping={
+        tx_hash: raw_tx_data for (tx_hash, _, _), raw_tx_data in zip(batch, raw_tx_data_list)
+    })
+    handled = await handle_transactions(batch, raw_tx_data_list)
+
+    processed = []
+    failed = []
+    for (tx_hash, score, _), tx_data in zip(batch, handled):
+        if tx_data is TX_DEFERRED:
+            statuses[tx_hash] = "deferred"
+        elif tx_data is None:
+            statuses[tx_hash] = "failed"
+            failed.append(tx_hash)
+        else:
+            statuses[tx_hash] = "processed"
+            processed.append((tx_hash, score, tx_data))
+    async with redis_client.pipeline(transaction=True) as pipe:
+        queue_mark_transactions_processed(pipe, processed)
+        # Released so that the indexer can push them again
+        if failed:
+            pipe.delete(*[f"{TX_LEASE_PREFIX}{tx_hash}" for tx_hash in failed])
+        await pipe.execute()
+    return statuses
+
+
+async def ensure_transaction_stream_group():
+    """Create the consumer group (and the stream) if it does not exist yet."""
+    try:
+        await redis_client.xgroup_create(TX_STREAM_KEY, TX_STREAM_GROUP, id="0", mkstream=True)
+    except ResponseError as e:
+        # BUSYGROUP means the group has already been created by another worker
+        if "BUSYGROUP" not in str(e):
+            raise
+
+
+def stream_entry_id_to_score(entry_id):
+    """Use the millisecond part of a stream entry id as score in the processed index."""
+    return int(entry_id.split("-")[0]) / 1000
+
+
+async def handle_stream_entries(entries):
+    """
+    Process a batch of stream entries, acknowledging the handled ones in a single pipeline.
+    Each transaction is leased like in poll mode, so that a transaction pushed to the webhook of another worker
+    is not thanked twice: entries of transactions already processed are acknowledged without handling them,
+    entries of transactions leased by another worker are left pending.
+    Unacknowledged entries stay pending and are reclaimed with XAUTOCLAIM later.
+    """
+    entries = [(entry_id.decode("utf-8"), fields) for entry_id, fields in entries]
+    ack_ids = []
+    stream_hashes = []
+    for entry_id, fields in entries:
+        # Trimmed entries can come back from XAUTOCLAIM without fields
+        tx_hash = (fields or {}).get(b"txHash", b"").decode("utf-8")
+        if tx_hash:
+            stream_hashes.append((entry_id, tx_hash))
+        else:
+            print(f"Stream entry {entry_id} has no txHash, dropping it.")
+            ack_ids.append(entry_id)
+
+    owned = await claim_transactions([tx_hash for _, tx_hash in stream_hashes])
+    leased = [(entry_id, tx_hash) for entry_id, tx_hash in stream_hashes if tx_hash not in owned]
+    if leased:
+        async with redis_client.pipeline(transaction=False) as pipe:
+            for _, tx_hash in leased:
+                pipe.zscore(TX_PROCESSED_KEY, tx_hash)
+            processed_scores = await pipe.execute()
+        ack_ids.extend(entry_id for (entry_id, _), score in zip(leased, processed_scores) if score is not None)
+
+    batch = [(tx_hash, stream_entry_id_to_score(entry_id), entry_id) for entry_id, tx_hash in stream_hashes
+             if tx_hash in owned]
+    raw_tx_data_list = await fetch_transactions([tx_hash for tx_hash, _, _ in batch])
+    handled = await handle_transactions(batch, raw_tx_data_list)
+
+    processed = []
+    for (tx_hash, score, entry_id), tx_data in zip(batch, handled):
+        # Deferred entries are acknowledged by the coalescer once their thank-you tweet is posted
+        if tx_data is not None and tx_data is not TX_DEFERRED:
+            processed.append((tx_hash, score, tx_data))
+            ack_ids.append(entry_id)
+
+    async with redis_client.pipeline(transaction=True) as pipe:
+        queue_mark_transactions_processed(pipe, processed)
+        if ack_ids:
+            pipe.xack(TX_STREAM_KEY, TX_STREAM_GROUP, *ack_ids)
+        await pipe.execute()
+
+
+async def renew_stream_claims():
+    """
+    Reset the idle time of the entries waiting in this worker's coalescing window or dispatcher queue,
+    which can take longer than TX_STREAM_CLAIM_IDLE_MS, so that another consumer does not reclaim them
+    and thank the sender a second time. Their leases are renewed too.
+    """
+    if thanks_coalescer.tx_hashes:
+        async with redis_client.pipeline(transaction=False) as pipe:
+            for tx_hash in thanks_coalescer.tx_hashes:
+                pipe.pexpire(f"{TX_LEASE_PREFIX}{tx_hash}", TX_LEASE_MS)
+            await pipe.execute()
+    if thanks_coalescer.ack_ids:
+        await redis_client.xclaim(
+            TX_STREAM_KEY, TX_STREAM_GROUP, TX_WORKER_ID, min_idle_time=0,
+            message_ids=list(thanks_coalescer.ack_ids), justid=True
+        )
+
+
+async def consume_transaction_stream():
+    """
+    Listen for new transactions with XREADGROUP on the transaction stream.
+    Entries are acknowledged once the thank-you tweet has been sent, entries left pending
+    by a dead worker (or a failed tweet) are reclaimed with XAUTOCLAIM after TX_STREAM_CLAIM_IDLE_MS.
+    XAUTOCLAIM scans the pending entries from where its previous call stopped.
+    """
+    if not OUR_ADDRESS:
+        print("OUR_ADDRESS not set in environment variables.")
+        return
+    await ensure_transaction_stream_group()
+    autoclaim_start_id = "0-0"
+    while not transaction_stop_event.is_set():
+        try:
+            # Block until new entries arrive, waking up regularly to check the stop event
+            response = await redis_client.xreadgroup(
+                TX_STREAM_GROUP, TX_WORKER_ID, {TX_STREAM_KEY: ">"},
+                count=TX_POLL_BATCH_SIZE, block=TX_STREAM_BLOCK_MS
+            )
+            supervisor.begin_iteration("transaction_listener")
+            for _, entries in response or []:
+                await handle_stream_entries(entries)
+            await renew_stream_claims()
+
+            # Reclaim entries which have been idle for too long in any consumer
+            claimed = await redis_client.xautoclaim(
+                TX_STREAM_KEY, TX_STREAM_GROUP, TX_WORKER_ID,
+                min_idle_time=TX_STREAM_CLAIM_IDLE_MS, start_id=autoclaim_start_id, count=TX_POLL_BATCH_SIZE
+            )
+            # "0-0" once the scan reached the end of the pending entries
+            autoclaim_start_id = claimed[0].decode("utf-8") if isinstance(claimed[0], bytes) else claimed[0]
+            await handle_stream_entries(claimed[1])
+            supervisor.end_iteration("transaction_listener")
+        except Exception as e:
+            print(f"Error in consume_transaction_stream: {e}")
+            supervisor.record_error("transaction_listener", e)
+            await asyncio.sleep(TX_POLL_INTERVAL)
+
+
+async def get_transaction_backlog():
+    """
+    Number of transactions waiting to be handled, in the mode selected by TX_LISTENER_MODE.
+    :return: Pending txHashes in poll mode, entries not acknowledged yet plus undelivered ones in stream mode
+    """
+    if TX_LISTENER_MODE != "stream":
+        return await redis_client.zcard(TX_PENDING_KEY)
+    try:
+        groups = await redis_client.xinfo_groups(TX_STREAM_KEY)
+    except ResponseError:
+        # The stream does not exist yet
+        return 0
+    for group in groups:
+        if group["name"].decode("utf-8") == TX_STREAM_GROUP:
+            # lag is only reported by Redis 7+
+            return group["pending"] + (group.get("lag") or 0)
+    return 0
+
+
+async def run_transaction_listener():
+    """Run the transaction listener in the mode selected by TX_LISTENER_MODE."""
+    if TX_LISTENER_MODE == "stream":
+        await consume_transaction_stream()
+    else:
+        await listen_for_transactions()
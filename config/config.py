@@ -6,6 +6,8 @@ import ssl
 import redis.asyncio as redis  # use redis
 from dotenv import load_dotenv
 
+from utils.metrics import instrument_redis
+
 load_dotenv(dotenv_path=".env")
 USERNAME = os.getenv('TWITTER_USERNAME', "")
 EMAIL = os.getenv('TWITTER_EMAIL', "")
@@ -14,6 +16,15 @@ HTTP_PROXY = os.getenv('HTTP_PROXY', None)
 HTTPS_PROXY = os.getenv('HTTPS_PROXY', None)
 COOKIE_PATH = ""
 OPENAI_API_KEY = os.getenv('OPENAI_API_KEY', "")
+# Shared async OpenAI client: timeouts in seconds, connection pool size and retries of every call
+OPENAI_TIMEOUT = float(os.getenv("OPENAI_TIMEOUT", 60))
+OPENAI_CONNECT_TIMEOUT = float(os.getenv("OPENAI_CONNECT_TIMEOUT", 10))
+OPENAI_IMAGE_TIMEOUT = float(os.getenv("OPENAI_IMAGE_TIMEOUT", 180))
+OPENAI_MAX_CONNECTIONS = int(os.getenv("OPENAI_MAX_CONNECTIONS", 20))
+OPENAI_MAX_KEEPALIVE_CONNECTIONS = int(os.getenv("OPENAI_MAX_KEEPALIVE_CONNECTIONS", 10))
+OPENAI_MAX_RETRIES = int(os.getenv("OPENAI_MAX_RETRIES", 2))
+# Seconds between two checks of an assistant run
+OPENAI_RUN_POLL_INTERVAL = float(os.getenv("OPENAI_RUN_POLL_INTERVAL", 1))
 AI_TOKEN = os.getenv('AI_TOKEN', "")
 REDIS_URL = os.getenv('REDIS_URL', "")
 # load redis from localhost
@@ -24,6 +35,8 @@ REDIS_DB = int(os.getenv("REDIS_DB", 0))
 REDIS_TLS = os.getenv("REDIS_TLS", "false").lower() == "true"
 REDIS_SNI = os.getenv("REDIS_SNI", None)
 OUR_ADDRESS = os.getenv("OUR_ADDRESS", "")
+# "mainnet" or "testnet", reward addresses of the other network are rejected. Defaults to the network of OUR_ADDRESS.
+CKB_NETWORK = os.getenv("CKB_NETWORK", {"ckb1": "mainnet", "ckt1": "testnet"}.get(OUR_ADDRESS[:4].lower(), "")).lower()
 # load cookies
 COOKIES_JSON = os.getenv("COOKIES_JSON")
 
@@ -36,6 +49,104 @@ SEAL_MAX = int(os.getenv("SEAL_MAX", 10))
 SEAL_XUDT_ARGS = os.getenv("SEAL_XUDT_ARGS", "")
 
 MIN_AWARD_SCORE = int(os.getenv("MIN_AWARD_SCORE", 85))
+# Answers to the same question judged together in one completion
+JUDGE_BATCH_SIZE = int(os.getenv("JUDGE_BATCH_SIZE", 10))
+
+# background task supervisor, seconds to wait before restarting a crashed task
+SUPERVISOR_MIN_BACKOFF = int(os.getenv("SUPERVISOR_MIN_BACKOFF", 5))
+SUPERVISOR_MAX_BACKOFF = int(os.getenv("SUPERVISOR_MAX_BACKOFF", 300))
+
+# emoticon status tweets, cron expression in UTC
+EMOTICON_TWEET_CRON = os.getenv("EMOTICON_TWEET_CRON", "0 * * * *")
+# Random delay in seconds added to every run
+EMOTICON_TWEET_JITTER = int(os.getenv("EMOTICON_TWEET_JITTER", 0))
+# What to do with runs missed while the app was down: skip, run_once or run_all
+EMOTICON_TWEET_MISFIRE_POLICY = os.getenv("EMOTICON_TWEET_MISFIRE_POLICY", "run_once")
+# Send one tweet as soon as the mode is started
+EMOTICON_TWEET_RUN_ON_START = os.getenv("EMOTICON_TWEET_RUN_ON_START", "true").lower() == "true"
+
+# transaction listener
+TX_POLL_INTERVAL = int(os.getenv("TX_POLL_INTERVAL", 15))
+TX_POLL_BATCH_SIZE = int(os.getenv("TX_POLL_BATCH_SIZE", 200))
+# Max number of fields per HMGET when fetching transaction payloads
+TX_FETCH_CHUNK_SIZE = int(os.getenv("TX_FETCH_CHUNK_SIZE", 100))
+# "poll" reads the 'transaction_hash' sorted set, "stream" consumes a Redis Stream with a consumer group
+TX_LISTENER_MODE = os.getenv("TX_LISTENER_MODE", "poll").lower()
+TX_STREAM_KEY = os.getenv("TX_STREAM_KEY", "transactions:stream")
+TX_STREAM_GROUP = os.getenv("TX_STREAM_GROUP", "twitter_ckb")
+TX_STREAM_BLOCK_MS = int(os.getenv("TX_STREAM_BLOCK_MS", 5000))
+# Entries idle for longer are reclaimed by another consumer, must exceed TX_STREAM_BLOCK_MS: the claims of the
+# entries waiting for their thank-you tweet are renewed once per read
+TX_STREAM_CLAIM_IDLE_MS = int(os.getenv("TX_STREAM_CLAIM_IDLE_MS", 60000))
+TX_STREAM_MAXLEN = int(os.getenv("TX_STREAM_MAXLEN", 100000))
+# Lease of a worker on a pending transaction in poll mode, must exceed THANKS_COALESCE_WINDOW plus the time to tweet
+TX_LEASE_MS = int(os.getenv("TX_LEASE_MS", 120000))
+# A pending transaction which fails is retried after TX_RETRY_DELAY seconds, doubled at each attempt, and moved
+# to 'transaction_hash:failed' after TX_MAX_ATTEMPTS attempts so that it does not hold the head of the pending set
+TX_RETRY_DELAY = float(os.getenv("TX_RETRY_DELAY", 60))
+TX_MAX_ATTEMPTS = int(os.getenv("TX_MAX_ATTEMPTS", 5))
+# Token expected in the Authorization header of POST /transactions/webhook, the webhook is disabled if empty
+TX_WEBHOOK_TOKEN = os.getenv("TX_WEBHOOK_TOKEN", "")
+
+# thank-you tweet dispatcher
+THANKS_CONCURRENCY = int(os.getenv("THANKS_CONCURRENCY", 4))
+# Thank-you tweets posted per minute on average (0 for no limit), and in a burst
+THANKS_TWEETS_PER_MINUTE = float(os.getenv("THANKS_TWEETS_PER_MINUTE", 10))
+THANKS_TWEET_BURST = int(os.getenv("THANKS_TWEET_BURST", 3))
+# Transfers of the same sender within this many seconds are thanked in a single tweet
+THANKS_COALESCE_WINDOW = float(os.getenv("THANKS_COALESCE_WINDOW", 30))
+
+# HTTP connection pool of the CKB backend client
+CKB_HTTP_POOL_LIMIT = int(os.getenv("CKB_HTTP_POOL_LIMIT", 20))
+CKB_HTTP_POOL_LIMIT_PER_HOST = int(os.getenv("CKB_HTTP_POOL_LIMIT_PER_HOST", 10))
+# Seconds to cache DNS lookups and to keep idle connections open
+CKB_HTTP_DNS_CACHE_TTL = int(os.getenv("CKB_HTTP_DNS_CACHE_TTL", 300))
+CKB_HTTP_KEEPALIVE_TIMEOUT = float(os.getenv("CKB_HTTP_KEEPALIVE_TIMEOUT", 30))
+# Seconds allowed for a whole request, and for opening a connection
+CKB_HTTP_TIMEOUT = float(os.getenv("CKB_HTTP_TIMEOUT", 60))
+CKB_HTTP_CONNECT_TIMEOUT = float(os.getenv("CKB_HTTP_CONNECT_TIMEOUT", 10))
+# Retries of failed backend requests (connection errors, timeouts, 429, 5xx), with jittered exponential backoff
+CKB_READ_RETRIES = int(os.getenv("CKB_READ_RETRIES", 3))
+# Transfers may only be retried if the backend deduplicates them by their Idempotency-Key header,
+# off by default: a retried transfer would otherwise be paid twice
+CKB_TRANSFER_RETRIES = int(os.getenv("CKB_TRANSFER_RETRIES", 0))
+CKB_RETRY_BASE_DELAY = float(os.getenv("CKB_RETRY_BASE_DELAY", 0.5))
+CKB_RETRY_MAX_DELAY = float(os.getenv("CKB_RETRY_MAX_DELAY", 8))
+# Consecutive failures opening the circuit, requests then fail fast for CKB_BREAKER_RESET_TIMEOUT seconds
+CKB_BREAKER_FAILURE_THRESHOLD = int(os.getenv("CKB_BREAKER_FAILURE_THRESHOLD", 5))
+CKB_BREAKER_RESET_TIMEOUT = float(os.getenv("CKB_BREAKER_RESET_TIMEOUT", 30))
+
+# Seconds a wallet balance is cached, 0 disables the cache. Transfers invalidate it.
+BALANCE_CACHE_TTL = float(os.getenv("BALANCE_CACHE_TTL", 60))
+
+# Reward payouts, set to true if the backend has /transfer/batch: approved rewards are then paid together
+# once the window has passed or the batch is full, otherwise each one is paid right away
+PAYOUT_BATCH_TRANSFERS = os.getenv("PAYOUT_BATCH_TRANSFERS", "false").lower() == "true"
+PAYOUT_BATCH_WINDOW = float(os.getenv("PAYOUT_BATCH_WINDOW", 120))
+PAYOUT_BATCH_MAX_SIZE = int(os.getenv("PAYOUT_BATCH_MAX_SIZE", 20))
+
+# Payout outbox, attempts of a reward before giving up, first retry delay in seconds (doubled every attempt)
+PAYOUT_MAX_ATTEMPTS = int(os.getenv("PAYOUT_MAX_ATTEMPTS", 5))
+PAYOUT_RETRY_DELAY = float(os.getenv("PAYOUT_RETRY_DELAY", 60))
+PAYOUT_POLL_INTERVAL = float(os.getenv("PAYOUT_POLL_INTERVAL", 10))
+PAYOUT_OUTBOX_BATCH_SIZE = int(os.getenv("PAYOUT_OUTBOX_BATCH_SIZE", 50))
+# Lease of a worker on a payout while attempting it, must exceed PAYOUT_BATCH_WINDOW plus the transfer time
+PAYOUT_LEASE_MS = int(os.getenv("PAYOUT_LEASE_MS", 300000))
+
+# Fiber invoices are decoded locally, then confirmed with the backend (/fiber/invoice) which rejects expired ones.
+# Set to false to skip the confirmation: the expiry time is not decoded locally, expired invoices then reach the transfer
+FIBER_INVOICE_CONFIRM = os.getenv("FIBER_INVOICE_CONFIRM", "true").lower() == "true"
+
+# Reply analyses cached by normalized comment, seconds in Redis (0 disables) and entries kept in memory
+ANALYSIS_CACHE_TTL = float(os.getenv("ANALYSIS_CACHE_TTL", 86400))
+ANALYSIS_CACHE_SIZE = int(os.getenv("ANALYSIS_CACHE_SIZE", 1024))
+
+# Pool of pre-generated questions: number kept ready, seconds between refill checks,
+# word similarity (0-1) above which a question is rejected as a near-duplicate, and number of questions compared to
+QUESTION_POOL_TARGET_DEPTH = int(os.getenv("QUESTION_POOL_TARGET_DEPTH", 3))
+QUESTION_POOL_REFILL_INTERVAL = float(os.getenv("QUESTION_POOL_REFILL_INTERVAL", 300))
+QUESTION_POOL_SIMILARITY = float(os.getenv("QUESTION_POOL_SIMILARITY", 0.6))
+QUESTION_POOL_HISTORY_SIZE = int(os.getenv("QUESTION_POOL_HISTORY_SIZE", 200))
 
 # set SSL 和 SNI
 ssl_context = None
@@ -47,11 +158,11 @@ if REDIS_TLS:
 protocol = "rediss" if REDIS_TLS else "redis"
 redis_url = f"{protocol}://{REDIS_HOST}:{REDIS_PORT}"
 
-redis_client = redis.from_url(
+redis_client = instrument_redis(redis.from_url(
     redis_url,
     password=REDIS_PASSWORD,
     db=REDIS_DB,
-)
+))
 
 
 async def check_redis_connection():
@@ -1,41 +1,20 @@
 # main.py
 import asyncio
-import threading
 
 from openai_api.chat import chat_with_openai, send_emoticon_tweet
-import time
 from config import selected_mode
+from config.config import EMOTICON_TWEET_CRON, EMOTICON_TWEET_JITTER, EMOTICON_TWEET_MISFIRE_POLICY, \
+    EMOTICON_TWEET_RUN_ON_START
 from utils.input_util import ainput, input_queue
+from utils.scheduler import scheduler
 
 
-# Define a global stop event
-stop_event = threading.Event()
-
-
-# Function to send emoticon tweets at intervals, runs in a child thread
-def schedule_emoticon_tweet_thread():
-    tweet_interval = 3600  # Send a tweet every hour
-    last_tweet_time = time.time()
-
-    # Create a new event loop for the thread
-    loop = asyncio.new_event_loop()
-    asyncio.set_event_loop(loop)
-    # Initial send
-    loop.run_until_complete(send_emoticon_tweet())
-
-    while not stop_event.is_set():
-        try:
-            current_time = time.time()
-            if current_time - last_tweet_time >= tweet_interval:
-                asyncio.run(send_emoticon_tweet())
-                last_tweet_time = current_time  # Update last send time
-
-            # Check stop event every second
-            time.sleep(1)
-        except Exception as e:
-            print(f"Error in schedule_emoticon_tweet_thread: {e}")
-            break
-    print("Stopped schedule_emoticon_tweet_thread.")
+# Emoticon status tweets, scheduled in the main event loop
+scheduler.add_job(
+    "emoticon_tweet", send_emoticon_tweet, EMOTICON_TWEET_CRON,
+    jitter=EMOTICON_TWEET_JITTER, misfire_policy=EMOTICON_TWEET_MISFIRE_POLICY,
+    run_on_start=EMOTICON_TWEET_RUN_ON_START
+)
 
 
 async def main_menu():
@@ -75,41 +54,34 @@ async def chat_mode():
 
 
 async def status_update_mode():
-    # Clear the stop event
-    stop_event.clear()
-    # Create and start the child thread
-    thread = threading.Thread(target=schedule_emoticon_tweet_thread)
-    thread.start()
-    await wait_for_exit(thread)
+    # Start the scheduled job
+    scheduler.start_job("emoticon_tweet")
+    await wait_for_exit()
 
 
 async def combined_mode():
-    # Clear the stop event
-    stop_event.clear()
-    # Create and start the child thread
-    thread = threading.Thread(target=schedule_emoticon_tweet_thread)
-    thread.start()
+    # Start the scheduled job
+    scheduler.start_job("emoticon_tweet")
 
     # Start chat mode
     await chat_with_openai()
     # After chat mode ends, wait for user input to return to main menu
-    await wait_for_exit(thread)
+    await wait_for_exit()
 
 
-async def wait_for_exit(thread):
+async def wait_for_exit():
     # After chat mode ends, wait for user input to return to main menu
+    # Input is read without blocking the event loop, so the scheduled job keeps running
     while True:
-        time.sleep(3)
-        user_input = input("Enter '4' to return to the main menu: ")
+        await asyncio.sleep(3)
+        user_input = await ainput("Enter '4' to return to the main menu: ")
         if user_input == '4':
             print("Returning to main menu...")
-            stop_event.set()  # Set the stop event
-            thread.join()  # Wait for the thread to finish
+            await scheduler.stop_job("emoticon_tweet")  # Wait for the job to stop
             break
         elif user_input == '5':
             print("Exiting program.")
-            stop_event.set()
-            thread.join()
+            await scheduler.stop_job("emoticon_tweet")
             exit(0)
 
 if __name__ == "__main__":
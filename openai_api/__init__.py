@@ -1,6 +1,19 @@
 # openai_api
-from openai import OpenAI
+import httpx
+from openai import AsyncOpenAI, DefaultAsyncHttpxClient
 
-from config.config import OPENAI_API_KEY
+from config.config import OPENAI_API_KEY, OPENAI_TIMEOUT, OPENAI_CONNECT_TIMEOUT, OPENAI_MAX_CONNECTIONS, \
+    OPENAI_MAX_KEEPALIVE_CONNECTIONS, OPENAI_MAX_RETRIES
 
-ai_client = OpenAI(api_key=OPENAI_API_KEY)
+# One async client for the whole app: completions no longer block the event loop,
+# and calls from different loops share the connection pool
+ai_client = AsyncOpenAI(
+    api_key=OPENAI_API_KEY,
+    timeout=httpx.Timeout(OPENAI_TIMEOUT, connect=OPENAI_CONNECT_TIMEOUT),
+    max_retries=OPENAI_MAX_RETRIES,
+    http_client=DefaultAsyncHttpxClient(
+        limits=httpx.Limits(
+            max_connections=OPENAI_MAX_CONNECTIONS, max_keepalive_connections=OPENAI_MAX_KEEPALIVE_CONNECTIONS
+        ),
+    ),
+)
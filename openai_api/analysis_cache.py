@@ -0,0 +1,98 @@
+# openai_api/analysis_cache.py
+import hashlib
+import json
+import re
+import time
+from collections import OrderedDict
+
+from ckb.ckb_address import CKB_ADDRESS_PATTERN
+from config.config import redis_client, ANALYSIS_CACHE_TTL, ANALYSIS_CACHE_SIZE
+
+# Prefix of the cached analyses in Redis, followed by the hash of the normalized comment
+ANALYSIS_CACHE_PREFIX = "analysis:reply:"
+ADDRESS_PLACEHOLDER = "<address>"
+
+
+def normalize_comment(comment: str, addresses):
+    """Fold case and whitespace and mask the addresses, so copy-pasted comments share one analysis."""
+    masked = CKB_ADDRESS_PATTERN.sub(
+        lambda match: ADDRESS_PLACEHOLDER if match.group(0).lower() in addresses else match.group(0), comment or ""
+    )
+    return re.sub(r"\s+", " ", masked).strip().casefold()
+
+
+def comment_cache_key(comment: str, addresses):
+    return hashlib.sha256(normalize_comment(comment, addresses).encode("utf-8")).hexdigest()
+
+
+class AnalysisCache:
+    """
+    Results of analyze_reply_for_transfer by normalized comment: an in-process LRU in front of Redis (`ttl` seconds).
+    The address is stored as its position among the addresses of the comment and filled in again on a hit.
+    """
+
+    def __init__(self, ttl: float, max_size: int):
+        self.ttl = ttl
+        self.max_size = max_size
+        # key -> (entry, expires_at)
+        self.entries = OrderedDict()
+        # (layer, "hit" or "miss") -> count
+        self.counters = {}
+
+    def _count(self, layer, outcome):
+        self.counters[(layer, outcome)] = self.counters.get((layer, outcome), 0) + 1
+
+    def _remember(self, key, entry):
+        self.entries[key] = (entry, time.monotonic() + self.ttl)
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_size:
+            self.entries.popitem(last=False)
+
+    @staticmethod
+    def _restore(entry, addresses):
+        result = dict(entry)
+        index = result.pop("to_address_index", None)
+        result["to_address"] = addresses[index] if index is not None and index < len(addresses) else None
+        return result
+
+    async def get(self, comment: str, addresses):
+        """:return: The cached analysis of the comment, None on a miss"""
+        if self.ttl <= 0:
+            return None
+        key = comment_cache_key(comment, addresses)
+        cached = self.entries.get(key)
+        if cached is not None and cached[1] > time.monotonic():
+            self.entries.move_to_end(key)
+            self._count("memory", "hit")
+            return self._restore(cached[0], addresses)
+        self.entries.pop(key, None)
+        self._count("memory", "miss")
+
+        try:
+            raw_entry = await redis_client.get(f"{ANALYSIS_CACHE_PREFIX}{key}")
+        except Exception as e:
+            print(f"Failed to read the analysis cache: {e}")
+            raw_entry = None
+        if raw_entry is None:
+            self._count("redis", "miss")
+            return None
+        self._count("redis", "hit")
+        entry = json.loads(raw_entry)
+        self._remember(key, entry)
+        return self._restore(entry, addresses)
+
+    async def put(self, comment: str, addresses, result):
+        if self.ttl <= 0 or not result:
+            return
+        key = comment_cache_key(comment, addresses)
+        entry = dict(result)
+        to_address = entry.pop("to_address", None)
+        entry["to_address_index"] = addresses.index(to_address) if to_address in addresses else None
+        self._remember(key, entry)
+        try:
+            await redis_client.set(f"{ANALYSIS_CACHE_PREFIX}{key}", json.dumps(entry), ex=max(1, int(self.ttl)))
+        except Exception as e:
+            print(f"Failed to write the analysis cache: {e}")
+
+
+analysis_cache = AnalysisCache(ANALYSIS_CACHE_TTL, ANALYSIS_CACHE_SIZE)
@@ -3,15 +3,57 @@ import asyncio
 import json
 import re
 
+from ckb.ckb_address import find_ckb_addresses
 from config.config import CKB_MIN, CKB_MAX, SEAL_MIN, SEAL_MAX
 from openai_api import ai_client
+from openai_api.analysis_cache import analysis_cache
+from utils.metrics import instrument
+
+
+# Replies to comments without a valid address, which are not sent to the model
+NO_ADDRESS_REPLY = "Thank you for your comment!"
+NO_ADDRESS_REPLY_ZH = "感谢您的评论！"
 
 
 # Analyze tweet reply to determine address validity and reward amount
 async def analyze_reply_for_transfer(comment: str):
     print(comment)
+    # Checked offline first, only comments with a valid address of our network are sent to the model
+    addresses = find_ckb_addresses(comment)
+    if not addresses:
+        print("No valid CKB address in the comment, skip the analysis.")
+        is_chinese = re.search(r"[\u4e00-\u9fff]", comment or "")
+        return {
+            "to_address": None,
+            "amount": None,
+            "currency_type": None,
+            "reply_content": NO_ADDRESS_REPLY_ZH if is_chinese else NO_ADDRESS_REPLY,
+        }
+
+    # Copy-pasted comments are only analyzed once
+    analysis_result = await analysis_cache.get(comment, addresses)
+    if analysis_result is not None:
+        print(f"Cached analysis: {analysis_result}")
+        return analysis_result
+
+    analysis_result = await analyze_reply_with_model(comment)
+    # The model must not make up or alter an address
+    if analysis_result and analysis_result.get("to_address"):
+        to_address = str(analysis_result["to_address"]).strip().lower()
+        if to_address not in addresses:
+            print(f"Address {analysis_result['to_address']} is not a valid address of the comment, no reward.")
+            analysis_result["to_address"] = None
+            analysis_result["amount"] = None
+        else:
+            analysis_result["to_address"] = to_address
+    await analysis_cache.put(comment, addresses, analysis_result)
+    return analysis_result
+
+
+@instrument("openai", "analyze_reply_for_transfer")
+async def analyze_reply_with_model(comment: str):
     # Define the prompt for AI analysis
-    response = ai_client.chat.completions.create(
+    response = await ai_client.chat.completions.create(
         model="gpt-4o",
         messages=[
             {"role": "system",
@@ -1,7 +1,7 @@
 # openai_api/chat.py
 import os
 
-from ckb.ckb_service import fetch_balance, transfer_ckb
+from ckb.ckb_service import fetch_balance, fetch_wallet_snapshot, transfer_ckb
 from config.config import HTTP_PROXY, HTTPS_PROXY
 from openai_api.thanks_gen import generate_thanks_tweet
 from twitter.client import login
@@ -65,7 +65,7 @@ async def send_emoticon_tweet():
     return tweet_content
 
 
-async def send_thanks_tweet(user_address: str, value):
+async def build_thanks_tweet(user_address: str, value):
     value = abs(value)
 
     # Generate tweet data (prefix and content) for thank-you message
@@ -78,7 +78,13 @@ async def send_thanks_tweet(user_address: str, value):
     emoticon = generate_balance_emoticon(value)
 
     # Construct the tweet content by inserting the @user_address
-    tweet_content = f"{tweet_data['tweet_prefix']} @{user_address}\n{emoticon}\n{tweet_data['tweet_content']}"
+    return f"{tweet_data['tweet_prefix']} @{user_address}\n{emoticon}\n{tweet_data['tweet_content']}"
+
+
+async def send_thanks_tweet(user_address: str, value):
+    tweet_content = await build_thanks_tweet(user_address, value)
+    if not tweet_content:
+        return None, False
 
     # Post the tweet
     post_result = await post_tweet(tweet_content)
@@ -97,7 +103,9 @@ async def handle_openai_function_call(function_name, args):
     elif function_name == "transfer_ckb":
         to_address = args['to_address']
         amount_in_ckb = args['amount_in_ckb']
-        balance = await fetch_balance()
+        balance = (await fetch_wallet_snapshot(with_tokens=False)).ckb
+        if balance is None:
+            return "balance is not available, try again later!"
         if balance < amount_in_ckb:
             return "balance is not enough!"
         result = await transfer_ckb(to_address, amount_in_ckb)
@@ -120,7 +128,7 @@ async def chat_with_openai(user_input):
     messages.append({"role": "user", "content": user_input})
 
     # Send user input and define available functions
-    response = ai_client.chat.completions.create(
+    response = await ai_client.chat.completions.create(
         model="gpt-4o-mini-2024-07-18",
         messages=messages,
         tools=[
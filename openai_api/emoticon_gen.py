@@ -3,12 +3,14 @@ import json
 import re
 
 from openai_api import ai_client
+from utils.metrics import instrument
 
 
 # Generate emoticon tweet with specified JSON format
+@instrument("openai")
 async def generate_emoticon_tweet():
     # Send a generation request and get the tweet data
-    response = ai_client.chat.completions.create(
+    response = await ai_client.chat.completions.create(
         model="gpt-4o-mini-2024-07-18",
         messages=[
             {"role": "system",
@@ -2,18 +2,24 @@
 import uuid
 import aiohttp
 
+from config.config import OPENAI_IMAGE_TIMEOUT
 from openai_api import ai_client
+from utils.metrics import instrument
 
 
+@instrument("openai")
 async def generate_image_from_text(description, num=1):
-    response = ai_client.images.generate(model="dall-e-3", prompt=description, size="1024x1024", n=num)
-    image_urls = response['data']
+    # Image generation takes longer than the default timeout
+    response = await ai_client.with_options(timeout=OPENAI_IMAGE_TIMEOUT).images.generate(
+        model="dall-e-3", prompt=description, size="1024x1024", n=num
+    )
+    image_urls = response.data
     image_paths = []
 
     async with aiohttp.ClientSession() as session:
         for url in image_urls:
             unique_filename = f"./images/{uuid.uuid4()}.jpg"
-            async with session.get(url["url"]) as image_resp:
+            async with session.get(url.url) as image_resp:
                 if image_resp.status == 200:
                     with open(unique_filename, 'wb') as f:
                         f.write(await image_resp.read())
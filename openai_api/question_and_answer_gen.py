@@ -2,11 +2,14 @@
 import asyncio
 import json
 import os
+import random
 import re
 
+from ckb.fiber_invoice import extract_fiber_invoices
 from config.logging_config import logger
 from openai_api import ai_client
-from config.config import CKB_MIN, CKB_MAX
+from utils.metrics import instrument
+from config.config import CKB_MIN, CKB_MAX, OPENAI_RUN_POLL_INTERVAL, JUDGE_BATCH_SIZE
 
 # Directory for the files
 DATA_DIR = "data"
@@ -16,6 +19,7 @@ FILE_IDS = re.findall(r'file-\w+', FILE_IDS)  # 使用正则表达式提取所
 
 ASSISTANT_ID = None
 
+@instrument("openai")
 async def upload_all_files():
     """
     Upload all files from the 'data' directory.
@@ -30,7 +34,7 @@ async def upload_all_files():
         file_path = os.path.join(DATA_DIR, file_name)
         logger.info(f"Uploading file: {file_path}")
         with open(file_path, "rb") as file:
-            response = ai_client.files.create(
+            response = await ai_client.files.create(
                 file=file,
                 purpose="assistants"  # File purpose for Assistants
             )
@@ -40,6 +44,7 @@ async def upload_all_files():
     return uploaded_file_ids
 
 
+@instrument("openai")
 async def generate_question_with_files_and_answer(file_ids):
     """
     Generate a question using assistant instructions and file content.
@@ -84,7 +89,7 @@ async def generate_question_with_files_and_answer(file_ids):
 
     # Create a thread for the assistant
     client = ai_client  # Initialize the OpenAI API client
-    thread_response = client.beta.threads.create()
+    thread_response = await client.beta.threads.create()
     thread_id = thread_response.id
 
     # Attach all files to the assistant thread
@@ -92,7 +97,7 @@ async def generate_question_with_files_and_answer(file_ids):
     attachments = [{"file_id": file_id, "tools": [{"type": "file_search"}]} for file_id in file_ids]
 
     # Attach the file to the message
-    client.beta.threads.messages.create(
+    await client.beta.threads.messages.create(
         thread_id=thread_id,
         role="assistant",
         content="Please review the uploaded file and generate a relevant answer.",
@@ -100,7 +105,7 @@ async def generate_question_with_files_and_answer(file_ids):
     )
 
     # Run the assistant to process the file and generate questions
-    run = client.beta.threads.runs.create(
+    run = await client.beta.threads.runs.create(
         thread_id=thread_id,
         assistant_id=ASSISTANT_ID,
         instructions=system_instructions
@@ -108,13 +113,14 @@ async def generate_question_with_files_and_answer(file_ids):
 
     # Wait for the run to complete
     while run.completed_at is None:
-        run = client.beta.threads.runs.retrieve(
+        await asyncio.sleep(OPENAI_RUN_POLL_INTERVAL)
+        run = await client.beta.threads.runs.retrieve(
             thread_id=run.thread_id,
             run_id=run.id
         )
 
     # Retrieve the generated message
-    messages = client.beta.threads.messages.list(thread_id=thread_id)
+    messages = await client.beta.threads.messages.list(thread_id=thread_id)
     assistant_message = messages.data[0].content[0].text.value
 
     # Parse the JSON content of the assistant message
@@ -130,6 +136,7 @@ async def generate_question_with_files_and_answer(file_ids):
         return None
 
 
+@instrument("openai")
 async def generate_question_with_answer():
     """
     Upload all files and generate questions and answers based on the files' content.
@@ -145,7 +152,7 @@ async def generate_question_with_answer():
         global ASSISTANT_ID
         if not ASSISTANT_ID:
             logger.info("Creating a new assistant...")
-            assistant = ai_client.beta.assistants.create(
+            assistant = await ai_client.beta.assistants.create(
                 instructions="Strictly adhere to the files' content for generating questions and answers.",
                 name="AI Web3 Assistant",
                 tools=[{"type": "file_search"}],
@@ -165,7 +172,7 @@ async def generate_question_with_answer():
 # # Generate question tweet with specified JSON format
 # async def generate_question_with_answer():
 #     # Send a generation request and get the question and answer data
-#     response = ai_client.chat.completions.create(
+#     response = await ai_client.chat.completions.create(
 #         model="gpt-4o-mini-2024-07-18",
 #         messages=[
 #             {"role": "system",
@@ -335,7 +342,7 @@ async def generate_question_with_answer():
 #     """
 #     try:
 #         # Call GPT-4o-mini to generate a response
-#         response = ai_client.chat.completions.create(
+#         response = await ai_client.chat.completions.create(
 #             model="gpt-4o-mini-2024-07-18",
 #             messages=[
 #                 {"role": "system", "content": "You are an expert AI evaluator for CKB-related topics."},
@@ -379,6 +386,7 @@ async def generate_question_with_answer():
 #         }
 
 
+@instrument("openai")
 async def judge_answer_for_score(question_context, question_prompt, reference_answer, user_answer):
     """
     Evaluate a user's answer and extract score, invoice, and reply content using GPT-4o-mini.
@@ -462,7 +470,7 @@ async def judge_answer_for_score(question_context, question_prompt, reference_an
     """
     try:
         # Call GPT-4o-mini to generate a response
-        response = ai_client.chat.completions.create(
+        response = await ai_client.chat.completions.create(
             model="gpt-4o-mini-2024-07-18",
             messages=[
                 {"role": "system", "content": "You are an expert AI evaluator for Web3 and CKB-related topics."},
@@ -502,7 +510,170 @@ async def judge_answer_for_score(question_context, question_prompt, reference_an
         }
 
 
+def parse_judged_answers(content, count):
+    """
+    Parse the batch judging output.
+    :return: index (0 based) -> {"score", "invoice", "reply_content"} for the well-formed results only
+    """
+    cleaned_content = re.sub(r"```(?:json)?", "", content).strip()
+    data = json.loads(cleaned_content)
+    items = data.get("results", []) if isinstance(data, dict) else data
+    results = {}
+    for item in items if isinstance(items, list) else []:
+        try:
+            index = int(item["id"]) - 1
+            result = {
+                "score": int(item["score"]),
+                "invoice": item.get("invoice") or None,
+                "reply_content": str(item["reply_content"]),
+            }
+        except (KeyError, TypeError, ValueError):
+            continue
+        if 0 <= index < count:
+            results[index] = result
+    return results
+
+
+def check_answer_invoice(result, user_answer):
+    """
+    Keep the invoice of a judging result only if it is one of the valid invoices written in the answer itself:
+    the model may take it from another answer of the batch, or make it up.
+    """
+    invoice = result.get("invoice")
+    if invoice is None:
+        return result
+    answer_invoices, _ = extract_fiber_invoices(user_answer)
+    if not isinstance(invoice, str) or invoice.strip().lower() not in answer_invoices:
+        print(f"Invoice {invoice} not found in the answer, ignoring it.")
+        return dict(result, invoice=None)
+    return dict(result, invoice=invoice.strip().lower())
+
+
+@instrument("openai")
+async def judge_answers_batch(question_context, question_prompt, reference_answer, user_answers):
+    """
+    Evaluate several answers to the same question in one GPT-4o-mini request, sharing the question and reference answer.
+
+    :param user_answers: List of the answer texts
+    :return: index -> result like judge_answer_for_score, for the answers judged successfully, None if the request failed
+    """
+    answers_block = "\n".join(
+        f"- id {index}: {json.dumps(user_answer, ensure_ascii=False)}" for index, user_answer in enumerate(user_answers, 1)
+    )
+    prompt = f"""
+        You are an AI evaluator specializing in Web3 and CKB-related topics. Score each user answer below, extract
+        its Lightning Network invoice (if present), and write a polite and concise reply to each user.
+
+        ### Evaluation Instructions:
+        1. **Scoring**: Evaluate every answer independently for relevance, accuracy, and clarity compared to the
+           reference answer, with a score between 0 and 100 (90-100 outstanding, 70-89 good, 50-69 satisfactory,
+           below 50 poor or incomplete).
+        2. **Invoice Extraction**: Extract the invoice of the answer, which typically looks like "fibt400000...".
+           If no valid invoice is found, set `invoice` to null.
+        3. **Reply Content**: A friendly, concise reply (10-20 words) based on the score and invoice presence.
+           If the invoice is missing, politely remind the user to include it. Do not mention the score.
+
+        ### Inputs:
+        - **Context**: {question_context}
+        - **Question**: {question_prompt}
+        - **Reference Answer**: {reference_answer}
+        - **User Answers** (JSON strings):
+        {answers_block}
+
+        ### Output Format:
+        A JSON object with one result per answer, in any order:
+        {{
+            "results": [
+                {{"id": int, "score": int, "invoice": str or null, "reply_content": str}}
+            ]
+        }}
+    """
+    try:
+        response = await ai_client.chat.completions.create(
+            model="gpt-4o-mini-2024-07-18",
+            messages=[
+                {"role": "system", "content": "You are an expert AI evaluator for Web3 and CKB-related topics."},
+                {"role": "user", "content": prompt},
+            ],
+            response_format={"type": "json_object"},
+        )
+        content = response.choices[0].message.content
+        results = parse_judged_answers(content, len(user_answers))
+        print(results)
+        return results
+    except Exception as e:
+        print(f"Error in judge_answers_batch: {e}")
+        return None
+
+
+async def judge_answers_for_score(question_context, question_prompt, reference_answer, user_answers):
+    """
+    Evaluate the answers to a question by batches of JUDGE_BATCH_SIZE, one request per batch.
+    Answers missing from a batch output (or of a failed batch) are judged one by one with judge_answer_for_score.
+    An invoice is only kept if it is written in the answer it is returned for.
+
+    :param user_answers: List of the answer texts
+    :return: List of results like judge_answer_for_score, in the order of user_answers
+    """
+    results = [None] * len(user_answers)
+    if len(user_answers) > 1:
+        batches = [range(start, min(start + JUDGE_BATCH_SIZE, len(user_answers)))
+                   for start in range(0, len(user_answers), JUDGE_BATCH_SIZE)]
+        batch_results = await asyncio.gather(*(
+            judge_answers_batch(question_context, question_prompt, reference_answer, [user_answers[i] for i in batch])
+            for batch in batches
+        ))
+        for batch, judged in zip(batches, batch_results):
+            for offset, result in (judged or {}).items():
+                results[batch[offset]] = result
+
+    missing = [i for i, result in enumerate(results) if result is None]
+    if len(user_answers) > 1 and missing:
+        print(f"Judging {len(missing)} answer(s) one by one.")
+    singles = await asyncio.gather(*(
+        judge_answer_for_score(question_context, question_prompt, reference_answer, user_answers[i]) for i in missing
+    ))
+    for i, result in zip(missing, singles):
+        results[i] = result
+    return [check_answer_invoice(result, user_answer) for result, user_answer in zip(results, user_answers)]
+
+
+# Replies of the rule-based invoice detection
+INVOICE_FOUND_REPLIES = [
+    "Thank you for providing your invoice. It has been successfully noted! 🚀",
+    "Got your invoice, thanks! Your reward is on its way. 🌟",
+    "Invoice received! Thanks for taking part. 🦭",
+    "Thanks! Your invoice has been noted. Keep up the good work! ✨",
+]
+INVOICE_MISSING_REPLIES = [
+    "We couldn't find an invoice in your response. Could you please provide one? 😊",
+    "Thanks for your reply! Please share a Fiber invoice so we can send your reward. 🙏",
+    "No invoice found in your answer yet. Could you add one? 🌊",
+]
+
+
 async def detect_invoice_in_answer(user_answer):
+    """
+    Detect if an invoice exists in the user's answer. The invoices are extracted and validated locally,
+    GPT-4o-mini is only asked when that is ambiguous: several invoices, or text looking like a broken invoice.
+
+    :param user_answer: The user's submitted answer
+    :return: A dictionary containing is_invoice, invoice, and reply_content
+    """
+    invoices, has_invalid = extract_fiber_invoices(user_answer)
+    if len(invoices) == 1 and not has_invalid:
+        result = {"is_invoice": True, "invoice": invoices[0], "reply_content": random.choice(INVOICE_FOUND_REPLIES)}
+        print(result)
+        return result
+    if not invoices and not has_invalid:
+        result = {"is_invoice": False, "invoice": None, "reply_content": random.choice(INVOICE_MISSING_REPLIES)}
+        print(result)
+        return result
+    return await detect_invoice_with_model(user_answer)
+
+
+@instrument("openai", "detect_invoice_in_answer")
+async def detect_invoice_with_model(user_answer):
     """
     Detect if an invoice exists in the user's answer using GPT-4o-mini.
 
@@ -556,7 +727,7 @@ async def detect_invoice_in_answer(user_answer):
     """
     try:
         # Call GPT-4o-mini to generate a response
-        response = ai_client.chat.completions.create(
+        response = await ai_client.chat.completions.create(
             model="gpt-4o-mini-2024-07-18",
             messages=[
                 {"role": "system", "content": "You are an expert in identifying Lightning Network invoices."},
@@ -0,0 +1,137 @@
+# openai_api/question_pool.py
+import asyncio
+import json
+import re
+
+from config.config import redis_client, QUESTION_POOL_TARGET_DEPTH, QUESTION_POOL_REFILL_INTERVAL, \
+    QUESTION_POOL_SIMILARITY, QUESTION_POOL_HISTORY_SIZE
+from openai_api.question_and_answer_gen import generate_question_with_answer
+from utils.supervisor import supervisor
+
+# List of the questions ready to post (JSON, like generate_question_with_answer), oldest first.
+# Kept out of "question:*", which holds the posted questions.
+QUESTION_POOL_KEY = "question_pool:ready"
+# List of the prompts of the latest pooled or posted questions, newest first, for the near-duplicate check
+QUESTION_POOL_HISTORY_KEY = "question_pool:history"
+QUESTION_FIELDS = ("question_context", "question_prompt", "reference_answer", "amount")
+# Words which say nothing about the topic of a question
+STOP_WORDS = {
+    "the", "and", "for", "are", "can", "how", "what", "why", "which", "who", "does", "with", "that", "this",
+    "from", "into", "its", "their", "they", "you", "your", "about", "between", "role", "play",
+}
+
+
+def question_words(prompt: str):
+    """Topic words of a question prompt, case folded, without punctuation, emojis and stop words."""
+    return {word for word in re.findall(r"[^\W_]+", (prompt or "").casefold())
+            if len(word) > 2 and word not in STOP_WORDS}
+
+
+def question_similarity(first: str, second: str):
+    """Jaccard similarity (0-1) of the topic words of two prompts."""
+    first_words, second_words = question_words(first), question_words(second)
+    if not first_words or not second_words:
+        return 1.0 if first_words == second_words else 0.0
+    return len(first_words & second_words) / len(first_words | second_words)
+
+
+class QuestionPool:
+    """
+    Questions generated ahead of time, so that posting a question is a pop instead of an Assistants run.
+    The producer (run) keeps `target_depth` questions in Redis, checking every `refill_interval` seconds
+    or as soon as a question is taken. A question too similar to one of the latest `history_size`
+    pooled or posted questions is dropped.
+    """
+
+    def __init__(self, target_depth: int, refill_interval: float, similarity: float, history_size: int):
+        self.target_depth = target_depth
+        self.refill_interval = refill_interval
+        self.similarity = similarity
+        self.history_size = history_size
+        self.wakeup = asyncio.Event()
+        self.added_count = 0
+        self.duplicate_count = 0
+
+    async def depth(self):
+        return await redis_client.llen(QUESTION_POOL_KEY)
+
+    async def find_similar(self, prompt: str):
+        """:return: The recent prompt `prompt` nearly duplicates, None if it is new"""
+        for recent in await redis_client.lrange(QUESTION_POOL_HISTORY_KEY, 0, -1):
+            recent = recent.decode("utf-8")
+            if question_similarity(prompt, recent) >= self.similarity:
+                return recent
+        return None
+
+    async def remember(self, question_data):
+        """Record a question posted or pooled, later questions are compared to it."""
+        async with redis_client.pipeline(transaction=True) as pipe:
+            pipe.lpush(QUESTION_POOL_HISTORY_KEY, question_data["question_prompt"])
+            pipe.ltrim(QUESTION_POOL_HISTORY_KEY, 0, self.history_size - 1)
+            await pipe.execute()
+
+    async def add(self, question_data):
+        """
+        Add a generated question to the pool.
+        :return: True if added, False if incomplete or a near-duplicate
+        """
+        if not isinstance(question_data, dict) or any(not question_data.get(field) for field in QUESTION_FIELDS):
+            print(f"Incomplete question not pooled: {question_data}")
+            return False
+        similar = await self.find_similar(question_data["question_prompt"])
+        if similar is not None:
+            self.duplicate_count += 1
+            print(f"Question not pooled, too close to a recent one: {question_data['question_prompt']} / {similar}")
+            return False
+        await self.remember(question_data)
+        await redis_client.rpush(QUESTION_POOL_KEY, json.dumps(question_data, ensure_ascii=False))
+        self.added_count += 1
+        return True
+
+    async def pop(self):
+        """
+        Take the oldest question of the pool and let the producer replace it.
+        :return: The question data, None if the pool is empty
+        """
+        raw_question = await redis_client.lpop(QUESTION_POOL_KEY)
+        self.wakeup.set()
+        return json.loads(raw_question) if raw_question is not None else None
+
+    async def refill(self):
+        """
+        Generate questions until the pool holds target_depth of them, one attempt per missing question.
+        :return: Number of questions added
+        """
+        added = 0
+        for _ in range(self.target_depth - await self.depth()):
+            question_data = await generate_question_with_answer()
+            if not question_data:
+                print("Failed to generate a question for the pool.")
+                break
+            if await self.add(question_data):
+                added += 1
+        return added
+
+    async def run(self):
+        """Producer keeping the pool filled."""
+        while True:
+            supervisor.begin_iteration("question_pool")
+            # Questions taken during the refill start another one right away
+            self.wakeup.clear()
+            try:
+                added = await self.refill()
+                if added:
+                    print(f"Added {added} question(s) to the pool.")
+                supervisor.end_iteration("question_pool")
+            except Exception as e:
+                print(f"Error in question pool: {e}")
+                supervisor.record_error("question_pool", e)
+            try:
+                await asyncio.wait_for(self.wakeup.wait(), self.refill_interval)
+            except asyncio.TimeoutError:
+                pass
+
+
+question_pool = QuestionPool(
+    QUESTION_POOL_TARGET_DEPTH, QUESTION_POOL_REFILL_INTERVAL, QUESTION_POOL_SIMILARITY, QUESTION_POOL_HISTORY_SIZE
+)
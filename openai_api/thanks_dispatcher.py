@@ -0,0 +1,90 @@
+# openai_api/thanks_dispatcher.py
+import asyncio
+import time
+from collections import deque
+
+from config.config import THANKS_CONCURRENCY, THANKS_TWEETS_PER_MINUTE, THANKS_TWEET_BURST
+from openai_api.chat import build_thanks_tweet
+from twitter.tweet import post_tweet
+from utils.token_bucket import TokenBucket
+
+
+class ThanksTweetDispatcher:
+    """
+    Queue of thank-you tweets served by a bounded pool of workers.
+    Workers generate tweets concurrently, posting is throttled by a token bucket.
+    """
+
+    def __init__(self, concurrency: int, tweets_per_minute: float, burst: int):
+        self.concurrency = concurrency
+        self.bucket = TokenBucket(tweets_per_minute / 60, burst)
+        self.queue = asyncio.Queue()
+        self.workers = []
+        self.in_flight = 0
+        self.sent_count = 0
+        self.failed_count = 0
+        # Seconds between submit and the end of posting, for the latest items
+        self.latencies = deque(maxlen=100)
+
+    def ensure_started(self):
+        """Start the workers in the running event loop if they are not running yet."""
+        self.workers = [worker for worker in self.workers if not worker.done()]
+        while len(self.workers) < self.concurrency:
+            self.workers.append(asyncio.create_task(self._worker()))
+
+    async def submit(self, user_address: str, value):
+        """
+        Queue a thank-you tweet and wait until it has been posted.
+        :return: (tweet_content, post_result), like send_thanks_tweet
+        """
+        self.ensure_started()
+        future = asyncio.get_running_loop().create_future()
+        await self.queue.put((user_address, value, future, time.monotonic()))
+        return await future
+
+    async def _worker(self):
+        while True:
+            user_address, value, future, submitted_at = await self.queue.get()
+            self.in_flight += 1
+            try:
+                tweet_content = await build_thanks_tweet(user_address, value)
+                post_result = False
+                if tweet_content:
+                    await self.bucket.acquire()
+                    post_result = await post_tweet(tweet_content)
+                if post_result:
+                    self.sent_count += 1
+                else:
+                    self.failed_count += 1
+                if not future.done():
+                    future.set_result((tweet_content, post_result))
+            except Exception as e:
+                self.failed_count += 1
+                if not future.done():
+                    future.set_exception(e)
+            finally:
+                self.in_flight -= 1
+                self.latencies.append(time.monotonic() - submitted_at)
+                self.queue.task_done()
+
+    async def stop(self):
+        for worker in self.workers:
+            worker.cancel()
+        await asyncio.gather(*self.workers, return_exceptions=True)
+        self.workers = []
+
+    def stats(self):
+        latencies = sorted(self.latencies)
+        return {
+            "queue_depth": self.queue.qsize(),
+            "in_flight": self.in_flight,
+            "workers": len([worker for worker in self.workers if not worker.done()]),
+            "sent": self.sent_count,
+            "failed": self.failed_count,
+            "last_latency": self.latencies[-1] if self.latencies else None,
+            "avg_latency": sum(latencies) / len(latencies) if latencies else None,
+            "p95_latency": latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))] if latencies else None,
+        }
+
+
+thanks_dispatcher = ThanksTweetDispatcher(THANKS_CONCURRENCY, THANKS_TWEETS_PER_MINUTE, THANKS_TWEET_BURST)
@@ -1,30 +1,140 @@
 # server.py
 
-import asyncio
-import json
+import dataclasses
+import hmac
 import os
 import sys
-import threading
-import time
-from fastapi import FastAPI, BackgroundTasks
+from contextlib import asynccontextmanager
+from typing import List, Optional, Union
+
+from fastapi import FastAPI, Header
+from fastapi.responses import PlainTextResponse
 from pydantic import BaseModel
 
-from config.config import redis_client, OUR_ADDRESS, HTTP_PROXY, HTTPS_PROXY
-from openai_api.chat import chat_with_openai, send_emoticon_tweet, send_thanks_tweet
+from ckb.ckb_service import ckb_client, ckb_breaker, fetch_wallet_snapshot
+from ckb.payout_batcher import payout_batcher
+from ckb.payout_outbox import payout_outbox
+from ckb.transaction_listener import run_transaction_listener, transaction_stop_event, thanks_coalescer, \
+    get_transaction_backlog, receive_pushed_transactions
+from config.config import OUR_ADDRESS, HTTP_PROXY, HTTPS_PROXY, EMOTICON_TWEET_CRON, \
+    EMOTICON_TWEET_JITTER, EMOTICON_TWEET_MISFIRE_POLICY, EMOTICON_TWEET_RUN_ON_START, TX_WEBHOOK_TOKEN
+from openai_api import ai_client
+from openai_api.analysis_cache import analysis_cache
+from openai_api.chat import chat_with_openai, send_emoticon_tweet
+from openai_api.question_pool import question_pool
+from openai_api.thanks_dispatcher import thanks_dispatcher
 from openai_api.thanks_gen import generate_thanks_tweet
 from twitter.tweet import fetch_and_analyze_replies, get_is_fetch_and_analyze_active, set_is_fetch_and_analyze_active, \
     fetch_and_analyze_stop_event
 from twitter.tweet_for_question import set_is_tweet_for_question_active, get_is_tweet_for_question_active, \
     tweet_for_question_stop_event, tweet_for_question
 from utils.emoticon import generate_balance_emoticon
-
-app = FastAPI()
-
-# Define a global stop event for the status update thread
-stop_event = threading.Event()
-transaction_stop_event = asyncio.Event()
-is_status_update_running = False
-is_transaction_listener_running = False
+from utils.metrics import metrics
+from utils.resilience import CIRCUIT_CLOSED
+from utils.scheduler import scheduler
+from utils.supervisor import supervisor
+
+# Long-running loops, each one runs at most once and is restarted if it crashes
+supervisor.register("transaction_listener", run_transaction_listener)
+supervisor.register("fetch_and_analyze", fetch_and_analyze_replies)
+supervisor.register("tweet_for_question", tweet_for_question)
+supervisor.register("payout_outbox", payout_outbox.run)
+supervisor.register("question_pool", question_pool.run)
+
+# Emoticon status tweets, scheduled in the app event loop
+scheduler.add_job(
+    "emoticon_tweet", send_emoticon_tweet, EMOTICON_TWEET_CRON,
+    jitter=EMOTICON_TWEET_JITTER, misfire_policy=EMOTICON_TWEET_MISFIRE_POLICY,
+    run_on_start=EMOTICON_TWEET_RUN_ON_START
+)
+
+
+# Queue and backlog gauges of the background loops, read at every scrape of /metrics
+metrics.register_gauge(
+    "twitter_ckb_task_running", "1 if the background task is running.",
+    lambda: {(("task", name),): status["running"] for name, status in supervisor.status().items()}
+)
+metrics.register_gauge(
+    "twitter_ckb_task_restarts", "Number of times the background task was restarted after a crash.",
+    lambda: {(("task", name),): status["restart_count"] for name, status in supervisor.status().items()}
+)
+metrics.register_gauge(
+    "twitter_ckb_task_last_iteration_seconds", "Duration of the last iteration of the background task.",
+    lambda: {(("task", name),): status["last_iteration_latency"] for name, status in supervisor.status().items()}
+)
+metrics.register_gauge(
+    "twitter_ckb_scheduled_job_running", "1 if the scheduled job is enabled.",
+    lambda: {(("job", name),): status["running"] for name, status in scheduler.status().items()}
+)
+metrics.register_gauge(
+    "twitter_ckb_thanks_queue_depth", "Thank-you tweets waiting for a dispatcher worker.",
+    lambda: {(): thanks_dispatcher.queue.qsize()}
+)
+metrics.register_gauge(
+    "twitter_ckb_thanks_in_flight", "Thank-you tweets being generated or posted.",
+    lambda: {(): thanks_dispatcher.in_flight}
+)
+metrics.register_gauge(
+    "twitter_ckb_thanks_coalescing_transactions", "Transactions waiting in the thank-you coalescing window.",
+    lambda: {(): len(thanks_coalescer.tx_hashes)}
+)
+metrics.register_gauge(
+    "twitter_ckb_analysis_cache_requests", "Lookups of the reply analysis cache by layer and outcome.",
+    lambda: {(("layer", layer), ("outcome", outcome)): count for (layer, outcome), count in analysis_cache.counters.items()}
+)
+metrics.register_gauge(
+    "twitter_ckb_backend_circuit_open", "1 while the circuit breaker of the CKB backend fails requests fast.",
+    lambda: {(): int(ckb_breaker.state != CIRCUIT_CLOSED)}
+)
+
+
+async def collect_transaction_backlog():
+    return {(): await get_transaction_backlog()}
+
+
+async def collect_payout_backlog():
+    return {(): await payout_outbox.backlog()}
+
+
+async def collect_question_pool_depth():
+    return {(): await question_pool.depth()}
+
+
+metrics.register_gauge(
+    "twitter_ckb_transaction_backlog", "Transactions written by the indexer and not handled yet.",
+    collect_transaction_backlog
+)
+metrics.register_gauge(
+    "twitter_ckb_payout_outbox_backlog", "Rewards waiting in the payout outbox.",
+    collect_payout_backlog
+)
+metrics.register_gauge(
+    "twitter_ckb_question_pool_depth", "Pre-generated questions ready to post.",
+    collect_question_pool_depth
+)
+metrics.register_gauge(
+    "twitter_ckb_question_pool_duplicates", "Generated questions dropped as near-duplicates of recent ones.",
+    lambda: {(): question_pool.duplicate_count}
+)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Balance checks and payouts reuse warm connections to the CKB backend
+    await ckb_client.open()
+    # Pays the approved rewards, including the ones left over by a previous run
+    supervisor.start("payout_outbox")
+    yield
+    await supervisor.shutdown()
+    # Pay the rewards still waiting for their batch
+    await payout_batcher.stop()
+    await scheduler.shutdown()
+    await thanks_dispatcher.stop()
+    await ckb_client.close()
+    await ai_client.close()
+
+
+app = FastAPI(lifespan=lifespan)
 
 # Set proxy
 if HTTP_PROXY != "" and HTTP_PROXY is not None:
@@ -39,118 +149,67 @@ class FetchAndAnalyzeRepliesRequest(BaseModel):
     user_id: str
 
 
-async def listen_for_transactions():
-    """
-    Continuously listen for new transactions in the Redis sorted set 'transaction_hash'.
-    When a new txHash is found, retrieve transaction data from 'transactions' HASH,
-    check balance changes, and send thank-you tweet if applicable.
-    Implement logical deletion by marking transactions as processed.
-    """
-    global is_transaction_listener_running
-    if not OUR_ADDRESS:
-        print("OUR_ADDRESS not set in environment variables.")
-        return
-    try:
-        while not transaction_stop_event.is_set():
-            try:
-                # Get all txHashes
-                tx_hashes = await redis_client.zrange("transaction_hash", 0, -1)
-                for tx_hash in tx_hashes:
-                    tx_hash = tx_hash.decode("utf-8")
-                    # Get tx_data from tx_hash
-                    tx_data = await redis_client.hget("transactions", tx_hash)
-                    post_result = False
-                    if tx_data:
-                        try:
-                            tx_data = json.loads(tx_data.decode("utf-8"))
-                        except json.JSONDecodeError:
-                            print(f"Failed to decode transaction data for txHash: {tx_hash}")
-                            # tag as processed
-                            updated_tx_data = {"processed": True, "error": "Invalid JSON"}
-                            await redis_client.hset("transactions", tx_hash, json.dumps(updated_tx_data))
-                            continue
-
-                        # check if deal
-                        if tx_data.get("processed", False):
-                            continue
-
-                        balance_changes = tx_data.get("balanceChanges", [])
-                        for change in balance_changes:
-                            if change.get("address") == OUR_ADDRESS and int(change.get("value", "0")) > 0:
-                                inputs = tx_data.get("inputs", [])
-                                sender_addresses = [inp.get("address") for inp in inputs if inp.get("address")]
-                                if sender_addresses:
-                                    sender = sender_addresses[0]
-                                    print(f"Detected transfer from {sender} to {OUR_ADDRESS}, txHash: {tx_hash}")
-
-                                    response, post_result = await send_thanks_tweet(sender, int(change.get("value", "1")))
-                                    await asyncio.sleep(8)
-                                    print(f"Thank-you tweet response: {response}")
-                                else:
-                                    print(f"🔍 No sender address found in transaction {tx_hash}")
-                        if post_result:
-                            tx_data['processed'] = True
-                            await redis_client.hset("transactions", tx_hash, json.dumps(tx_data))
-                    else:
-                        print(f"No transaction data found for txHash: {tx_hash}")
-            except Exception as e:
-                print(f"Error in listen_for_transactions: {e}")
-            await asyncio.sleep(15)
-    except Exception as e:
-        print(f"Error in listen_for_transactions: {e}")
-    finally:
-        is_transaction_listener_running = False  # Reset flag on exit
-
-
-# Function to send emoticon tweets at intervals, runs in a separate thread
-def schedule_emoticon_tweet_thread():
-    global is_status_update_running
-    tweet_interval = 3600  # Send a tweet every hour
-    last_tweet_time = time.time()
-
-    # Create a new event loop for the thread
-    loop = asyncio.new_event_loop()
-    asyncio.set_event_loop(loop)
-
-    # Initial send
-    loop.run_until_complete(send_emoticon_tweet())
-
-    while not stop_event.is_set():
-        try:
-            current_time = time.time()
-            if current_time - last_tweet_time >= tweet_interval:
-                loop.run_until_complete(send_emoticon_tweet())
-                last_tweet_time = current_time  # Update last send time
-            # Check stop event every second
-            time.sleep(1)
-        except Exception as e:
-            print(f"Error in schedule_emoticon_tweet_thread: {e}")
-            break
-    print("Stopped schedule_emoticon_tweet_thread.")
-    is_status_update_running = False  # Reset flag on exit
+class BalanceChange(BaseModel):
+    address: str
+    # Shannons, as a JSON number or a decimal string
+    value: Union[int, str]
+
+
+class TransactionInput(BaseModel):
+    address: Optional[str] = None
+
+
+class PushedTransaction(BaseModel):
+    txHash: str
+    balanceChanges: List[BalanceChange] = []
+    inputs: List[TransactionInput] = []
+
+
+class TransactionWebhookRequest(BaseModel):
+    transactions: List[PushedTransaction]
 
 
 @app.post("/start_listen_transactions")
-async def start_listen_transactions(background_tasks: BackgroundTasks):
-    global is_transaction_listener_running
-    if is_transaction_listener_running:
+async def start_listen_transactions():
+    if supervisor.is_running("transaction_listener"):
         return {"status": 400, "message": "Transaction listener is already running."}
-    is_transaction_listener_running = True
     transaction_stop_event.clear()  # Ensure previous stop event is cleared
-    background_tasks.add_task(listen_for_transactions)
+    supervisor.start("transaction_listener")
     return {"status": 200, "message": "Transaction listener started successfully."}
 
 
 @app.post("/stop_listen_transactions")
 async def stop_listen_transactions():
-    global is_transaction_listener_running
-    if not is_transaction_listener_running:
+    if not supervisor.is_running("transaction_listener") or transaction_stop_event.is_set():
         return {"status": 400, "message": "Transaction listener is not running."}
-    transaction_stop_event.set()  # Signal to stop the listener
-    is_transaction_listener_running = False
+    # Signal to stop the listener, it exits at the end of the current iteration
+    transaction_stop_event.set()
     return {"status": 200, "message": "Transaction listener stopped successfully."}
 
 
+@app.post("/transactions/webhook")
+async def transactions_webhook(request: TransactionWebhookRequest, authorization: str = Header(default="")):
+    """
+    Transactions pushed by the indexer, handled right away instead of at the next poll. Duplicates are skipped.
+    """
+    if not TX_WEBHOOK_TOKEN:
+        return {"status": 404, "message": "Transaction webhook is disabled."}
+    if not hmac.compare_digest(authorization.removeprefix("Bearer ").encode(), TX_WEBHOOK_TOKEN.encode()):
+        return {"status": 401, "message": "Invalid token."}
+    if not OUR_ADDRESS:
+        return {"status": 503, "message": "OUR_ADDRESS not set in environment variables."}
+    statuses = await receive_pushed_transactions([tx.model_dump() for tx in request.transactions])
+    return {"status": 200, "message": "success", "data": statuses}
+
+
+@app.get("/thanks_dispatcher/stats")
+async def get_thanks_dispatcher_stats():
+    """
+    Queue depth and per-item latency (seconds from queueing to posting) of the thank-you tweet dispatcher.
+    """
+    return {"status": 200, "message": "success", "data": thanks_dispatcher.stats()}
+
+
 # Server Service with no chat, it just processes some schedule tasks, but if u want to chat, u can deploy it yourself
 # @app.post("/chat")
 # async def chat_with_ai(request: ChatRequest):
@@ -163,36 +222,28 @@ async def stop_listen_transactions():
 
 
 @app.post("/status_update/start")
-async def start_status_update_mode(background_tasks: BackgroundTasks):
+async def start_status_update_mode():
     """
-    Start the status update mode as a background task.
+    Start the status update mode, emoticon tweets are sent on the EMOTICON_TWEET_CRON schedule.
     """
-    global is_status_update_running
-    if is_status_update_running:
+    if not scheduler.start_job("emoticon_tweet"):
         return {"status": 400, "message": "Status update mode is already running."}
-    is_status_update_running = True
-    stop_event.clear()  # Ensure stop event is clear to allow thread to start
-    thread = threading.Thread(target=schedule_emoticon_tweet_thread)
-    thread.start()
-    background_tasks.add_task(thread.join)  # Ensure thread is cleaned up if needed
     return {"status": 200, "message": "success"}
 
 
 @app.post("/status_update/stop")
 async def stop_status_update_mode():
-    global is_status_update_running
-    if not is_status_update_running:
+    if not await scheduler.stop_job("emoticon_tweet"):
         return {"status": 400, "message": "Status update mode is not running."}
-    stop_event.set()
-    is_status_update_running = False
     return {"status": 200, "message": "success"}
 
 
 @app.post("/fetch_and_analyze_replies")
-async def fetch_and_analyze_replies_mode(request: FetchAndAnalyzeRepliesRequest, background_tasks: BackgroundTasks):
+async def fetch_and_analyze_replies_mode(request: FetchAndAnalyzeRepliesRequest):
     is_fetch_and_analyze_active = get_is_fetch_and_analyze_active()
     if os.getenv("IS_TRANSFER", "False").lower() == "true" and is_fetch_and_analyze_active:
-        background_tasks.add_task(fetch_and_analyze_replies, request.user_id)
+        if not supervisor.start("fetch_and_analyze", request.user_id):
+            return {"status": 400, "message": "Fetch and analyze replies is already running."}
         return {"status": 200, "message": "success"}
     else:
         return {"status": 403, "message": "success", "data": "Transfers are disabled by system settings."}
@@ -222,14 +273,17 @@ async def start_tweet_for_question_mode():
 
     set_is_tweet_for_question_active(True)
     tweet_for_question_stop_event.clear()
+    # Keeps questions ready, so posting the next one does not wait for a generation
+    supervisor.start("question_pool")
     return {"status": 200, "message": "Tweet for question mode started successfully."}
 
 
 @app.post("/fetch_and_analyze_question_replies")
-async def fetch_and_analyze_question_replies(background_tasks: BackgroundTasks):
+async def fetch_and_analyze_question_replies():
     is_tweet_for_question_active = get_is_tweet_for_question_active()
     if os.getenv("IS_TRANSFER", "False").lower() == "true" and is_tweet_for_question_active:
-        background_tasks.add_task(tweet_for_question)
+        if not supervisor.start("tweet_for_question"):
+            return {"status": 400, "message": "Tweet for question is already running."}
         return {"status": 200, "message": "success"}
     else:
         return {"status": 403, "message": "success", "data": "Transfers are disabled by system settings."}
@@ -239,4 +293,31 @@ async def fetch_and_analyze_question_replies(background_tasks: BackgroundTasks):
 async def stop_tweet_for_question_mode():
     set_is_tweet_for_question_active(False)
     tweet_for_question_stop_event.set()  # Set stop event to pause task
+    await supervisor.stop("question_pool")
     return {"status": 200, "message": "Fetch and analyze mode stopped successfully."}
+
+
+@app.get("/tasks")
+async def get_tasks():
+    """
+    Status of every background task: supervised loops and scheduled jobs.
+    """
+    return {"status": 200, "message": "success", "data": {**supervisor.status(), **scheduler.status()}}
+
+
+@app.get("/wallet")
+async def get_wallet():
+    """
+    CKB and Seal balances of the wallet, cached for BALANCE_CACHE_TTL seconds.
+    """
+    snapshot = await fetch_wallet_snapshot()
+    return {"status": 200, "message": "success",
+            "data": {**dataclasses.asdict(snapshot), "complete": snapshot.complete}}
+
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def get_metrics():
+    """
+    Prometheus metrics: calls and latency per dependency and function, and background loop gauges.
+    """
+    return PlainTextResponse(await metrics.render(), media_type="text/plain; version=0.0.4")
@@ -0,0 +1,9 @@
+# test/conftest.py
+import os
+import sys
+
+# Tests import the app modules from the project root
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Manual check of the Redis connection, run with `python test/test_redis.py`
+collect_ignore = ["test_redis.py"]
@@ -0,0 +1,84 @@
+# test/test_ckb_address.py
+import pytest
+
+from ckb.ckb_address import parse_ckb_address, is_valid_ckb_address, find_ckb_addresses
+
+SECP256K1_CODE_HASH = "0x9bd7e06f3ecf4be0f2fcd2188b23f1b9fcc88e5d4b65a8637b17723bbda3cce8"
+
+# RFC 0021 examples, secp256k1 lock with args 0xb39bbc0b3673c7d36450bc14cfcdad2d559c6c64
+MAINNET_FULL = "ckb1qzda0cr08m85hc8jlnfp3zer7xulejywt49kt2rr0vthywaa50xwsqdnnw7qkdnnclfkg59uzn8umtfd2kwxceqxwquc4"
+MAINNET_SHORT = "ckb1qyqt8xaupvm8837nv3gtc9x0ekkj64vud3jqfwyw5v"
+MAINNET_FULL_TYPE = "ckb1qjda0cr08m85hc8jlnfp3zer7xulejywt49kt2rr0vthywaa50xw3vumhs9nvu786dj9p0q5elx66t24n3kxgj53qks"
+MAINNET_SHORT_MULTISIG = "ckb1qyq5lv479ewscx3ms620sv34pgeuz6zagaaqklhtgg"
+TESTNET_FULL = "ckt1qzda0cr08m85hc8jlnfp3zer7xulejywt49kt2rr0vthywaa50xwsqflz4emgssc6nqj4yv3nfv2sca7g9dzhscgmg28x"
+
+ARGS = "0xb39bbc0b3673c7d36450bc14cfcdad2d559c6c64"
+
+
+def test_full_format():
+    parsed = parse_ckb_address(MAINNET_FULL)
+    assert parsed["network"] == "mainnet"
+    assert parsed["format"] == 0x00
+    assert parsed["code_hash"] == SECP256K1_CODE_HASH
+    assert parsed["hash_type"] == "type"
+    assert parsed["args"] == ARGS
+
+
+def test_deprecated_short_format():
+    parsed = parse_ckb_address(MAINNET_SHORT)
+    assert parsed["format"] == 0x01
+    assert parsed["code_hash_index"] == 0
+    assert parsed["args"] == ARGS
+    assert parse_ckb_address(MAINNET_SHORT_MULTISIG)["code_hash_index"] == 1
+
+
+def test_deprecated_full_type_format():
+    parsed = parse_ckb_address(MAINNET_FULL_TYPE)
+    assert parsed["format"] == 0x04
+    assert parsed["code_hash"] == SECP256K1_CODE_HASH
+    assert parsed["hash_type"] == "type"
+    assert parsed["args"] == ARGS
+
+
+def test_uppercase_address_is_valid():
+    assert parse_ckb_address(MAINNET_FULL.upper())["address"] == MAINNET_FULL
+
+
+def test_testnet_address():
+    assert parse_ckb_address(TESTNET_FULL)["network"] == "testnet"
+    assert is_valid_ckb_address(TESTNET_FULL, "testnet")
+    assert is_valid_ckb_address(TESTNET_FULL, "")
+
+
+@pytest.mark.parametrize("address", [MAINNET_FULL, MAINNET_SHORT, MAINNET_FULL_TYPE])
+def test_wrong_network_is_rejected(address):
+    assert is_valid_ckb_address(address, "mainnet")
+    assert not is_valid_ckb_address(address, "testnet")
+
+
+@pytest.mark.parametrize("address", [
+    MAINNET_FULL[:-1] + ("q" if MAINNET_FULL[-1] != "q" else "p"),  # checksum
+    MAINNET_SHORT[:10] + MAINNET_SHORT[11] + MAINNET_SHORT[10] + MAINNET_SHORT[12:],  # swapped characters
+    MAINNET_FULL[:-6],  # truncated
+    "ckb1" + MAINNET_FULL[4:].replace("q", "b", 1),  # character outside the bech32 charset
+    "btc" + MAINNET_SHORT[3:],
+    "",
+    None,
+])
+def test_corrupted_address_is_rejected(address):
+    assert parse_ckb_address(address) is None
+
+
+def test_find_addresses_in_text():
+    text = f"My address: {MAINNET_FULL}. Also {MAINNET_SHORT}, and a typo {MAINNET_SHORT[:-1]}x"
+    assert find_ckb_addresses(text, "mainnet") == [MAINNET_FULL, MAINNET_SHORT]
+    assert find_ckb_addresses(text, "testnet") == []
+
+
+def test_find_address_next_to_cjk_text():
+    assert find_ckb_addresses(f"地址{MAINNET_SHORT}谢谢", "mainnet") == [MAINNET_SHORT]
+    assert find_ckb_addresses(f"我的地址是：{TESTNET_FULL}", "testnet") == [TESTNET_FULL]
+
+
+def test_address_inside_a_longer_word_is_ignored():
+    assert find_ckb_addresses(f"x{MAINNET_SHORT}", "mainnet") == []
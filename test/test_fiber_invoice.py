@@ -0,0 +1,151 @@
+# test/test_fiber_invoice.py
+import asyncio
+import time
+
+import pytest
+
+import ckb.fiber_invoice as fiber_invoice_module
+from ckb.fiber_invoice import decode_fiber_invoice, extract_fiber_invoices, parse_expiry, validate_fiber_invoice
+from utils.bech32 import CHARSET, BECH32_CONSTANT, BECH32M_CONSTANT, _polymod, _hrp_expand
+
+
+def encode(hrp, data, constant=BECH32M_CONSTANT):
+    """Bech32m (or bech32) string of 5-bit data, the app itself only decodes."""
+    polymod = _polymod(_hrp_expand(hrp) + data + [0] * 6) ^ constant
+    checksum = [(polymod >> 5 * (5 - i)) & 31 for i in range(6)]
+    return hrp + "1" + "".join(CHARSET[value] for value in data + checksum)
+
+
+# Testnet invoice of 1 CKB from the Fiber documentation
+FIBER_DOCS_INVOICE = (
+    "fibt1000000001pcsaug0p0exgfw0pnm6vkkya5ul6wxurhh09qf9tuwwaufqnr3uzwpplgcrjpeuhe6w4rudppfkytvm4jekf6ymmwqk2h0aj"
+    "vr5uhjpwfd9aga09ahpy88hz2um4l9t0xnpk3m9wlf22m2yjcshv3k4g5x7c68fn0gs6a35dw5r56cc3uztyf96l55ayeuvnd9fl4yrt68y086"
+    "xn6qgjhf4n7xkml62gz5ecypm3xz0wdd59tfhtrhwvp5qlps959vmpf4jygdkspxn8xalparwj8h9ts6v6v0rf7vvhhku40z9sa4txxmgsjzwq"
+    "zme4ddazxrfrlkc9m4uysh27zgqlx7jrfgvjw7rcqpmsrlga"
+)
+DATA = [(index * 7) % 32 for index in range(80)]
+TESTNET_INVOICE = encode("fibt100000000", DATA)
+MAINNET_OPEN_INVOICE = encode("fibb", DATA)
+
+
+def test_decode_real_invoice():
+    decoded = decode_fiber_invoice(FIBER_DOCS_INVOICE)
+    assert decoded == {"invoice": FIBER_DOCS_INVOICE, "currency": "fibt", "network": "testnet", "amount": 100000000,
+                       "expires_at": None}
+    assert extract_fiber_invoices(f"My invoice: {FIBER_DOCS_INVOICE} 🙏") == ([FIBER_DOCS_INVOICE], False)
+    corrupted = FIBER_DOCS_INVOICE[:60] + ("q" if FIBER_DOCS_INVOICE[60] != "q" else "p") + FIBER_DOCS_INVOICE[61:]
+    assert decode_fiber_invoice(corrupted) is None
+
+
+def test_decode_invoice():
+    decoded = decode_fiber_invoice(TESTNET_INVOICE)
+    assert decoded["invoice"] == TESTNET_INVOICE
+    assert decoded["currency"] == "fibt"
+    assert decoded["network"] == "testnet"
+    assert decoded["amount"] == 100000000
+    assert decoded["expires_at"] is None
+
+
+def test_decode_invoice_without_amount():
+    decoded = decode_fiber_invoice(MAINNET_OPEN_INVOICE.upper())
+    assert decoded["invoice"] == MAINNET_OPEN_INVOICE
+    assert decoded["network"] == "mainnet"
+    assert decoded["amount"] is None
+
+
+@pytest.mark.parametrize("invoice", [
+    TESTNET_INVOICE[:-1] + ("q" if TESTNET_INVOICE[-1] != "q" else "p"),  # checksum
+    TESTNET_INVOICE[:-10],  # truncated
+    encode("fibt100000000", DATA, BECH32_CONSTANT),  # bech32 instead of bech32m
+    encode("fibx100000000", DATA),  # unknown currency
+    encode("fibt0100", DATA),  # leading zero in the amount
+    encode("fibt100k", DATA),
+    encode("fibt", []),
+    "",
+    None,
+])
+def test_corrupted_invoice_is_rejected(invoice):
+    assert decode_fiber_invoice(invoice) is None
+
+
+def test_extract_invoices():
+    text = f"Pay me: {TESTNET_INVOICE}\nor {MAINNET_OPEN_INVOICE}, thanks! {TESTNET_INVOICE}"
+    assert extract_fiber_invoices(text) == ([TESTNET_INVOICE, MAINNET_OPEN_INVOICE], False)
+
+
+def test_extract_invoice_next_to_cjk_text():
+    assert extract_fiber_invoices(f"发票{TESTNET_INVOICE}谢谢") == ([TESTNET_INVOICE], False)
+
+
+def test_extract_reports_invalid_invoices():
+    corrupted = TESTNET_INVOICE[:-1] + ("q" if TESTNET_INVOICE[-1] != "q" else "p")
+    assert extract_fiber_invoices(f"invoice: {corrupted}") == ([], True)
+    # Broken by a line break
+    assert extract_fiber_invoices(f"invoice: {TESTNET_INVOICE[:20]}\n{TESTNET_INVOICE[20:]}") == ([], True)
+    assert extract_fiber_invoices("The answer is 42") == ([], False)
+
+
+def test_parse_expiry():
+    detail = {"invoice": {"data": {"timestamp": hex(1_700_000_000_000), "attrs": [{"expiry_time": "0xe10"}]}}}
+    assert parse_expiry(detail) == 1_700_000_000 + 3600
+    assert parse_expiry({"data": {"timestamp": 1_700_000_000_000, "attrs": [{"expiry_time": 60}]}}) == 1_700_000_060
+    assert parse_expiry({"data": {"timestamp": 1_700_000_000_000, "attrs": []}}) is None
+    assert parse_expiry({"status": "ok"}) is None
+    assert parse_expiry(None) is None
+
+
+class StubInvoiceDetail:
+    """Stands in for fetch_invoice_detail, counts the backend calls."""
+
+    def __init__(self, detail):
+        self.detail = detail
+        self.calls = 0
+
+    async def __call__(self, invoice):
+        self.calls += 1
+        return self.detail
+
+
+def expiring_detail(expires_in):
+    now_ms = int(time.time() * 1000)
+    return {"invoice": {"data": {"timestamp": now_ms, "attrs": [{"expiry_time": expires_in}]}}}
+
+
+@pytest.fixture
+def invoice_detail(monkeypatch):
+    def install(detail):
+        stub = StubInvoiceDetail(detail)
+        monkeypatch.setattr(fiber_invoice_module, "fetch_invoice_detail", stub)
+        return stub
+
+    return install
+
+
+def test_validate_confirms_with_the_backend(invoice_detail):
+    detail = expiring_detail(3600)
+    backend = invoice_detail(detail)
+    decoded = asyncio.run(validate_fiber_invoice(FIBER_DOCS_INVOICE, confirm=True))
+    assert decoded["detail"] == detail
+    assert decoded["expires_at"] > time.time()
+    assert backend.calls == 1
+
+
+def test_validate_rejects_expired_and_unknown_invoices(invoice_detail):
+    invoice_detail(expiring_detail(-60))
+    assert asyncio.run(validate_fiber_invoice(TESTNET_INVOICE, confirm=True)) is None
+    invoice_detail(None)
+    assert asyncio.run(validate_fiber_invoice(TESTNET_INVOICE, confirm=True)) is None
+
+
+def test_validate_rejects_malformed_invoices_without_the_backend(invoice_detail):
+    backend = invoice_detail(expiring_detail(3600))
+    assert asyncio.run(validate_fiber_invoice(FIBER_DOCS_INVOICE[:-1] + "x", confirm=True)) is None
+    assert asyncio.run(validate_fiber_invoice(encode("fibt100000000", DATA, BECH32_CONSTANT), confirm=True)) is None
+    assert backend.calls == 0
+
+
+def test_validate_offline(invoice_detail):
+    backend = invoice_detail(expiring_detail(3600))
+    assert asyncio.run(validate_fiber_invoice(TESTNET_INVOICE, confirm=False))["amount"] == 100000000
+    assert asyncio.run(validate_fiber_invoice(TESTNET_INVOICE[:-1] + "x", confirm=False)) is None
+    assert backend.calls == 0
@@ -0,0 +1,53 @@
+# test/test_judge_answers.py
+import asyncio
+import json
+
+import openai_api.question_and_answer_gen as question_and_answer_gen_module
+from openai_api.question_and_answer_gen import parse_judged_answers, judge_answers_for_score
+from test_fiber_invoice import encode
+
+FIRST_INVOICE = encode("fibt100000000", [(index * 7) % 32 for index in range(80)])
+SECOND_INVOICE = encode("fibt200000000", [(index * 11) % 32 for index in range(80)])
+
+
+def judged(index, invoice, score=80):
+    return {"id": index, "score": score, "invoice": invoice, "reply_content": "Thanks!"}
+
+
+def test_parse_judged_answers():
+    content = "```json\n" + json.dumps({"results": [
+        judged(2, None, 40), judged(1, FIRST_INVOICE), judged(3, None), {"id": 1}, {"id": "x", "score": 1},
+    ]}) + "\n```"
+    results = parse_judged_answers(content, 2)
+    assert results == {
+        0: {"score": 80, "invoice": FIRST_INVOICE, "reply_content": "Thanks!"},
+        1: {"score": 40, "invoice": None, "reply_content": "Thanks!"},
+    }
+
+
+def run_judging(monkeypatch, user_answers, batch_output, single_output=None):
+    async def fake_batch(question_context, question_prompt, reference_answer, answers):
+        return parse_judged_answers(json.dumps({"results": batch_output}), len(answers))
+
+    async def fake_single(question_context, question_prompt, reference_answer, answer):
+        return single_output
+
+    monkeypatch.setattr(question_and_answer_gen_module, "judge_answers_batch", fake_batch)
+    monkeypatch.setattr(question_and_answer_gen_module, "judge_answer_for_score", fake_single)
+    return asyncio.run(judge_answers_for_score("context", "question", "reference", user_answers))
+
+
+def test_invoice_of_another_answer_is_dropped(monkeypatch):
+    user_answers = [f"Answer one {FIRST_INVOICE}", "Answer two, no invoice", f"Answer three {SECOND_INVOICE.upper()}"]
+    # The completion swapped the invoices of the first answers
+    results = run_judging(monkeypatch, user_answers, [
+        judged(1, SECOND_INVOICE), judged(2, FIRST_INVOICE), judged(3, SECOND_INVOICE.upper()),
+    ])
+    assert [result["invoice"] for result in results] == [None, None, SECOND_INVOICE]
+    assert [result["score"] for result in results] == [80, 80, 80]
+
+
+def test_made_up_invoice_is_dropped_in_single_judging(monkeypatch):
+    results = run_judging(monkeypatch, [f"Answer {FIRST_INVOICE[:-1]}"], [],
+                          {"score": 90, "invoice": FIRST_INVOICE, "reply_content": "Thanks!"})
+    assert results == [{"score": 90, "invoice": None, "reply_content": "Thanks!"}]
@@ -0,0 +1,163 @@
+# test/test_payout_outbox.py
+import asyncio
+import json
+
+import pytest
+
+fakeredis = pytest.importorskip("fakeredis")
+
+import ckb.payout_batcher as payout_batcher_module
+import ckb.payout_outbox as payout_outbox_module
+from ckb.payout_batcher import PayoutBatcher
+from ckb.payout_outbox import PayoutOutbox, PAYOUT_OUTBOX_KEY, PAYOUT_PENDING, PAYOUT_SUBMITTED, PAYOUT_CONFIRMED, \
+    PAYOUT_FAILED
+
+ADDRESS = "ckt1qzda0cr08m85hc8jlnfp3zer7xulejywt49kt2rr0vthywaa50xwsqflz4emgssc6nqj4yv3nfv2sca7g9dzhscgmg28x"
+
+
+class StubTransfer:
+    """Stands in for transfer_ckb, records the payout state seen while the transfer is sent."""
+
+    def __init__(self, results, delay=0.0):
+        self.results = list(results)
+        self.delay = delay
+        self.calls = []
+        self.outbox = None
+
+    async def __call__(self, to_address, amount, idempotency_key=None):
+        record = await self.outbox.get(idempotency_key)
+        self.calls.append((to_address, amount, idempotency_key, record["state"]))
+        await asyncio.sleep(self.delay)
+        return self.results.pop(0)
+
+
+@pytest.fixture
+def outbox(monkeypatch):
+    redis = fakeredis.aioredis.FakeRedis()
+    monkeypatch.setattr(payout_outbox_module, "redis_client", redis)
+    monkeypatch.setattr(payout_outbox_module, "payout_batcher", PayoutBatcher(0.05, 20, enabled=False))
+    return PayoutOutbox(max_attempts=2, retry_delay=0, poll_interval=0.01)
+
+
+def use_transfer(monkeypatch, outbox, stub):
+    stub.outbox = outbox
+    monkeypatch.setattr(payout_batcher_module, "transfer_ckb", stub)
+    return stub
+
+
+def test_pending_submitted_confirmed(monkeypatch, outbox):
+    stub = use_transfer(monkeypatch, outbox, StubTransfer(["Transfer successfully! your txHash is 0x01"]))
+    confirmed = []
+
+    async def handler(record):
+        confirmed.append(record["key"])
+
+    outbox.register_handler("test", handler)
+
+    async def scenario():
+        record, created = await outbox.enqueue("1", ADDRESS, 100, handler="test")
+        assert created and record["state"] == PAYOUT_PENDING
+        await outbox.process(record["key"])
+        return await outbox.get(record["key"]), await payout_outbox_module.redis_client.zcard(PAYOUT_OUTBOX_KEY)
+
+    record, backlog = asyncio.run(scenario())
+    assert [call[3] for call in stub.calls] == [PAYOUT_SUBMITTED]
+    assert record["state"] == PAYOUT_CONFIRMED and record["attempts"] == 1
+    assert record["result"].endswith("0x01")
+    assert confirmed == [record["key"]]
+    assert backlog == 0
+
+
+def test_enqueue_is_idempotent(outbox):
+    async def scenario():
+        first, first_created = await outbox.enqueue("1", ADDRESS, 100)
+        second, second_created = await outbox.enqueue("1", ADDRESS, 500)
+        return first, first_created, second, second_created
+
+    first, first_created, second, second_created = asyncio.run(scenario())
+    assert first_created and not second_created
+    assert second["amount"] == first["amount"] == 100
+
+
+def test_refused_transfers_are_retried_then_failed(monkeypatch, outbox):
+    stub = use_transfer(monkeypatch, outbox, StubTransfer([None, None]))
+
+    async def scenario():
+        record, _ = await outbox.enqueue("1", ADDRESS, 100)
+        await outbox.process(record["key"])
+        after_first = await outbox.get(record["key"])
+        await outbox.process(record["key"])
+        return after_first, await outbox.get(record["key"])
+
+    after_first, after_second = asyncio.run(scenario())
+    assert after_first["state"] == PAYOUT_PENDING and after_first["attempts"] == 1
+    assert after_second["state"] == PAYOUT_FAILED and after_second["attempts"] == 2
+    assert len(stub.calls) == 2
+
+
+def test_submitted_address_payout_is_not_sent_again(monkeypatch, outbox):
+    stub = use_transfer(monkeypatch, outbox, StubTransfer(["paid"]))
+
+    async def scenario():
+        record, _ = await outbox.enqueue("1", ADDRESS, 100)
+        # The process died while the transfer was being sent
+        record["state"] = PAYOUT_SUBMITTED
+        await payout_outbox_module.redis_client.set(
+            f"{payout_outbox_module.PAYOUT_RECORD_PREFIX}{record['key']}", json.dumps(record)
+        )
+        await outbox.process(record["key"])
+        return await outbox.get(record["key"])
+
+    record = asyncio.run(scenario())
+    assert record["state"] == PAYOUT_FAILED
+    assert "Interrupted" in record["last_error"]
+    assert stub.calls == []
+
+
+def test_invalid_address_fails_without_transfer(monkeypatch, outbox):
+    stub = use_transfer(monkeypatch, outbox, StubTransfer(["paid"]))
+
+    async def scenario():
+        record, _ = await outbox.enqueue("1", ADDRESS[:-1] + "q", 100)
+        await outbox.process(record["key"])
+        return await outbox.get(record["key"])
+
+    record = asyncio.run(scenario())
+    assert record["state"] == PAYOUT_FAILED and record["last_error"] == "Invalid CKB address"
+    assert stub.calls == []
+
+
+def test_cancelled_while_queued_in_a_batch_is_pending_again(monkeypatch, outbox):
+    stub = use_transfer(monkeypatch, outbox, StubTransfer(["paid"]))
+    batcher = PayoutBatcher(10, 20, enabled=True)
+    monkeypatch.setattr(payout_outbox_module, "payout_batcher", batcher)
+
+    async def scenario():
+        record, _ = await outbox.enqueue("1", ADDRESS, 100)
+        task = asyncio.create_task(outbox.process(record["key"]))
+        await asyncio.sleep(0.05)
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+        # Shutdown pays whatever is still queued, the withdrawn payout must not be in it
+        await batcher.stop()
+        return await outbox.get(record["key"])
+
+    record = asyncio.run(scenario())
+    assert record["state"] == PAYOUT_PENDING and record["attempts"] == 0
+    assert stub.calls == []
+
+
+def test_cancelled_while_the_transfer_is_in_flight_records_the_outcome(monkeypatch, outbox):
+    stub = use_transfer(monkeypatch, outbox, StubTransfer(["paid"], delay=0.1))
+
+    async def scenario():
+        record, _ = await outbox.enqueue("1", ADDRESS, 100)
+        task = asyncio.create_task(outbox.process(record["key"]))
+        await asyncio.sleep(0.05)
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+        return await outbox.get(record["key"])
+
+    record = asyncio.run(scenario())
+    assert record["state"] == PAYOUT_CONFIRMED and record["result"] == "paid"
+    assert len(stub.calls) == 1
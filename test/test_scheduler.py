@@ -0,0 +1,51 @@
+# test/test_scheduler.py
+from datetime import datetime, timezone
+
+import pytest
+
+from utils.scheduler import CronExpression
+
+
+def utc(*args):
+    return datetime(*args, tzinfo=timezone.utc)
+
+
+def test_next_after_is_strictly_after():
+    cron = CronExpression("*/15 * * * *")
+    assert cron.next_after(utc(2026, 10, 1, 12, 15)) == utc(2026, 10, 1, 12, 30)
+    assert cron.next_after(utc(2026, 10, 1, 12, 14, 59)) == utc(2026, 10, 1, 12, 15)
+
+
+def test_next_after_rolls_over_the_year():
+    assert CronExpression("@yearly").next_after(utc(2026, 12, 31, 23, 59)) == utc(2027, 1, 1, 0, 0)
+
+
+def test_february_29_waits_for_a_leap_year():
+    assert CronExpression("0 0 29 2 *").next_after(utc(2025, 3, 1)) == utc(2028, 2, 29, 0, 0)
+
+
+def test_day_of_month_or_day_of_week_when_both_restricted():
+    # 13th of the month or any Friday
+    cron = CronExpression("0 12 13 * 5")
+    # 2026-10-01 is a Thursday
+    assert cron.next_after(utc(2026, 10, 1)) == utc(2026, 10, 2, 12, 0)
+    assert cron.next_after(utc(2026, 10, 9, 12, 0)) == utc(2026, 10, 13, 12, 0)
+
+
+def test_day_of_week_only_ignores_day_of_month():
+    # Mondays, 7 and 0 are both Sunday
+    assert CronExpression("30 9 * * 1").next_after(utc(2026, 10, 1)) == utc(2026, 10, 5, 9, 30)
+    assert CronExpression("0 0 * * 7").next_after(utc(2026, 10, 1)) == CronExpression("0 0 * * 0").next_after(
+        utc(2026, 10, 1)
+    )
+
+
+def test_expression_which_never_matches():
+    with pytest.raises(ValueError):
+        CronExpression("0 0 31 2 *").next_after(utc(2026, 1, 1))
+
+
+@pytest.mark.parametrize("expression", ["* * * *", "60 * * * *", "0 24 * * *", "0 0 0 * *", "0 0 * 13 *", "*/0 * * * *"])
+def test_invalid_expressions(expression):
+    with pytest.raises(ValueError):
+        CronExpression(expression)
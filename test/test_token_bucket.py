@@ -0,0 +1,32 @@
+# test/test_token_bucket.py
+import asyncio
+import time
+
+import pytest
+
+from utils.token_bucket import TokenBucket
+
+
+def test_burst_then_rate():
+    async def scenario():
+        bucket = TokenBucket(rate=50, capacity=2)
+        started_at = time.monotonic()
+        for _ in range(3):
+            await bucket.acquire()
+        return time.monotonic() - started_at
+
+    # Two tokens right away, the third one after 1/50 s
+    assert 0.015 <= asyncio.run(scenario()) < 0.5
+
+
+def test_zero_rate_is_unlimited():
+    async def scenario():
+        bucket = TokenBucket(rate=0, capacity=0)
+        await asyncio.wait_for(asyncio.gather(*(bucket.acquire() for _ in range(100))), 1)
+
+    asyncio.run(scenario())
+
+
+def test_capacity_below_one_is_rejected():
+    with pytest.raises(ValueError):
+        TokenBucket(rate=1, capacity=0)
@@ -0,0 +1,160 @@
+# test/test_transaction_listener.py
+import asyncio
+import json
+
+import pytest
+
+fakeredis = pytest.importorskip("fakeredis")
+
+import ckb.transaction_listener as transaction_listener_module
+from ckb.transaction_listener import listen_for_transactions, transaction_stop_event, ThanksCoalescer, \
+    claim_pending_batch, handle_transactions, fetch_transactions, retry_failed_transactions, receive_pushed_transactions, \
+    push_transaction, ensure_transaction_stream_group, handle_stream_entries, TX_STREAM_KEY, TX_STREAM_GROUP, \
+    TX_PENDING_KEY, TX_PROCESSED_KEY, TX_ATTEMPTS_KEY, TX_FAILED_KEY, TX_LEASE_PREFIX, TX_RETRY_LEASE_OWNER
+
+OUR_ADDRESS = "ckt1qour"
+
+
+@pytest.fixture
+def redis(monkeypatch):
+    redis = fakeredis.aioredis.FakeRedis()
+    monkeypatch.setattr(transaction_listener_module, "redis_client", redis)
+    monkeypatch.setattr(transaction_listener_module, "OUR_ADDRESS", OUR_ADDRESS)
+    monkeypatch.setattr(transaction_listener_module, "TX_POLL_BATCH_SIZE", 5)
+    monkeypatch.setattr(transaction_listener_module, "TX_POLL_INTERVAL", 0.01)
+    monkeypatch.setattr(transaction_listener_module, "thanks_coalescer", ThanksCoalescer(0.01))
+    return redis
+
+
+async def add_transactions(redis, poison_count, valid_count):
+    """Poison transactions (no payload, or a value which is not a number) first, then valid ones."""
+    async with redis.pipeline(transaction=True) as pipe:
+        for index in range(poison_count):
+            tx_hash = f"0xpoison{index}"
+            pipe.zadd(TX_PENDING_KEY, {tx_hash: index})
+            if index % 2:
+                pipe.hset("transactions", tx_hash, json.dumps(
+                    {"balanceChanges": [{"address": OUR_ADDRESS, "value": "1.5"}], "inputs": []}
+                ))
+        for index in range(valid_count):
+            tx_hash = f"0xvalid{index}"
+            pipe.zadd(TX_PENDING_KEY, {tx_hash: poison_count + index})
+            pipe.hset("transactions", tx_hash, json.dumps({"balanceChanges": [], "inputs": []}))
+        await pipe.execute()
+
+
+async def listen_until(redis, condition, timeout=2.0):
+    transaction_stop_event.clear()
+    task = asyncio.create_task(listen_for_transactions())
+    try:
+        for _ in range(int(timeout / 0.01)):
+            if await condition():
+                break
+            await asyncio.sleep(0.01)
+    finally:
+        transaction_stop_event.set()
+        await task
+        transaction_stop_event.clear()
+
+
+async def processed_count(redis, count):
+    return await redis.zcard(TX_PROCESSED_KEY) >= count
+
+
+async def pending_count(redis, count):
+    return await redis.zcard(TX_PENDING_KEY) <= count
+
+
+def test_poison_entries_at_the_head_do_not_starve_the_others(redis, monkeypatch):
+    monkeypatch.setattr(transaction_listener_module, "TX_RETRY_DELAY", 60)
+
+    async def scenario():
+        await add_transactions(redis, 5, 3)
+        await listen_until(redis, lambda: processed_count(redis, 3))
+        assert await redis.zrange(TX_PROCESSED_KEY, 0, -1) == [b"0xvalid0", b"0xvalid1", b"0xvalid2"]
+        # Backed off until their next attempt, still pending
+        assert await redis.zcard(TX_PENDING_KEY) == 5
+        assert await redis.get(f"{TX_LEASE_PREFIX}0xpoison0") == TX_RETRY_LEASE_OWNER.encode()
+        assert await redis.hget(TX_ATTEMPTS_KEY, "0xpoison0") == b"1"
+
+    asyncio.run(scenario())
+
+
+def test_poison_entries_are_given_up_after_max_attempts(redis, monkeypatch):
+    monkeypatch.setattr(transaction_listener_module, "TX_RETRY_DELAY", 0.001)
+    monkeypatch.setattr(transaction_listener_module, "TX_MAX_ATTEMPTS", 2)
+
+    async def scenario():
+        await add_transactions(redis, 5, 3)
+        await listen_until(redis, lambda: pending_count(redis, 0))
+        assert await redis.zcard(TX_PROCESSED_KEY) == 3
+        assert await redis.hlen(TX_ATTEMPTS_KEY) == 0
+        failed = {tx_hash.decode(): json.loads(record) for tx_hash, record in (await redis.hgetall(TX_FAILED_KEY)).items()}
+        assert sorted(failed) == [f"0xpoison{index}" for index in range(5)]
+        assert failed["0xpoison0"] == {"score": 0, "attempts": 2, "error": "No transaction data"}
+        assert failed["0xpoison1"]["error"].startswith("ValueError")
+
+    asyncio.run(scenario())
+
+
+def test_claim_window_moves_past_failed_entries(redis, monkeypatch):
+    monkeypatch.setattr(transaction_listener_module, "TX_RETRY_DELAY", 60)
+
+    async def claim(worker_id):
+        monkeypatch.setattr(transaction_listener_module, "TX_WORKER_ID", worker_id)
+        owned_batch, has_more = await claim_pending_batch()
+        return [tx_hash for tx_hash, _, _ in owned_batch], has_more
+
+    async def scenario():
+        await add_transactions(redis, 5, 8)
+        # The first worker owns the poison entries and fails them
+        first_batch, has_more = await claim("worker-a")
+        assert first_batch == [f"0xpoison{index}" for index in range(5)] and has_more
+        batch = [(tx_hash, 0, None) for tx_hash in first_batch]
+        errors = {}
+        await handle_transactions(batch, await fetch_transactions(first_batch), errors)
+        await retry_failed_transactions([(tx_hash, 0, errors[tx_hash]) for tx_hash in first_batch])
+
+        # Its next window, and another worker's, start after them
+        assert await claim("worker-b") == ([f"0xvalid{index}" for index in range(5)], True)
+        assert await claim("worker-a") == ([f"0xvalid{index}" for index in range(5, 8)], False)
+
+    asyncio.run(scenario())
+
+
+def test_stream_skips_a_transaction_pushed_to_another_worker(redis, monkeypatch):
+    monkeypatch.setattr(transaction_listener_module, "TX_LISTENER_MODE", "stream")
+    tx_data = {"txHash": "0xpushed", "balanceChanges": [{"address": OUR_ADDRESS, "value": "100"}],
+               "inputs": [{"address": "ckt1qsender"}]}
+
+    async def as_worker(worker_id):
+        monkeypatch.setattr(transaction_listener_module, "TX_WORKER_ID", worker_id)
+        coalescer = ThanksCoalescer(60)
+        monkeypatch.setattr(transaction_listener_module, "thanks_coalescer", coalescer)
+        return coalescer
+
+    async def read_stream():
+        response = await redis.xreadgroup(TX_STREAM_GROUP, "worker-b", {TX_STREAM_KEY: ">"}, count=10)
+        return response[0][1] if response else []
+
+    async def scenario():
+        await ensure_transaction_stream_group()
+        # The first worker gets the webhook push, its thank-you waits in the coalescing window
+        await as_worker("worker-a")
+        assert await receive_pushed_transactions([tx_data]) == {"0xpushed": "deferred"}
+
+        # The indexer also appends it to the stream, read by the second worker
+        await push_transaction("0xpushed", tx_data)
+        coalescer = await as_worker("worker-b")
+        entries = await read_stream()
+        await handle_stream_entries(entries)
+        assert not coalescer.groups
+        assert (await redis.xpending(TX_STREAM_KEY, TX_STREAM_GROUP))["pending"] == 1
+
+        # Once the first worker tagged it, the entry is acknowledged without being handled
+        await redis.zadd(TX_PROCESSED_KEY, {"0xpushed": 1})
+        await handle_stream_entries(entries)
+        assert not coalescer.groups
+        assert (await redis.xpending(TX_STREAM_KEY, TX_STREAM_GROUP))["pending"] == 0
+
+    asyncio.run(scenario())
@@ -3,6 +3,7 @@ import json
 import os
 from twikit import Client
 from config.config import EMAIL, USERNAME, PASSWORD, COOKIE_PATH, HTTP_PROXY, COOKIES_JSON
+from utils.metrics import instrument_methods
 
 if HTTP_PROXY == "" or HTTP_PROXY is None:
     client = Client('en-US',
@@ -11,6 +12,10 @@ else:
     client = Client('en-US', proxy=HTTP_PROXY,
                     user_agent='Mozilla/5.0 (Macintosh; Intel Mac OS X 14_6_1) AppleWebKit/605.1.15 (KHTML, like Gecko) Version/17.5 Safari/605.1.15')
 
+# Calls made directly from the reply analysis loop, post_tweet is instrumented as a whole
+instrument_methods(client, "twikit", ("get_user_tweets", "get_tweet_by_id"))
+
+
 async def login():
     if os.path.exists(COOKIE_PATH) and os.path.getsize(COOKIE_PATH) > 0:
         client.load_cookies(COOKIE_PATH)
@@ -2,6 +2,8 @@ import os
 from dotenv import load_dotenv
 import tweepy
 
+from utils.metrics import instrument_methods
+
 # load environment
 load_dotenv()
 
@@ -49,3 +51,5 @@ class TwitterClient:
 
 
 n_client = TwitterClient()
+# Called directly from the question loop, the other calls go through twitter/operations.py
+instrument_methods(n_client.api_client, "tweepy", ("get_tweet",))
@@ -2,9 +2,11 @@ import os
 
 import requests
 
+from utils.metrics import instrument
 from .new_client import TwitterClient
 
 
+@instrument("tweepy")
 def post_tweet(client: TwitterClient, text: str) -> dict:
     """
     post_tweet(client, text) -> dict.
@@ -19,6 +21,7 @@ def post_tweet(client: TwitterClient, text: str) -> dict:
         raise RuntimeError(f"Error posting tweet: {e}")
 
 
+@instrument("tweepy")
 def get_tweets(client: TwitterClient, max_results: int = 1) -> list:
     """
     get_tweets(client, max_results: int) -> list.
@@ -34,6 +37,7 @@ def get_tweets(client: TwitterClient, max_results: int = 1) -> list:
         raise RuntimeError(f"Error fetching tweets: {e}")
 
 
+@instrument("tweepy")
 def get_comments(client: TwitterClient, tweet_id: str, max_results: int = 10) -> list:
     """
     get_comments(client, tweet_id: str, max_results: int) -> list.
@@ -49,6 +53,7 @@ def get_comments(client: TwitterClient, tweet_id: str, max_results: int = 10) ->
         raise RuntimeError(f"Error fetching comments: {e}")
 
 
+@instrument("tweepy")
 def get_user_mention_comments(client: TwitterClient, user_id: str, start_time=None, end_time=None, max_results=30):
     """
     get_user_mentions(client, user_id: str, start_time=None, end_time=None) -> list.
@@ -68,6 +73,7 @@ def get_user_mention_comments(client: TwitterClient, user_id: str, start_time=No
         raise RuntimeError(f"Error fetching comments: {e}")
 
 
+@instrument("tweepy")
 def reply_comment(client: TwitterClient, comment_id: str, reply_text: str) -> dict:
     """
     reply_comment(client, comment_id, reply_text) -> dict.
@@ -83,6 +89,7 @@ def reply_comment(client: TwitterClient, comment_id: str, reply_text: str) -> di
 
 
 # Get tweet's Retweets
+@instrument("tweepy")
 def get_retweets(client: TwitterClient, tweet_id: str, max_results: int = 100) -> list:
     """
     get_retweets(client, tweet_id, max_results) -> list.
@@ -132,6 +139,7 @@ def get_retweets(client: TwitterClient, tweet_id: str, max_results: int = 100) -
         raise RuntimeError(f"Error fetching retweets: {e}")
 
 
+@instrument("twitter_api")
 def get_retweets_list(tweet_id: str, max_results: int = 100) -> list:
     """
     Fetches the Retweets (Tweet objects) for a given Tweet ID using Twitter API v2.
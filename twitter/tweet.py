@@ -5,10 +5,12 @@ import os
 import sys
 from datetime import datetime, timedelta
 
-from ckb.ckb_service import transfer_ckb, transfer_token
+from ckb.payout_outbox import payout_outbox
 from config.config import redis_client, SEAL_XUDT_ARGS, CKB_MIN, CKB_MAX, SEAL_MAX, SEAL_MIN
 from openai_api.award_gen import analyze_reply_for_transfer
 from twitter.client import client, login
+from utils.metrics import instrument
+from utils.supervisor import supervisor
 import time
 
 # Global variable to stop the loop
@@ -32,6 +34,7 @@ async def reset_hourly_limits():
             data["timestamp"] = current_time
 
 
+@instrument("twikit")
 async def post_tweet(content, image_paths=None):
     await login()  # Ensure login first
     try:
@@ -64,6 +67,7 @@ async def fetch_and_analyze_replies(user_id):
             return
 
         try:
+            supervisor.begin_iteration("fetch_and_analyze")
             tweets = await client.get_user_tweets(user_id, "Tweets")
             await asyncio.sleep(1)
             for tweet in tweets:
@@ -120,18 +124,19 @@ async def fetch_and_analyze_replies(user_id):
                                     if not has_claimed:
                                         print(f"User {to_user_id} has not already claimed the reward.")
                                         # continue
+                                        # Rewards are stored in the payout outbox and paid in batches by its worker
                                         if currency_type == "CKB":
                                             if CKB_MIN <= amount <= CKB_MAX:
-                                                transfer_result = await transfer_ckb(to_address, amount)
+                                                await payout_outbox.enqueue(reply.id, to_address, amount)
                                         elif currency_type == "Seal":
                                             if SEAL_MIN <= amount <= SEAL_MAX:
-                                                transfer_result = await transfer_token(to_address, amount, SEAL_XUDT_ARGS)
+                                                await payout_outbox.enqueue(reply.id, to_address, amount,
+                                                                            xudt_args=SEAL_XUDT_ARGS)
                                         else:
                                             print("Unrecognized currency type in response:", currency_type)
                                             continue
                                         # Mark user as claimed in Redis
                                         await redis_client.set(user_claim_key, "claimed")
-                                        print("Transfer Result:", transfer_result)
                                 except Exception as e:
                                     print(f"Transfer error:{e}")
                             if reply_content:
@@ -157,8 +162,10 @@ async def fetch_and_analyze_replies(user_id):
                 # Update last processed time
                 last_processed_time = datetime.now().timestamp()
                 await redis_client.set(f"last_processed_time:{tweet_id}", last_processed_time)
+            supervisor.end_iteration("fetch_and_analyze")
             await asyncio.sleep(60)
         except Exception as e:
+            supervisor.record_error("fetch_and_analyze", e)
             await asyncio.sleep(120)
             print("\n" + "=" * 30)
             print(f"Failed to retrieve replies: {e}")
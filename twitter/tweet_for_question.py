@@ -4,15 +4,17 @@ import json
 import os
 from datetime import datetime, timedelta, timezone
 
-from ckb.ckb_service import transfer_ckb, fetch_invoice_detail, transfer_ckb_with_invoice
+from ckb.fiber_invoice import validate_fiber_invoice
+from ckb.payout_outbox import payout_outbox, PAYOUT_INVOICE, PAYOUT_FAILED
 from config.config import redis_client, CKB_MIN, CKB_MAX, MIN_AWARD_SCORE
 from config.logging_config import logger
-from openai_api.question_and_answer_gen import generate_question_with_answer, judge_answer_for_score, \
-    detect_invoice_in_answer
+from openai_api.question_and_answer_gen import generate_question_with_answer, judge_answers_for_score
+from openai_api.question_pool import question_pool
 from twitter.client import client
 from twitter.new_client import n_client
 from twitter.operations import post_tweet, get_user_mention_comments, reply_comment, get_retweets, get_retweets_list
 from utils.image_url import extract_invoice_from_qr
+from utils.supervisor import supervisor
 
 # Global variables to control the process
 tweet_for_question_stop_event = asyncio.Event()
@@ -39,6 +41,15 @@ def deserialize_datetime(obj):
     return obj
 
 
+async def reply_question_reward(record):
+    """Reply to the rewarded answer once its payout is confirmed."""
+    reply_comment(n_client, record["context"]["mention_id"], record["context"]["reply_content"])
+    print(f"Rewarded user with invoice {record['recipient']} for {record['amount']} in CKB")
+
+
+payout_outbox.register_handler("question_reward", reply_question_reward)
+
+
 async def tweet_for_question():
     user_id = n_client.api_client.get_me().data.id
     post_wait_time_alter_3h = 300  # Time to wait after 3 hours if answered late (5 minutes)
@@ -86,8 +97,12 @@ async def tweet_for_question():
                 #     continue
 
             else:
-                # Step 1: Generate a question and reference answer
-                question_data = await generate_question_with_answer()
+                # Step 1: Take a pre-generated question, or generate one if the pool is empty
+                question_data = await question_pool.pop()
+                if not question_data:
+                    question_data = await generate_question_with_answer()
+                    if question_data:
+                        await question_pool.remember(question_data)
                 if not question_data:
                     print("Failed to generate question and answer. Retrying...")
                     logger.info("Failed to generate question and answer. Retrying...")
@@ -137,6 +152,7 @@ async def tweet_for_question():
             while not tweet_for_question_stop_event.is_set():
                 if not is_tweet_for_question_active:
                     return
+                supervisor.begin_iteration("tweet_for_question")
                 question_metadata = json.loads(await redis_client.get(question_key), object_hook=deserialize_datetime)
                 if question_metadata["rewarded"]:
                     break  # If the question has already been rewarded, stop processing this question
@@ -165,6 +181,7 @@ async def tweet_for_question():
 
                 if not mentions:
                     print("No new mentions found. Retrying...")
+                    supervisor.end_iteration("tweet_for_question")
                     await asyncio.sleep(30)
                     continue
 
@@ -172,9 +189,11 @@ async def tweet_for_question():
                     print("No new mentions found. Retrying...")
                     question_metadata["last_processed_timestamp"] = last_processed_timestamp
                     await redis_client.set(question_key, json.dumps(question_metadata, default=serialize_datetime))
+                    supervisor.end_iteration("tweet_for_question")
                     await asyncio.sleep(120)
                     continue
 
+                answers = []
                 for mention in mentions.data:
                     if not is_tweet_for_question_active:
                         return
@@ -205,15 +224,19 @@ async def tweet_for_question():
                         mention_text = f"{mention_text}\n\n{extract_invoice}"
 
                     logger.info(f"mention_text: {mention_text} mention_id: {mention_id}")
+                    answers.append((mention_id, mention_text))
+
+                # Step 3: Evaluate the answers together, the question and reference answer are only sent once
+                results = await judge_answers_for_score(
+                    question_context=question_context,
+                    question_prompt=question_prompt,
+                    reference_answer=reference_answer,
+                    user_answers=[mention_text for _, mention_text in answers]
+                )
 
-                    # Step 3: Evaluate mention using judge_answer_for_score
-                    result = await judge_answer_for_score(
-                        question_context=question_context,
-                        question_prompt=question_prompt,
-                        reference_answer=reference_answer,
-                        user_answer=mention_text
-                    )
-
+                for (mention_id, mention_text), result in zip(answers, results):
+                    if not is_tweet_for_question_active:
+                        return
                     score = result.get("score", 0)
                     invoice = result.get("invoice", None)
                     reply_content = result.get("reply_content", None)
@@ -224,18 +247,23 @@ async def tweet_for_question():
                         if invoice and amount:
                             # Mark the question as rewarded in Redis
                             question_metadata["rewarded"] = True
-                            data = await fetch_invoice_detail(invoice)
+                            data = await validate_fiber_invoice(invoice)
                             if data:
                                 transfer_response = None
                                 if CKB_MIN <= amount <= CKB_MAX:
-                                    transfer_response = await transfer_ckb_with_invoice(invoice, amount)
+                                    # Stored first so the payout is retried without judging the answer again,
+                                    # the user gets the reply once the payout is confirmed
+                                    record, _ = await payout_outbox.enqueue(
+                                        current_question_id, invoice, amount, kind=PAYOUT_INVOICE,
+                                        handler="question_reward",
+                                        context={"mention_id": mention_id, "reply_content": combine_reply_content}
+                                    )
+                                    # First attempt right away, the outbox worker retries it if needed
+                                    record = await payout_outbox.process(record["key"]) or record
+                                    transfer_response = record["state"] != PAYOUT_FAILED
                                 if transfer_response:
-                                    # Reply and acknowledge the user's response
-                                    reply_content = combine_reply_content
-                                    reply_comment(n_client, mention_id, reply_content)
                                     await redis_client.set(question_key,
                                                            json.dumps(question_metadata, default=serialize_datetime))
-                                    print(f"Rewarded user with invoice {invoice} for {amount} in CKB")
 
                                     # Wait based on whether 3 hours have passed
                                     elapsed_time = datetime.now(timezone.utc) - timestamp
@@ -266,6 +294,7 @@ async def tweet_for_question():
                 question_metadata["last_processed_timestamp"] = datetime.now(timezone.utc)
                 await redis_client.set(question_key, json.dumps(question_metadata, default=serialize_datetime))
                 logger.info(f"finish setting question metadata: {question_metadata}")
+                supervisor.end_iteration("tweet_for_question")
                 if not is_tweet_for_question_active:
                     return
                 await asyncio.sleep(120)  # Pause between fetches
@@ -276,6 +305,7 @@ async def tweet_for_question():
             await asyncio.sleep(600)
 
         except Exception as e:
+            supervisor.record_error("tweet_for_question", e)
             logger.error(f"Error in tweet_for_question: {e}")
             print(f"Error in tweet_for_question: {e}")
             await asyncio.sleep(60)  # Pause before retrying
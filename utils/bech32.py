@@ -0,0 +1,82 @@
+# utils/bech32.py
+"""
+Bech32 and bech32m decoding (BIP-173 / BIP-350), used for CKB addresses and Fiber invoices.
+"""
+
+CHARSET = "qpzry9x8gf2tvdw0s3jn54khce6mua7l"
+CHARSET_INDEX = {char: index for index, char in enumerate(CHARSET)}
+
+BECH32 = "bech32"
+BECH32M = "bech32m"
+BECH32_CONSTANT = 1
+BECH32M_CONSTANT = 0x2BC830A3
+
+GENERATOR = (0x3B6A57B2, 0x26508E6D, 0x1EA119FA, 0x3D4233DD, 0x2A1462B3)
+
+
+def _polymod(values):
+    checksum = 1
+    for value in values:
+        top = checksum >> 25
+        checksum = (checksum & 0x1FFFFFF) << 5 ^ value
+        for i in range(5):
+            if (top >> i) & 1:
+                checksum ^= GENERATOR[i]
+    return checksum
+
+
+def _hrp_expand(hrp):
+    return [ord(char) >> 5 for char in hrp] + [0] + [ord(char) & 31 for char in hrp]
+
+
+def bech32_decode(text: str, max_length: int = None):
+    """
+    Decode a bech32 or bech32m string.
+    CKB full addresses and Fiber invoices are longer than the 90 characters of BIP-173, no limit by default.
+    :return: (hrp, 5-bit data without checksum, encoding), or None if the string is not valid
+    """
+    if not text or (max_length and len(text) > max_length):
+        return None
+    if text.lower() != text and text.upper() != text:
+        return None
+    text = text.lower()
+    separator = text.rfind("1")
+    if separator < 1 or separator + 7 > len(text):
+        return None
+    hrp, data_part = text[:separator], text[separator + 1:]
+    if any(ord(char) < 33 or ord(char) > 126 for char in hrp):
+        return None
+    try:
+        data = [CHARSET_INDEX[char] for char in data_part]
+    except KeyError:
+        return None
+    constant = _polymod(_hrp_expand(hrp) + data)
+    if constant == BECH32_CONSTANT:
+        encoding = BECH32
+    elif constant == BECH32M_CONSTANT:
+        encoding = BECH32M
+    else:
+        return None
+    return hrp, data[:-6], encoding
+
+
+def convert_bits(data, from_bits: int, to_bits: int, pad: bool = True):
+    """Regroup a list of from_bits integers into to_bits integers, None if the padding is invalid."""
+    accumulator = 0
+    bits = 0
+    result = []
+    max_value = (1 << to_bits) - 1
+    for value in data:
+        if value < 0 or value >> from_bits:
+            return None
+        accumulator = (accumulator << from_bits) | value
+        bits += from_bits
+        while bits >= to_bits:
+            bits -= to_bits
+            result.append((accumulator >> bits) & max_value)
+    if pad:
+        if bits:
+            result.append((accumulator << (to_bits - bits)) & max_value)
+    elif bits >= from_bits or ((accumulator << (to_bits - bits)) & max_value):
+        return None
+    return result
@@ -5,6 +5,7 @@ import random
 
 def generate_balance_emoticon(balance):
     items = ["🍦", "🍔", "🍓", "🍩", "🍕", "🍪", "🍫", "🎃"]
-    item_count = max(1, int(math.log10(balance)))
+    # The balance is 0 when it could not be fetched
+    item_count = max(1, int(math.log10(balance))) if balance and balance > 0 else 1
     generated_items = "".join(random.choice(items) for _ in range(item_count))
     return f"(:３  {generated_items}  っ)∋"
@@ -0,0 +1,216 @@
+# utils/metrics.py
+import asyncio
+import functools
+import inspect
+import time
+
+# Upper bounds in seconds of the latency histogram buckets
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+
+class LatencyHistogram:
+    def __init__(self):
+        self.bucket_counts = [0] * len(LATENCY_BUCKETS)
+        self.count = 0
+        self.total = 0.0
+
+    def observe(self, seconds):
+        self.count += 1
+        self.total += seconds
+        for i, bound in enumerate(LATENCY_BUCKETS):
+            if seconds <= bound:
+                self.bucket_counts[i] += 1
+
+
+class Metrics:
+    """
+    In-process registry of call counters and latency histograms, rendered in the
+    Prometheus text format by GET /metrics.
+    Calls are labelled by dependency (redis, openai, twikit, tweepy, ckb_service) and function.
+    Gauges are read from callbacks at scrape time so they never go stale.
+    """
+
+    def __init__(self):
+        # (dependency, function, outcome) -> number of calls
+        self.calls = {}
+        # (dependency, function) -> LatencyHistogram
+        self.latencies = {}
+        # Redis command name -> number of commands sent inside pipelines
+        self.pipelined_commands = {}
+        # name -> (help, callback returning {labels dict as tuple of pairs: value})
+        self.gauges = {}
+
+    def observe_call(self, dependency, function, seconds, ok=True):
+        key = (dependency, function, "success" if ok else "error")
+        self.calls[key] = self.calls.get(key, 0) + 1
+        histogram = self.latencies.get((dependency, function))
+        if histogram is None:
+            histogram = self.latencies[(dependency, function)] = LatencyHistogram()
+        histogram.observe(seconds)
+
+    def count_pipelined_command(self, command):
+        self.pipelined_commands[command] = self.pipelined_commands.get(command, 0) + 1
+
+    def register_gauge(self, name, help_text, callback):
+        """
+        :param callback: Sync or async function returning a dict of {(("label", "value"), ...): value}
+        """
+        self.gauges[name] = (help_text, callback)
+
+    async def render(self):
+        lines = [
+            "# HELP twitter_ckb_calls_total Calls to external dependencies.",
+            "# TYPE twitter_ckb_calls_total counter",
+        ]
+        for (dependency, function, outcome), count in sorted(self.calls.items()):
+            labels = _format_labels((("dependency", dependency), ("function", function), ("outcome", outcome)))
+            lines.append(f"twitter_ckb_calls_total{labels} {count}")
+
+        lines += [
+            "# HELP twitter_ckb_call_latency_seconds Latency of calls to external dependencies.",
+            "# TYPE twitter_ckb_call_latency_seconds histogram",
+        ]
+        for (dependency, function), histogram in sorted(self.latencies.items()):
+            label_pairs = (("dependency", dependency), ("function", function))
+            for bound, count in zip(LATENCY_BUCKETS, histogram.bucket_counts):
+                labels = _format_labels(label_pairs + (("le", str(bound)),))
+                lines.append(f"twitter_ckb_call_latency_seconds_bucket{labels} {count}")
+            labels = _format_labels(label_pairs + (("le", "+Inf"),))
+            lines.append(f"twitter_ckb_call_latency_seconds_bucket{labels} {histogram.count}")
+            labels = _format_labels(label_pairs)
+            lines.append(f"twitter_ckb_call_latency_seconds_sum{labels} {histogram.total}")
+            lines.append(f"twitter_ckb_call_latency_seconds_count{labels} {histogram.count}")
+
+        lines += [
+            "# HELP twitter_ckb_redis_pipelined_commands_total Redis commands sent inside pipelines.",
+            "# TYPE twitter_ckb_redis_pipelined_commands_total counter",
+        ]
+        for command, count in sorted(self.pipelined_commands.items()):
+            lines.append(f"twitter_ckb_redis_pipelined_commands_total{_format_labels((('command', command),))} {count}")
+
+        for name, (help_text, callback) in sorted(self.gauges.items()):
+            try:
+                values = callback()
+                if inspect.isawaitable(values):
+                    values = await values
+            except Exception as e:
+                print(f"Failed to collect gauge {name}: {e}")
+                continue
+            lines += [f"# HELP {name} {help_text}", f"# TYPE {name} gauge"]
+            for label_pairs, value in values.items():
+                lines.append(f"{name}{_format_labels(label_pairs)} {_format_value(value)}")
+        return "\n".join(lines) + "\n"
+
+
+def _format_labels(label_pairs):
+    if not label_pairs:
+        return ""
+    return "{" + ",".join(f'{key}="{_escape_label_value(value)}"' for key, value in label_pairs) + "}"
+
+
+def _escape_label_value(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_value(value):
+    if value is None:
+        return "NaN"
+    return str(float(value))
+
+
+metrics = Metrics()
+
+
+def _is_failure(result):
+    # Most helpers of the app report a failed call by returning None or False instead of raising
+    return result is None or result is False
+
+
+def instrument(dependency, name=None):
+    """
+    Decorator recording the count and latency of a sync or async function under `dependency`.
+    A call counts as an error when it raises or returns None/False.
+    """
+
+    def decorator(func):
+        function = name or func.__name__
+
+        if asyncio.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                started_at = time.monotonic()
+                ok = False
+                try:
+                    result = await func(*args, **kwargs)
+                    ok = not _is_failure(result)
+                    return result
+                finally:
+                    metrics.observe_call(dependency, function, time.monotonic() - started_at, ok)
+
+            return async_wrapper
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            started_at = time.monotonic()
+            ok = False
+            try:
+                result = func(*args, **kwargs)
+                ok = not _is_failure(result)
+                return result
+            finally:
+                metrics.observe_call(dependency, function, time.monotonic() - started_at, ok)
+
+        return wrapper
+
+    return decorator
+
+
+def instrument_methods(obj, dependency, method_names):
+    """Instrument some methods of a client object in place, e.g. calls made directly from the loops."""
+    for method_name in method_names:
+        setattr(obj, method_name, instrument(dependency, method_name)(getattr(obj, method_name)))
+    return obj
+
+
+def instrument_redis(client):
+    """
+    Instrument a redis.asyncio client in place: every command is recorded under its name
+    and every pipeline round trip under PIPELINE, with the commands it carried counted apart.
+    """
+    execute_command = client.execute_command
+    create_pipeline = client.pipeline
+
+    @functools.wraps(execute_command)
+    async def instrumented_execute_command(*args, **options):
+        started_at = time.monotonic()
+        ok = False
+        try:
+            result = await execute_command(*args, **options)
+            ok = True
+            return result
+        finally:
+            metrics.observe_call("redis", str(args[0]).upper(), time.monotonic() - started_at, ok)
+
+    @functools.wraps(create_pipeline)
+    def instrumented_pipeline(*args, **kwargs):
+        pipe = create_pipeline(*args, **kwargs)
+        execute = pipe.execute
+
+        async def instrumented_execute(*execute_args, **execute_kwargs):
+            for command_args, _ in pipe.command_stack:
+                metrics.count_pipelined_command(str(command_args[0]).upper())
+            started_at = time.monotonic()
+            ok = False
+            try:
+                result = await execute(*execute_args, **execute_kwargs)
+                ok = True
+                return result
+            finally:
+                metrics.observe_call("redis", "PIPELINE", time.monotonic() - started_at, ok)
+
+        pipe.execute = instrumented_execute
+        return pipe
+
+    client.execute_command = instrumented_execute_command
+    client.pipeline = instrumented_pipeline
+    return client
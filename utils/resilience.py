@@ -0,0 +1,64 @@
+# utils/resilience.py
+import random
+import time
+
+# Circuit breaker states
+CIRCUIT_CLOSED = "closed"  # requests go through
+CIRCUIT_OPEN = "open"  # requests fail fast until reset_timeout has passed
+CIRCUIT_HALF_OPEN = "half_open"  # one trial request decides whether to close or open again
+
+
+def backoff_delay(attempt: int, base_delay: float, max_delay: float):
+    """Exponential backoff with full jitter, `attempt` starting at 0."""
+    return random.uniform(0, min(max_delay, base_delay * 2 ** attempt))
+
+
+class CircuitBreaker:
+    """
+    Stops calling a dependency after `failure_threshold` consecutive failures, for `reset_timeout` seconds.
+    Then a single trial call is let through: its success closes the circuit, its failure opens it again.
+    A trial call which never reports (e.g. cancelled) is replaced by another one after reset_timeout.
+    """
+
+    def __init__(self, name: str, failure_threshold: int, reset_timeout: float):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = CIRCUIT_CLOSED
+        self.failures = 0
+        self.opened_at = None
+        self.trial_in_flight = False
+        self.trial_started_at = None
+
+    def allow(self):
+        """:return: True if a call may be made now"""
+        if self.state == CIRCUIT_CLOSED:
+            return True
+        if self.state == CIRCUIT_OPEN:
+            if time.monotonic() - self.opened_at < self.reset_timeout:
+                return False
+            self.state = CIRCUIT_HALF_OPEN
+            self.trial_in_flight = False
+        if self.trial_in_flight and time.monotonic() - self.trial_started_at < self.reset_timeout:
+            return False
+        self.trial_in_flight = True
+        self.trial_started_at = time.monotonic()
+        return True
+
+    def record_success(self):
+        if self.state != CIRCUIT_CLOSED:
+            print(f"Circuit {self.name} closed")
+        self.state = CIRCUIT_CLOSED
+        self.failures = 0
+        self.trial_in_flight = False
+
+    def record_failure(self):
+        self.failures += 1
+        self.trial_in_flight = False
+        if self.state == CIRCUIT_HALF_OPEN or (self.state == CIRCUIT_CLOSED and self.failures >= self.failure_threshold):
+            print(f"Circuit {self.name} open for {self.reset_timeout}s after {self.failures} failures")
+            self.state = CIRCUIT_OPEN
+            self.opened_at = time.monotonic()
+
+    def status(self):
+        return {"state": self.state, "failures": self.failures}
@@ -0,0 +1,223 @@
+# utils/scheduler.py
+import asyncio
+import random
+import time
+from datetime import datetime, timedelta, timezone
+
+from config.config import redis_client
+
+# Missed-run policies
+MISFIRE_SKIP = "skip"  # drop missed runs and wait for the next one
+MISFIRE_RUN_ONCE = "run_once"  # run once for all missed runs
+MISFIRE_RUN_ALL = "run_all"  # run every missed run, up to MAX_CATCH_UP_RUNS
+
+MAX_CATCH_UP_RUNS = 24
+
+CRON_ALIASES = {
+    "@yearly": "0 0 1 1 *",
+    "@monthly": "0 0 1 * *",
+    "@weekly": "0 0 * * 0",
+    "@daily": "0 0 * * *",
+    "@hourly": "0 * * * *",
+}
+
+
+def _parse_cron_field(field: str, minimum: int, maximum: int):
+    """Parse one cron field ('*', '5', '1-5', '*/15', '1,2,10-20/2') into a set of values."""
+    values = set()
+    for part in field.split(","):
+        step = 1
+        if "/" in part:
+            part, step = part.split("/")
+            step = int(step)
+        if part == "*":
+            start, end = minimum, maximum
+        elif "-" in part:
+            start, end = (int(value) for value in part.split("-"))
+        else:
+            start = int(part)
+            end = maximum if step > 1 else start
+        if start < minimum or end > maximum or start > end or step < 1:
+            raise ValueError(f"Invalid cron field: {field}")
+        values.update(range(start, end + 1, step))
+    return values
+
+
+class CronExpression:
+    """
+    Standard 5-field cron expression: minute hour day-of-month month day-of-week, evaluated in UTC.
+    """
+
+    def __init__(self, expression: str):
+        self.expression = expression
+        fields = CRON_ALIASES.get(expression.strip(), expression).split()
+        if len(fields) != 5:
+            raise ValueError(f"Cron expression must have 5 fields: {expression}")
+        self.minutes = _parse_cron_field(fields[0], 0, 59)
+        self.hours = _parse_cron_field(fields[1], 0, 23)
+        self.days = _parse_cron_field(fields[2], 1, 31)
+        self.months = _parse_cron_field(fields[3], 1, 12)
+        # 0 and 7 are both Sunday
+        self.weekdays = {day % 7 for day in _parse_cron_field(fields[4], 0, 7)}
+        self.any_day = fields[2] == "*"
+        self.any_weekday = fields[4] == "*"
+
+    def _day_matches(self, dt: datetime):
+        day_match = dt.day in self.days
+        # datetime.weekday() is 0 for Monday, cron uses 0 for Sunday
+        weekday_match = (dt.weekday() + 1) % 7 in self.weekdays
+        if self.any_day or self.any_weekday:
+            return day_match and weekday_match
+        # When both are restricted cron matches either of them
+        return day_match or weekday_match
+
+    def next_after(self, dt: datetime):
+        """Return the first matching time strictly after dt."""
+        dt = dt.replace(second=0, microsecond=0) + timedelta(minutes=1)
+        # Bounded to be safe with expressions that never match (e.g. 31st of February)
+        for _ in range(100000):
+            if dt.month not in self.months:
+                dt = (dt.replace(day=1, hour=0, minute=0) + timedelta(days=32)).replace(day=1)
+            elif not self._day_matches(dt):
+                dt = dt.replace(hour=0, minute=0) + timedelta(days=1)
+            elif dt.hour not in self.hours:
+                dt = dt.replace(minute=0) + timedelta(hours=1)
+            elif dt.minute not in self.minutes:
+                dt += timedelta(minutes=1)
+            else:
+                return dt
+        raise ValueError(f"Cron expression never matches: {self.expression}")
+
+
+class ScheduledJob:
+    def __init__(self, name, func, cron, jitter=0, misfire_policy=MISFIRE_RUN_ONCE, misfire_grace=60,
+                 run_on_start=False):
+        self.name = name
+        self.func = func
+        self.cron = CronExpression(cron)
+        self.jitter = jitter
+        self.misfire_policy = misfire_policy
+        self.misfire_grace = misfire_grace
+        self.run_on_start = run_on_start
+        self.task = None
+        self.next_run_at = None
+        self.last_run_at = None
+        self.last_duration = None
+        self.last_error = None
+        self.run_count = 0
+
+    def is_running(self):
+        return self.task is not None and not self.task.done()
+
+
+class Scheduler:
+    """
+    Runs cron scheduled coroutines as tasks of the current event loop, so jobs share
+    the app's Redis and HTTP connection pools. The last run of every job is stored in Redis
+    to apply the missed-run policy across restarts.
+    """
+
+    def __init__(self):
+        self.jobs = {}
+
+    def add_job(self, name, func, cron, **kwargs):
+        self.jobs[name] = ScheduledJob(name, func, cron, **kwargs)
+        return self.jobs[name]
+
+    def start_job(self, name):
+        job = self.jobs[name]
+        if job.is_running():
+            return False
+        job.task = asyncio.create_task(self._run(job))
+        return True
+
+    async def stop_job(self, name):
+        job = self.jobs[name]
+        if not job.is_running():
+            return False
+        job.task.cancel()
+        await asyncio.gather(job.task, return_exceptions=True)
+        job.task = None
+        job.next_run_at = None
+        return True
+
+    def is_running(self, name):
+        return self.jobs[name].is_running()
+
+    async def shutdown(self):
+        for name in self.jobs:
+            await self.stop_job(name)
+
+    async def _load_last_run(self, job):
+        try:
+            last_run = await redis_client.get(f"scheduler:last_run:{job.name}")
+        except Exception as e:
+            print(f"Failed to load last run of job {job.name}: {e}")
+            return None
+        if not last_run:
+            return None
+        return datetime.fromtimestamp(float(last_run), timezone.utc)
+
+    async def _execute(self, job, scheduled_at):
+        started_at = time.monotonic()
+        try:
+            await job.func()
+            job.last_error = None
+        except Exception as e:
+            job.last_error = str(e)
+            print(f"Error in scheduled job {job.name}: {e}")
+        job.run_count += 1
+        job.last_duration = time.monotonic() - started_at
+        job.last_run_at = datetime.now(timezone.utc)
+        try:
+            await redis_client.set(f"scheduler:last_run:{job.name}", scheduled_at.timestamp())
+        except Exception as e:
+            print(f"Failed to store last run of job {job.name}: {e}")
+
+    async def _run(self, job):
+        now = datetime.now(timezone.utc)
+        if job.run_on_start:
+            await self._execute(job, now)
+            next_run = job.cron.next_after(now)
+        else:
+            last_run = await self._load_last_run(job)
+            next_run = job.cron.next_after(last_run or now)
+
+        while True:
+            now = datetime.now(timezone.utc)
+            if (now - next_run).total_seconds() > job.misfire_grace:
+                missed_runs = []
+                while next_run <= now and len(missed_runs) < MAX_CATCH_UP_RUNS:
+                    missed_runs.append(next_run)
+                    next_run = job.cron.next_after(next_run)
+                print(f"Job {job.name} missed {len(missed_runs)} run(s), policy: {job.misfire_policy}")
+                if job.misfire_policy == MISFIRE_RUN_ALL:
+                    for missed_run in missed_runs:
+                        await self._execute(job, missed_run)
+                elif job.misfire_policy == MISFIRE_RUN_ONCE:
+                    await self._execute(job, missed_runs[-1])
+                next_run = job.cron.next_after(datetime.now(timezone.utc))
+                continue
+
+            job.next_run_at = next_run
+            delay = (next_run - now).total_seconds() + random.uniform(0, job.jitter)
+            await asyncio.sleep(max(0.0, delay))
+            await self._execute(job, next_run)
+            next_run = job.cron.next_after(next_run)
+
+    def status(self):
+        return {
+            name: {
+                "cron": job.cron.expression,
+                "running": job.is_running(),
+                "next_run_at": job.next_run_at.isoformat() if job.next_run_at else None,
+                "last_run_at": job.last_run_at.isoformat() if job.last_run_at else None,
+                "last_duration": job.last_duration,
+                "last_error": job.last_error,
+                "run_count": job.run_count,
+            }
+            for name, job in self.jobs.items()
+        }
+
+
+scheduler = Scheduler()
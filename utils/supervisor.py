@@ -0,0 +1,136 @@
+# utils/supervisor.py
+import asyncio
+import time
+from datetime import datetime, timezone
+
+from config.config import SUPERVISOR_MIN_BACKOFF, SUPERVISOR_MAX_BACKOFF
+
+
+class SupervisedTask:
+    def __init__(self, name, func, restart=True):
+        self.name = name
+        self.func = func
+        self.restart = restart
+        self.task = None
+        self.state = "idle"
+        self.started_at = None
+        self.restart_count = 0
+        self.iteration_count = 0
+        self.iteration_started_at = None
+        self.last_iteration_latency = None
+        self.last_error = None
+        self.last_error_at = None
+
+    def is_running(self):
+        return self.task is not None and not self.task.done()
+
+
+class Supervisor:
+    """
+    Owns the long-running background loops of the app.
+    Every loop runs at most once, crashed loops are restarted with exponential backoff,
+    and loops report their iterations so GET /tasks can show how they are doing.
+    Reports for a name which is not registered (e.g. a loop run from a script) are ignored.
+    """
+
+    def __init__(self):
+        self.tasks = {}
+
+    def register(self, name, func, restart=True):
+        self.tasks[name] = SupervisedTask(name, func, restart)
+
+    def is_running(self, name):
+        return self.tasks[name].is_running()
+
+    def start(self, name, *args):
+        """
+        Start a registered task unless it is already running.
+        :return: False if an instance is already running
+        """
+        supervised = self.tasks[name]
+        if supervised.is_running():
+            return False
+        supervised.task = asyncio.create_task(self._run(supervised, args))
+        return True
+
+    async def stop(self, name):
+        supervised = self.tasks[name]
+        if not supervised.is_running():
+            return False
+        supervised.task.cancel()
+        await asyncio.gather(supervised.task, return_exceptions=True)
+        return True
+
+    async def shutdown(self):
+        for name in self.tasks:
+            await self.stop(name)
+
+    async def _run(self, supervised, args):
+        backoff = SUPERVISOR_MIN_BACKOFF
+        while True:
+            supervised.state = "running"
+            supervised.started_at = datetime.now(timezone.utc)
+            started_at = time.monotonic()
+            try:
+                await supervised.func(*args)
+                supervised.state = "finished"
+                return
+            except asyncio.CancelledError:
+                supervised.state = "stopped"
+                raise
+            except Exception as e:
+                self.record_error(supervised.name, e)
+                print(f"Background task {supervised.name} crashed: {e}")
+                if not supervised.restart:
+                    supervised.state = "failed"
+                    return
+            # A task which ran fine for a while starts again from the smallest backoff
+            if time.monotonic() - started_at > SUPERVISOR_MAX_BACKOFF:
+                backoff = SUPERVISOR_MIN_BACKOFF
+            supervised.state = "restarting"
+            supervised.restart_count += 1
+            print(f"Restarting background task {supervised.name} in {backoff} seconds.")
+            await asyncio.sleep(backoff)
+            backoff = min(backoff * 2, SUPERVISOR_MAX_BACKOFF)
+
+    def begin_iteration(self, name):
+        """Called by a loop at the start of every iteration."""
+        supervised = self.tasks.get(name)
+        if supervised is None:
+            return
+        supervised.iteration_count += 1
+        supervised.iteration_started_at = time.monotonic()
+
+    def end_iteration(self, name):
+        """Called by a loop when the work of an iteration is done, before it sleeps."""
+        supervised = self.tasks.get(name)
+        if supervised is not None and supervised.iteration_started_at is not None:
+            supervised.last_iteration_latency = time.monotonic() - supervised.iteration_started_at
+            supervised.iteration_started_at = None
+
+    def record_error(self, name, error):
+        """Called by a loop which handles an error itself, and by the supervisor on crashes."""
+        supervised = self.tasks.get(name)
+        if supervised is None:
+            return
+        supervised.last_error = f"{type(error).__name__}: {error}"
+        supervised.last_error_at = datetime.now(timezone.utc)
+        self.end_iteration(name)
+
+    def status(self):
+        return {
+            name: {
+                "state": supervised.state,
+                "running": supervised.is_running(),
+                "started_at": supervised.started_at.isoformat() if supervised.started_at else None,
+                "restart_count": supervised.restart_count,
+                "iteration_count": supervised.iteration_count,
+                "last_iteration_latency": supervised.last_iteration_latency,
+                "last_error": supervised.last_error,
+                "last_error_at": supervised.last_error_at.isoformat() if supervised.last_error_at else None,
+            }
+            for name, supervised in self.tasks.items()
+        }
+
+
+supervisor = Supervisor()
@@ -0,0 +1,36 @@
+# utils/token_bucket.py
+import asyncio
+import time
+
+
+class TokenBucket:
+    """
+    Asyncio token bucket, allows `capacity` calls in a burst and `rate` calls per second on average.
+    A rate of 0 (or less) disables the limit.
+    """
+
+    def __init__(self, rate: float, capacity: int):
+        if rate > 0 and capacity < 1:
+            raise ValueError(f"Token bucket capacity must be at least 1, got {capacity}")
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = float(capacity)
+        self.updated_at = time.monotonic()
+        self.lock = asyncio.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+
+    async def acquire(self):
+        """Wait until a token is available and take it."""
+        if self.rate <= 0:
+            return
+        # Waiters are served one by one in arrival order
+        async with self.lock:
+            self._refill()
+            if self.tokens < 1:
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+                self._refill()
+            self.tokens -= 1